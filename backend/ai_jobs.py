@@ -0,0 +1,246 @@
+"""
+Batch AI generation jobs.
+
+A job fills one field (description or rationale) for every Draft requirement of
+a project or subtree. Prompts are fanned out to Ollama by a small pool of
+workers, and results are written back in batched transactions. Each
+GenerationJobItem row is the checkpoint: items still `pending` after a restart
+are picked up again by `resume_all`. Items whose requirement was deleted fail,
+and a runner that crashes fails the job along with its pending items, so no
+job stays `running` once its runner has stopped.
+"""
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict
+from sqlalchemy import insert, update, bindparam, or_, select
+from sqlalchemy.orm import Session
+from . import models, database, ai_service, sharding, reindex
+from .graph import subtree_cte
+
+WORKERS = int(os.getenv("AI_JOB_WORKERS", "4"))
+BATCH_SIZE = int(os.getenv("AI_JOB_BATCH_SIZE", "20"))
+
+_tasks: Dict[int, asyncio.Task] = {}
+
+def _route(db: Session, project_id, root_id):
+    """Routes to the shard holding the job's requirements: the root's, else the project's."""
+    if root_id:
+        if not sharding.route_requirement(db, root_id):
+            raise LookupError(f"Root requirement {root_id} no longer exists")
+    else:
+        sharding.route(db, project_id)
+
+def create_job(db: Session, spec) -> models.GenerationJob:
+    _route(db, spec.project_id, spec.root_id)
+    req = models.Requirement
+    field = getattr(req, spec.field)
+    query = db.query(req.id).filter(req.status == models.RequirementStatus.DRAFT.value)
+    if spec.project_id is not None:
+        query = query.filter(req.project_id == spec.project_id)
+    if spec.root_id:
+        query = query.filter(req.id.in_(select(subtree_cte([spec.root_id]).c.id)))
+    if not spec.overwrite:
+        query = query.filter(or_(field.is_(None), field == ""))
+    req_ids = [r for (r,) in query.order_by(req.id)]
+
+    job = models.GenerationJob(
+        project_id=spec.project_id,
+        root_id=spec.root_id,
+        field=spec.field,
+        model=spec.model,
+        status="running" if req_ids else "completed",
+        total=len(req_ids),
+    )
+    db.add(job)
+    db.flush()
+    if req_ids:
+        db.execute(insert(models.GenerationJobItem), [{"job_id": job.id, "req_id": r} for r in req_ids])
+    db.commit()
+    db.refresh(job)
+    return job
+
+def start(job_id: int):
+    """Starts the job's runner task; must be called on the event loop."""
+    task = asyncio.get_running_loop().create_task(_run(job_id))
+    _tasks[job_id] = task
+    task.add_done_callback(lambda _: _tasks.pop(job_id, None))
+
+async def launch(job_id: int):
+    # BackgroundTasks runs plain functions in the threadpool, away from the loop
+    start(job_id)
+
+def cancel(db: Session, job: models.GenerationJob):
+    if job.status == "running":
+        job.status = "cancelled"
+        db.commit()
+    task = _tasks.get(job.id)
+    if task:
+        # Called from a threadpool worker; a task may only be cancelled on its own loop
+        task.get_loop().call_soon_threadsafe(task.cancel)
+
+def resume_all():
+    """Restarts jobs that were interrupted, e.g. by a server restart."""
+    db = database.SessionLocal()
+    try:
+        job_ids = [j for (j,) in db.query(models.GenerationJob.id).filter(models.GenerationJob.status == "running")]
+    finally:
+        db.close()
+    for job_id in job_ids:
+        if job_id not in _tasks:
+            start(job_id)
+
+def _load_pending(job_id: int):
+    db = database.SessionLocal()
+    try:
+        job = db.get(models.GenerationJob, job_id)
+        _route(db, job.project_id, job.root_id)
+        # Items and requirements are read separately: with sharding they sit in different databases
+        item_ids = [r for (r,) in db.query(models.GenerationJobItem.req_id).filter(
+            models.GenerationJobItem.job_id == job_id, models.GenerationJobItem.status == "pending")]
+        reqs = []
+        for start in range(0, len(item_ids), 500):
+            reqs += db.query(models.Requirement).filter(models.Requirement.id.in_(item_ids[start:start + 500])).all()
+        # Deleted since the job was created: nothing to generate, so they would stay pending forever
+        vanished = sorted(set(item_ids) - {r.id for r in reqs})
+        if vanished:
+            _fail_items(db, job, vanished, "Requirement no longer exists")
+            db.commit()
+        projects = dict(db.query(models.Project.id, models.Project.description).filter(
+            models.Project.id.in_({r.project_id for r in reqs if r.project_id is not None})))
+        pending = []
+        for r in reqs:
+            project_description = projects.get(r.project_id)
+            if job.field == "description":
+                prompt = ai_service.description_prompt(r.title, r.description, project_description)
+            else:
+                prompt = ai_service.rationale_prompt(r.title, r.description or "", r.rationale, project_description)
+            pending.append((r.id, prompt))
+        return job.field, job.model, pending
+    finally:
+        db.close()
+
+def _fail_items(db: Session, job: models.GenerationJob, req_ids, error: str):
+    items = models.GenerationJobItem.__table__
+    for start in range(0, len(req_ids), 500):
+        job.failed += db.execute(
+            update(items).where(items.c.job_id == job.id, items.c.status == "pending",
+                                items.c.req_id.in_(req_ids[start:start + 500]))
+            .values(status="failed", error=error)
+        ).rowcount
+
+def _write_batch(job_id: int, field: str, batch) -> list:
+    """
+    Writes one batch of results, their audit entries and the checkpoint in a single
+    transaction. Returns the IDs whose text changed, for reindex.after_commit.
+    """
+    db = database.SessionLocal()
+    try:
+        job = db.get(models.GenerationJob, job_id)
+        _route(db, job.project_id, job.root_id)
+        reqs = {r.id: r for r in db.query(models.Requirement).filter(models.Requirement.id.in_([b[0] for b in batch]))}
+        now = datetime.utcnow()
+        items, written = [], []
+        completed = failed = 0
+        for req_id, text, error in batch:
+            req = reqs.get(req_id)
+            if error is None and req is None:
+                error = "Requirement no longer exists"
+            elif error is None and req.status != models.RequirementStatus.DRAFT.value:
+                error = f"Requirement is {req.status}, not Draft"
+            elif error is None and not text:
+                error = "Model returned no text"
+
+            if error is None:
+                setattr(req, field, text)
+                req.updated_at = now
+                details = f"{field.capitalize()} generated (job {job_id})"
+                if field == "description":
+                    marked = reindex.text_changed(db, req, [field], now=now)
+                    if marked:
+                        details += f"; {marked} trace link(s) marked suspect"
+                    written.append(req_id)
+                db.add(models.AuditLog(req_id=req_id, author="AI", action="UPDATE", details=details))
+                items.append({"b_req_id": req_id, "b_status": "done", "b_error": None})
+                completed += 1
+            else:
+                items.append({"b_req_id": req_id, "b_status": "failed", "b_error": error})
+                failed += 1
+
+        # Core executemany; the ORM would treat a parameter list as bulk-update-by-PK
+        items_table = models.GenerationJobItem.__table__
+        db.execute(
+            update(items_table)
+            .where(items_table.c.job_id == job_id, items_table.c.req_id == bindparam("b_req_id"))
+            .values(status=bindparam("b_status"), error=bindparam("b_error")),
+            items
+        )
+        job.completed += completed
+        job.failed += failed
+        db.commit()
+        return written
+    finally:
+        db.close()
+
+def _finish(job_id: int):
+    db = database.SessionLocal()
+    try:
+        job = db.get(models.GenerationJob, job_id)
+        if job.status == "running":
+            job.status = "completed"
+            db.commit()
+    finally:
+        db.close()
+
+def _abort(job_id: int, error: str):
+    """Ends a job whose runner crashed: its pending items fail with the error."""
+    db = database.SessionLocal()
+    try:
+        job = db.get(models.GenerationJob, job_id)
+        pending = [r for (r,) in db.query(models.GenerationJobItem.req_id).filter(
+            models.GenerationJobItem.job_id == job_id, models.GenerationJobItem.status == "pending")]
+        _fail_items(db, job, pending, error)
+        if job.status == "running":
+            job.status = "failed"
+        db.commit()
+    finally:
+        db.close()
+
+async def _run(job_id: int):
+    try:
+        await _generate(job_id)
+    except Exception as e:
+        print(f"Generation job {job_id} failed: {e}")
+        await asyncio.to_thread(_abort, job_id, str(e) or type(e).__name__)
+
+async def _generate(job_id: int):
+    field, model, pending = await asyncio.to_thread(_load_pending, job_id)
+    queue = asyncio.Queue()
+    for item in pending:
+        queue.put_nowait(item)
+    results = []
+
+    async def flush():
+        if results:
+            batch = results[:]
+            results.clear()
+            written = await asyncio.to_thread(_write_batch, job_id, field, batch)
+            await reindex.after_commit(written)
+
+    async def worker():
+        while not queue.empty():
+            req_id, prompt = queue.get_nowait()
+            try:
+                text = await ai_service.complete(prompt, model)
+                results.append((req_id, text, None))
+            except Exception as e:
+                results.append((req_id, None, str(e) or type(e).__name__))
+            if len(results) >= BATCH_SIZE:
+                await flush()
+
+    try:
+        await asyncio.gather(*[worker() for _ in range(min(WORKERS, len(pending)))])
+    finally:
+        # Keep finished generations even when cancelled; unfinished items stay pending
+        await flush()
+    await asyncio.to_thread(_finish, job_id)
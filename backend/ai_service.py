@@ -1,14 +1,32 @@
+import asyncio
 import httpx
 import json
 import os
+from contextlib import aclosing
 
 OLLAMA_URL = os.getenv("OLLAMA_BASE_URL", "http://host.docker.internal:11434")
 DEFAULT_MODEL = "llama3:latest"
+EMBEDDING_MODEL = os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")
+TRANSPORT = None
+
+# Generation streams get separate limits instead of one total cap
+CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "10"))
+FIRST_TOKEN_TIMEOUT = float(os.getenv("OLLAMA_FIRST_TOKEN_TIMEOUT", "120"))
+INTER_TOKEN_TIMEOUT = float(os.getenv("OLLAMA_INTER_TOKEN_TIMEOUT", "30"))
+DISCONNECT_POLL_INTERVAL = 0.5
+
+class GenerationError(Exception):
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.status_code = status_code
+
+class ClientDisconnected(Exception):
+    pass
 
 async def list_models():
     url = f"{OLLAMA_URL}/api/tags"
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with _client(timeout=10.0) as client:
             response = await client.get(url)
             response.raise_for_status()
             data = response.json()
@@ -17,44 +35,132 @@ async def list_models():
         print(f"Ollama list models error: {e}")
         return [DEFAULT_MODEL]
 
-async def generate_description(title: str, current_description: str = None, model: str = None, project_description: str = None):
+def description_prompt(title: str, current_description: str = None, project_description: str = None):
     context = f"Project Context: {project_description}\n" if project_description else ""
     if current_description:
-        prompt = f"As a requirements engineer, improve and refine the following draft description for a software requirement with the title: '{title}'.\n{context}\nDraft Description:\n{current_description}\n\nReturn only the improved description text, no preamble."
-    else:
-        prompt = f"As a requirements engineer, write a brief, professional description for a software requirement with the title: '{title}'.\n{context}\nReturn only the description text, no preamble."
-    async for chunk in _ollama_generate(prompt, model):
-        yield chunk
+        return f"As a requirements engineer, improve and refine the following draft description for a software requirement with the title: '{title}'.\n{context}\nDraft Description:\n{current_description}\n\nReturn only the improved description text, no preamble."
+    return f"As a requirements engineer, write a brief, professional description for a software requirement with the title: '{title}'.\n{context}\nReturn only the description text, no preamble."
 
-async def generate_rationale(title: str, description: str, current_rationale: str = None, model: str = None, project_description: str = None):
+def rationale_prompt(title: str, description: str, current_rationale: str = None, project_description: str = None):
     context = f"Project Context: {project_description}\n" if project_description else ""
     if current_rationale:
-        prompt = f"As a requirements engineer, improve and refine the following draft rationale for a software requirement with the title: '{title}' and description: '{description}'.\n{context}\nDraft Rationale:\n{current_rationale}\n\nFocus on the underlying need, risk, or business/technical value it addresses. Return only the improved rationale text, no preamble."
-    else:
-        prompt = f"As a requirements engineer, write a concise rationale explaining why the following requirement is necessary. Focus on the underlying need, risk, or business/technical value it addresses. Do not restate the requirement.\n{context}Title: {title}\nDescription: {description}\nReturn only the rationale text, no preamble."
-    async for chunk in _ollama_generate(prompt, model):
+        return f"As a requirements engineer, improve and refine the following draft rationale for a software requirement with the title: '{title}' and description: '{description}'.\n{context}\nDraft Rationale:\n{current_rationale}\n\nFocus on the underlying need, risk, or business/technical value it addresses. Return only the improved rationale text, no preamble."
+    return f"As a requirements engineer, write a concise rationale explaining why the following requirement is necessary. Focus on the underlying need, risk, or business/technical value it addresses. Do not restate the requirement.\n{context}Title: {title}\nDescription: {description}\nReturn only the rationale text, no preamble."
+
+async def embed(texts, model: str = None):
+    """Returns one embedding vector per input text. Raises GenerationError on failure."""
+    url = f"{OLLAMA_URL}/api/embed"
+    payload = {"model": model or EMBEDDING_MODEL, "input": list(texts)}
+    try:
+        async with _client(timeout=httpx.Timeout(CONNECT_TIMEOUT, read=FIRST_TOKEN_TIMEOUT)) as client:
+            response = await client.post(url, json=payload)
+    except httpx.HTTPError as e:
+        raise GenerationError(f"Cannot reach Ollama: {e}", 503)
+    if response.status_code >= 400:
+        raise GenerationError(f"Ollama returned {response.status_code}: {response.text}", 502)
+    return response.json()["embeddings"]
+
+async def generate_description(title: str, current_description: str = None, model: str = None, project_description: str = None):
+    prompt = description_prompt(title, current_description, project_description)
+    async for chunk in _ollama_stream(prompt, model):
         yield chunk
 
-async def _ollama_generate(prompt: str, model: str = None):
+async def generate_rationale(title: str, description: str, current_rationale: str = None, model: str = None, project_description: str = None):
+    prompt = rationale_prompt(title, description, current_rationale, project_description)
+    async for chunk in _ollama_stream(prompt, model):
+        yield chunk
+
+async def complete(prompt: str, model: str = None) -> str:
+    """Runs a prompt to completion. Raises GenerationError on failure."""
+    chunks = []
+    async for chunk in _ollama_stream(prompt, model):
+        chunks.append(chunk)
+    return "".join(chunks).strip()
+
+def _event(kind: str, **fields):
+    return json.dumps({"type": kind, **fields}) + "\n"
+
+async def _next_chunk(chunks, is_disconnected):
+    """Awaits the next chunk, polling for a client disconnect while the model is busy."""
+    pending = asyncio.ensure_future(chunks.__anext__())
+    while True:
+        done, _ = await asyncio.wait({pending}, timeout=DISCONNECT_POLL_INTERVAL)
+        if done:
+            return pending.result()
+        if await is_disconnected():
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+            raise ClientDisconnected()
+
+async def stream_events(chunks, is_disconnected):
+    """
+    Converts a token stream into NDJSON events: {"type": "token", "text": ...}
+    per chunk, then {"type": "done"} or {"type": "error", "status": ..., "message": ...}.
+    Closing `chunks` on disconnect aborts the upstream Ollama request.
+    """
+    async with aclosing(chunks):
+        try:
+            while True:
+                try:
+                    chunk = await _next_chunk(chunks, is_disconnected)
+                except StopAsyncIteration:
+                    break
+                yield _event("token", text=chunk)
+            yield _event("done")
+        except ClientDisconnected:
+            print("Client disconnected, aborted Ollama generation")
+        except GenerationError as e:
+            print(f"Ollama error: {e}")
+            yield _event("error", status=e.status_code, message=str(e))
+
+def _client(**kwargs):
+    # TRANSPORT lets tests and the load harness swap in a fake Ollama
+    return httpx.AsyncClient(transport=TRANSPORT, **kwargs)
+
+async def _ollama_stream(prompt: str, model: str = None):
     url = f"{OLLAMA_URL}/api/generate"
     payload = {
         "model": model or DEFAULT_MODEL,
         "prompt": prompt,
         "stream": True
     }
-    
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            async with client.stream("POST", url, json=payload) as response:
-                response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if line:
-                        data = json.loads(line)
-                        chunk = data.get("response", "")
-                        if chunk:
-                            yield chunk
-                        if data.get("done"):
-                            break
-    except Exception as e:
-        print(f"Ollama error: {e}")
-        yield f"Error generating text: {str(e)}"
+
+    # No overall cap: long generations are fine as long as tokens keep coming
+    async with _client(timeout=httpx.Timeout(CONNECT_TIMEOUT, read=None)) as client:
+        try:
+            request = client.build_request("POST", url, json=payload)
+            response = await asyncio.wait_for(client.send(request, stream=True), FIRST_TOKEN_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise GenerationError("Timed out waiting for Ollama to respond", 504)
+        except httpx.HTTPError as e:
+            raise GenerationError(f"Cannot reach Ollama: {e}", 503)
+
+        try:
+            if response.status_code >= 400:
+                await response.aread()
+                raise GenerationError(f"Ollama returned {response.status_code}: {response.text}", 502)
+
+            lines = response.aiter_lines()
+            timeout = FIRST_TOKEN_TIMEOUT
+            while True:
+                try:
+                    line = await asyncio.wait_for(lines.__anext__(), timeout)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise GenerationError(f"No token from Ollama within {timeout:g}s", 504)
+                except httpx.HTTPError as e:
+                    raise GenerationError(f"Ollama stream failed: {e}", 502)
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise GenerationError(data["error"], 502)
+                chunk = data.get("response", "")
+                if chunk:
+                    yield chunk
+                    timeout = INTER_TOKEN_TIMEOUT
+                if data.get("done"):
+                    break
+        finally:
+            await response.aclose()
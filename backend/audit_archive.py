@@ -0,0 +1,358 @@
+"""
+Audit log retention: a hot window in SQLite and compressed archive segments behind it.
+
+Events younger than AUDIT_HOT_DAYS stay in ``audit_logs``. Compaction moves
+older ones, oldest first and AUDIT_SEGMENT_ROWS at a time, into gzip NDJSON
+segment files under the archive directory (AUDIT_ARCHIVE_DIR, by default
+``audit-archive/`` next to the database file), one per month the batch touches
+(``<database>/<YYYY-MM>/<first id>-<last id>-<stamp>.ndjson.gz``). Each
+segment is written and fsynced before its ``audit_segments`` row is inserted
+and the archived rows are deleted, in one transaction in the database that
+held them, so an event is always visible in exactly one tier. A
+compaction that loses a race with another worker rolls back and removes its
+files. With AUDIT_COMPACT_INTERVAL_MINUTES set, the app compacts on that
+schedule; otherwise only POST /admin/audit/compact does. Snapshots copy the
+archive directory and dumps include the archived events (backup.py).
+
+``audit_segments`` is the archive's index: a segment's time range, the
+actions and projects it holds, and a Bloom filter over its requirement IDs,
+so a query opens only the segments that can match. Queries take the newest
+rows from both tiers and merge them; segments are read newest first and
+reading stops once no older segment can make it into the page. Segment
+files never change, so the last few decoded ones are cached.
+
+An event's project is its requirement's, resolved through the tombstones for
+deleted requirements, both when filtering the hot table and when archiving.
+"""
+import asyncio
+import gzip
+import hashlib
+import heapq
+import json
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import lru_cache
+from sqlalchemy import select, insert, delete, func, union
+from . import database, models, sharding
+
+AUDIT_ARCHIVE_DIR = os.getenv("AUDIT_ARCHIVE_DIR") # Unset: next to the database file, see archive_dir
+AUDIT_HOT_DAYS = float(os.getenv("AUDIT_HOT_DAYS", "90"))
+AUDIT_SEGMENT_ROWS = int(os.getenv("AUDIT_SEGMENT_ROWS", "20000"))
+AUDIT_COMPACT_INTERVAL_MINUTES = float(os.getenv("AUDIT_COMPACT_INTERVAL_MINUTES", "0")) # 0 disables the schedule
+SEGMENT_SUFFIX = ".ndjson.gz"
+CACHED_SEGMENTS = 8
+CHUNK_SIZE = 500
+BLOOM_BITS_PER_KEY = 10
+BLOOM_HASHES = 7 # ~1% false positives at 10 bits per key
+
+EVENT_FIELDS = ("id", "req_id", "timestamp", "author", "action", "details")
+
+# --- Bloom filter over requirement IDs ---
+
+def _bloom_positions(key: str, bits: int):
+    digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+    a, b = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+    return ((a + i * b) % bits for i in range(BLOOM_HASHES))
+
+def bloom(keys) -> bytes:
+    keys = set(keys)
+    size = max(8, (len(keys) * BLOOM_BITS_PER_KEY + 7) // 8)
+    bits = bytearray(size)
+    for key in keys:
+        for position in _bloom_positions(key, size * 8):
+            bits[position // 8] |= 1 << (position % 8)
+    return bytes(bits)
+
+def might_contain(bits: bytes, key: str) -> bool:
+    return all(bits[p // 8] & (1 << (p % 8)) for p in _bloom_positions(key, len(bits) * 8))
+
+# --- Shared filters ---
+
+def project_members(project_id: int):
+    """IDs of the project's requirements, including deleted ones."""
+    req, tomb = models.Requirement.__table__, models.Tombstone.__table__
+    return union(
+        select(req.c.id).where(req.c.project_id == project_id),
+        select(tomb.c.entity_id).where(tomb.c.entity == "requirement", tomb.c.project_id == project_id),
+    )
+
+def projects_of(conn, req_ids) -> dict:
+    """{req_id: project_id} for existing and deleted requirements, a chunk of IDs per query."""
+    req, tomb = models.Requirement.__table__, models.Tombstone.__table__
+    req_ids = list(req_ids)
+    projects = {}
+    for start in range(0, len(req_ids), CHUNK_SIZE):
+        chunk = req_ids[start:start + CHUNK_SIZE]
+        # Later deletions of a reused ID win, and a live requirement wins over both
+        projects.update(conn.execute(select(tomb.c.entity_id, tomb.c.project_id)
+                                     .where(tomb.c.entity == "requirement", tomb.c.entity_id.in_(chunk))
+                                     .order_by(tomb.c.seq)).all())
+        projects.update(conn.execute(select(req.c.id, req.c.project_id).where(req.c.id.in_(chunk))).all())
+    return projects
+
+def hot_filters(req_id=None, actions=None, project_id=None, since=None, until=None) -> list:
+    audit = models.AuditLog.__table__
+    clauses = []
+    if req_id is not None:
+        clauses.append(audit.c.req_id == req_id)
+    if actions:
+        clauses.append(audit.c.action.in_(actions))
+    if project_id is not None:
+        clauses.append(audit.c.req_id.in_(project_members(project_id)))
+    if since is not None:
+        clauses.append(audit.c.timestamp >= since)
+    if until is not None:
+        clauses.append(audit.c.timestamp < until)
+    return clauses
+
+# --- Compaction ---
+
+def archive_dir() -> str:
+    """Where segment files live: AUDIT_ARCHIVE_DIR, or audit-archive/ beside the main database."""
+    if AUDIT_ARCHIVE_DIR:
+        return AUDIT_ARCHIVE_DIR
+    path = database.engine.url.database
+    if not path or path == ":memory:":
+        return "./audit-archive"
+    return os.path.join(os.path.dirname(os.path.abspath(path)), "audit-archive")
+
+def _segment_path(relpath: str) -> str:
+    return os.path.join(archive_dir(), relpath)
+
+def _write_segment(relpath: str, rows):
+    path = _segment_path(relpath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=9) as out:
+        for row in rows:
+            out.write(json.dumps({**row, "timestamp": row["timestamp"].isoformat()}, separators=(",", ":")) + "\n")
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _segment_record(relpath: str, period: str, rows) -> dict:
+    return {
+        "path": relpath, "period": period, "row_count": len(rows),
+        "first_at": rows[0]["timestamp"], "last_at": rows[-1]["timestamp"],
+        "actions": json.dumps(sorted({r["action"] for r in rows if r["action"] is not None})),
+        "project_ids": json.dumps(sorted({r["project_id"] for r in rows if r["project_id"] is not None})),
+        "req_filter": bloom(r["req_id"] for r in rows if r["req_id"] is not None),
+        "created_at": datetime.utcnow(),
+    }
+
+def compact_database(engine, label: str, cutoff: datetime) -> dict:
+    """Archives the events older than cutoff in one database, a segment batch per transaction."""
+    audit = models.AuditLog.__table__
+    columns = [audit.c[name] for name in EVENT_FIELDS]
+    archived = segments = 0
+    while True:
+        written = []
+        try:
+            with engine.begin() as conn:
+                rows = [dict(r._mapping) for r in conn.execute(
+                    select(*columns).where(audit.c.timestamp < cutoff)
+                    .order_by(audit.c.timestamp, audit.c.id).limit(AUDIT_SEGMENT_ROWS)
+                )]
+                if not rows:
+                    break
+                projects = projects_of(conn, {r["req_id"] for r in rows if r["req_id"] is not None})
+                for row in rows:
+                    row["project_id"] = projects.get(row["req_id"])
+                periods = {}
+                for row in rows:
+                    periods.setdefault(row["timestamp"].strftime("%Y-%m"), []).append(row)
+                stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")
+                for period, members in periods.items():
+                    relpath = f"{label}/{period}/{members[0]['id']}-{members[-1]['id']}-{stamp}{SEGMENT_SUFFIX}"
+                    _write_segment(relpath, members)
+                    written.append(relpath)
+                    conn.execute(insert(models.AuditSegment), [_segment_record(relpath, period, members)])
+                ids = [r["id"] for r in rows]
+                deleted = sum(conn.execute(delete(audit).where(audit.c.id.in_(ids[start:start + CHUNK_SIZE]))).rowcount
+                              for start in range(0, len(ids), CHUNK_SIZE))
+                if deleted != len(ids):
+                    raise RuntimeError(f"{len(ids) - deleted} audit rows were archived by another worker")
+        except BaseException:
+            # Rolled back, so the files are not referenced by anything
+            for relpath in written:
+                os.remove(_segment_path(relpath))
+            raise
+        archived += len(rows)
+        segments += len(written)
+        if len(rows) < AUDIT_SEGMENT_ROWS:
+            break
+    return {"archived": archived, "segments": segments}
+
+def _databases():
+    """(label, engine) for the main database and, in sharded mode, every shard."""
+    result = [("main", database.engine)]
+    if database.SHARDING:
+        db = database.SessionLocal()
+        try:
+            keys = sharding.shard_keys(db)
+        finally:
+            db.close()
+        result += [(database.shard_name(key), database.shard_engine(key)) for key in keys]
+    return result
+
+def compact(now: datetime = None) -> dict:
+    """Moves every event older than the hot window into archive segments."""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=AUDIT_HOT_DAYS)
+    total = {"archived": 0, "segments": 0, "cutoff": cutoff}
+    for label, engine in _databases():
+        result = compact_database(engine, label, cutoff)
+        total["archived"] += result["archived"]
+        total["segments"] += result["segments"]
+    return total
+
+async def run_schedule():
+    """Compacts every AUDIT_COMPACT_INTERVAL_MINUTES until cancelled."""
+    while True:
+        await asyncio.sleep(AUDIT_COMPACT_INTERVAL_MINUTES * 60)
+        try:
+            result = await asyncio.to_thread(compact)
+            if result["archived"]:
+                print(f"Audit: archived {result['archived']} events into {result['segments']} segments")
+        except Exception as e:
+            print(f"Audit compaction failed: {e}")
+
+def drop_archived(conn) -> int:
+    """
+    Deletes hot rows the archive already holds, e.g. after restoring a dump taken
+    before the last compaction. Dumps carry no audit ids, so rows are matched to
+    archived events by content, one archived copy per hot row; a hot row sharing
+    a timestamp with archived ones but never archived itself is kept.
+    """
+    seg = models.AuditSegment
+    newest = conn.execute(select(func.max(seg.last_at))).scalar()
+    if newest is None:
+        return 0
+    audit = models.AuditLog.__table__
+    content = [audit.c[name] for name in EVENT_FIELDS if name != "id"]
+    candidates = conn.execute(
+        select(audit.c.id, *content).where(audit.c.timestamp <= newest).order_by(audit.c.timestamp, audit.c.id)
+    ).all()
+    if not candidates:
+        return 0
+    held = Counter()
+    for relpath in conn.execute(select(seg.path).where(seg.last_at >= candidates[0].timestamp)).scalars():
+        # A missing file holds nothing we could show, so its rows stay hot
+        if os.path.exists(_segment_path(relpath)):
+            for line in read_segment(relpath):
+                row = _decode(line)
+                held[tuple(row[name] for name in EVENT_FIELDS if name != "id")] += 1
+    ids = []
+    for audit_id, *key in candidates:
+        key = tuple(key)
+        if held[key]:
+            held[key] -= 1
+            ids.append(audit_id)
+    return sum(conn.execute(delete(audit).where(audit.c.id.in_(ids[start:start + CHUNK_SIZE]))).rowcount
+               for start in range(0, len(ids), CHUNK_SIZE))
+
+def archived_rows(conn):
+    """Every event archived from this connection's database, oldest segment first."""
+    seg = models.AuditSegment
+    for relpath in conn.execute(select(seg.path).order_by(seg.first_at, seg.id)).scalars().all():
+        path = _segment_path(relpath)
+        if not os.path.exists(path):
+            continue
+        # Read directly rather than through the query cache, which a full pass would flush
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                yield _decode(line)
+
+# --- Queries ---
+
+@lru_cache(maxsize=CACHED_SEGMENTS)
+def _read(path: str) -> tuple:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return tuple(f.read().splitlines())
+
+def read_segment(relpath: str) -> tuple:
+    """The segment's raw NDJSON lines, oldest first."""
+    return _read(_segment_path(relpath))
+
+def _decode(line: str) -> dict:
+    row = json.loads(line)
+    row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+    return row
+
+def _may_hold(segment, req_id, actions, project_id) -> bool:
+    if actions and not set(actions) & set(json.loads(segment.actions)):
+        return False
+    if project_id is not None and project_id not in json.loads(segment.project_ids):
+        return False
+    return req_id is None or might_contain(segment.req_filter, req_id)
+
+def _needles(req_id, actions) -> list:
+    # Substrings a matching line must contain, so most lines are never decoded
+    needles = []
+    if req_id is not None:
+        needles.append(['"req_id":' + json.dumps(req_id) + ","])
+    if actions:
+        needles.append(['"action":' + json.dumps(action) + "," for action in actions])
+    return needles
+
+def _key(row):
+    return (row["timestamp"], row["id"])
+
+def archived_events(db, want: int = None, req_id=None, actions=None, project_id=None, since=None, until=None,
+                    floor=None) -> list:
+    """
+    The newest `want` archived events (all when None) matching the filters, newest
+    first. With `floor`, a (timestamp, id) key, only events newer than it are needed.
+    """
+    seg = models.AuditSegment
+    query = db.query(seg)
+    if since is not None:
+        query = query.filter(seg.last_at >= since)
+    if until is not None:
+        query = query.filter(seg.first_at < until)
+    needles = _needles(req_id, actions)
+    kept = [] # Min-heap of the newest matches so far
+    for n, segment in enumerate(query.order_by(seg.last_at.desc(), seg.id.desc())):
+        # Nothing in this or any older segment is newer than the page's oldest row
+        if floor is not None and segment.last_at < floor[0]:
+            break
+        if want is not None and len(kept) >= want and segment.last_at < kept[0][0][0]:
+            break
+        if not _may_hold(segment, req_id, actions, project_id):
+            continue
+        taken = 0
+        lines = read_segment(segment.path)
+        # Lines are in (timestamp, id) order, so newest first a segment is done after `want` matches
+        for i in range(len(lines) - 1, -1, -1):
+            line = lines[i]
+            if not all(any(needle in line for needle in options) for options in needles):
+                continue
+            row = _decode(line)
+            if (req_id is not None and row["req_id"] != req_id) or (actions and row["action"] not in actions) \
+                    or (project_id is not None and row["project_id"] != project_id) \
+                    or (since is not None and row["timestamp"] < since) or (until is not None and row["timestamp"] >= until):
+                continue
+            entry = (_key(row), n, i, row)
+            if want is None or len(kept) < want:
+                heapq.heappush(kept, entry)
+            elif entry > kept[0]:
+                heapq.heapreplace(kept, entry)
+            else:
+                break
+            taken += 1
+            if want is not None and taken >= want:
+                break
+    return [row for *_, row in sorted(kept, reverse=True)]
+
+def events(db, want: int = None, req_id=None, actions=None, project_id=None, since=None, until=None) -> list:
+    """The newest `want` events (all when None) across the hot table and the archive, newest first."""
+    audit = models.AuditLog.__table__
+    hot = [dict(r._mapping) for r in db.execute(
+        select(*[audit.c[name] for name in EVENT_FIELDS])
+        .where(*hot_filters(req_id, actions, project_id, since, until))
+        .order_by(audit.c.timestamp.desc(), audit.c.id.desc()).limit(want)
+    )]
+    # A full page from the hot table only needs archived events newer than its last row
+    floor = _key(hot[-1]) if want is not None and hot and len(hot) == want else None
+    cold = archived_events(db, want, req_id, actions, project_id, since, until, floor)
+    return list(heapq.merge(hot, cold, key=_key, reverse=True))[:want]
@@ -0,0 +1,470 @@
+"""
+Online backups, portable dumps and bulk restore.
+
+Snapshots copy the live database with SQLite's online backup API a few
+hundred pages at a time; between steps the source is unlocked, so writers
+wait at most one step. A write through another connection makes SQLite
+restart the copy, so after BACKUP_MAX_RESTARTS restarts the rest is copied
+in one step. Each snapshot is a directory under BACKUP_DIR holding the
+database file (and the shard files in sharded mode, each consistent on its
+own), followed by a copy of the audit archive's segment files. Segments are
+written before the database references them and never change, so the copy
+holds every segment the copied databases point to. With
+BACKUP_INTERVAL_MINUTES set, the app takes one on that schedule and keeps
+the newest BACKUP_KEEP.
+
+Dumps are gzip-compressed NDJSON of projects, requirements, traces and audit
+logs: a header line, then per table a `{"table", "columns"}` line followed by
+one JSON array per row. The audit section holds archived events as well as
+hot ones, and each row carries its requirement's project, so the history of
+deleted requirements is restored into the right shard.
+
+Restoring replaces those four tables: they and the state derived from them
+(metrics, MinHash signatures) are emptied, while baselines, field history,
+tombstones and other tables outside the dump are kept. The restored tables'
+secondary indexes are dropped, rows go in with executemany batches in one
+transaction and the indexes are rebuilt once at the end. Rows get fresh sync
+sequence numbers as they are inserted, and whatever the database held that
+the dump lacks gets a tombstone after them, so clients syncing from an older
+cursor converge on the restored data. Every restored requirement gets a
+fresh history checkpoint and every vanished one a deletion checkpoint, and
+metrics are recomputed, all in the same transaction. MinHash signatures are
+rebuilt afterwards by index_duplicates. The audit archive index
+(audit_archive.py) survives a restore, and restored audit rows it already
+holds are dropped; elsewhere, restored events older than the hot window are
+archived again by the next compaction.
+"""
+import asyncio
+import glob
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from sqlalchemy import select, insert, delete
+from sqlalchemy.schema import CreateIndex, DropIndex
+from . import database, models, sync, metrics, history, minhash, sharding, facets, audit_archive
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "./backups")
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+BACKUP_INTERVAL_MINUTES = float(os.getenv("BACKUP_INTERVAL_MINUTES", "0")) # 0 disables the schedule
+PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+STEP_PAUSE = float(os.getenv("BACKUP_STEP_PAUSE", "0.005")) # Seconds writers get between steps
+MAX_RESTARTS = int(os.getenv("BACKUP_MAX_RESTARTS", "3"))
+RESTORE_BATCH_SIZE = 5000
+
+SNAPSHOT_PREFIX = "snapshot-"
+SNAPSHOT_ARCHIVE = "audit-archive"
+DUMP_SUFFIX = ".ndjson.gz"
+DUMP_FORMAT = "reqtool-dump"
+DUMP_VERSION = 1
+# Parents before children; audit rows get fresh ids since shards number them independently.
+# An audit row's project_id is not stored with it, see _audit_projects
+DUMP_TABLES = {
+    "projects": [c for c in models.Project.__table__.c.keys() if c != "change_seq"],
+    "requirements": [c for c in models.Requirement.__table__.c.keys() if c != "change_seq"],
+    "traces": [c for c in models.Trace.__table__.c.keys() if c != "change_seq"],
+    "audit_logs": ["req_id", "timestamp", "author", "action", "details", "project_id"],
+}
+# Emptied by a restore: the dumped tables and the state rebuilt from them. Everything else
+# (baselines, history, tombstones, generation jobs, embeddings, the audit archive index) stays
+PURGED_ON_RESTORE = set(DUMP_TABLES) | {"change_counter", "project_metrics", "requirement_minhash", "minhash_bands"}
+DUMP_ORDER = {
+    "projects": ("id",),
+    "requirements": ("id",),
+    "traces": ("source_id", "target_id"),
+    "audit_logs": ("timestamp", "id"),
+}
+
+class BackupError(Exception):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+def _stamp() -> str:
+    return datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")
+
+def _database_path(engine) -> str:
+    path = engine.url.database
+    if not path or path == ":memory:":
+        raise BackupError("Backups need a file-based SQLite database")
+    return path
+
+def path_for(name: str) -> str:
+    if not name or name != os.path.basename(name) or name.startswith("."):
+        raise BackupError(f"Invalid backup name '{name}'")
+    return os.path.join(BACKUP_DIR, name)
+
+def _engines():
+    """(label, engine) for the catalog and, in sharded mode, every shard."""
+    result = [(None, database.engine)]
+    if database.SHARDING:
+        db = database.SessionLocal()
+        try:
+            keys = sharding.shard_keys(db)
+        finally:
+            db.close()
+        result += [(key, database.shard_engine(key)) for key in keys]
+    return result
+
+# --- Online snapshots ---
+
+def copy_database(source_path: str, target_path: str, pages: int = None, pause: float = None) -> dict:
+    """Page-stepped online copy of one SQLite file. Returns copy statistics."""
+    pages = pages or PAGES_PER_STEP
+    pause = STEP_PAUSE if pause is None else pause
+    stats = {"pages": 0, "steps": 0, "restarts": 0}
+    remaining_before = None
+
+    def progress(status, remaining, total):
+        nonlocal remaining_before
+        stats["steps"] += 1
+        stats["pages"] = total
+        # Remaining pages going up means another connection wrote and SQLite started over
+        if remaining_before is not None and remaining > remaining_before:
+            stats["restarts"] += 1
+            if stats["restarts"] > MAX_RESTARTS:
+                raise _Restarted()
+        remaining_before = remaining
+        if remaining and pause:
+            time.sleep(pause)
+
+    tmp_path = target_path + ".tmp"
+    source = sqlite3.connect(source_path)
+    try:
+        target = sqlite3.connect(tmp_path)
+        try:
+            try:
+                source.backup(target, pages=pages, progress=progress)
+            except _Restarted:
+                source.backup(target, pages=-1) # Busy database: finish with one locked pass
+            check = target.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            target.close()
+    finally:
+        source.close()
+    if check != "ok":
+        os.remove(tmp_path)
+        raise BackupError(f"Snapshot of {source_path} failed its integrity check: {check}", status_code=500)
+    os.replace(tmp_path, target_path)
+    return stats
+
+class _Restarted(Exception):
+    pass
+
+def take_snapshot() -> dict:
+    """Copies the catalog and any shard files into a new snapshot directory."""
+    name = SNAPSHOT_PREFIX + _stamp()
+    tmp_dir = os.path.join(BACKUP_DIR, "." + name)
+    os.makedirs(tmp_dir)
+    try:
+        for label, engine in _engines():
+            source = _database_path(engine)
+            target = os.path.join(tmp_dir, os.path.basename(source)) if label is None \
+                else os.path.join(tmp_dir, "shards", os.path.basename(source))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            copy_database(source, target)
+        # After the databases, so every segment they reference is already on disk
+        archive = audit_archive.archive_dir()
+        if os.path.isdir(archive):
+            shutil.copytree(archive, os.path.join(tmp_dir, SNAPSHOT_ARCHIVE), ignore=shutil.ignore_patterns("*.tmp"))
+        os.replace(tmp_dir, os.path.join(BACKUP_DIR, name))
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return describe(name)
+
+def rotate(keep: int = None) -> list:
+    """Deletes all but the newest `keep` snapshots; returns the removed names."""
+    keep = BACKUP_KEEP if keep is None else keep
+    snapshots = sorted(b["name"] for b in list_backups() if b["kind"] == "snapshot")
+    removed = snapshots[:max(len(snapshots) - keep, 0)]
+    for name in removed:
+        shutil.rmtree(os.path.join(BACKUP_DIR, name))
+    return removed
+
+def describe(name: str) -> dict:
+    path = path_for(name)
+    if not os.path.exists(path):
+        raise BackupError(f"Backup {name} not found", status_code=404)
+    if os.path.isdir(path):
+        files = [f for f in glob.glob(os.path.join(path, "**", "*"), recursive=True) if os.path.isfile(f)]
+        kind, size = "snapshot", sum(os.path.getsize(f) for f in files)
+    else:
+        kind, size = "dump", os.path.getsize(path)
+    return {"name": name, "kind": kind, "size": size,
+            "created_at": datetime.utcfromtimestamp(os.path.getmtime(path))}
+
+def list_backups() -> list:
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    names = [n for n in os.listdir(BACKUP_DIR)
+             if (n.startswith(SNAPSHOT_PREFIX) and os.path.isdir(os.path.join(BACKUP_DIR, n))) or n.endswith(DUMP_SUFFIX)]
+    return sorted((describe(n) for n in names), key=lambda b: b["created_at"], reverse=True)
+
+async def run_schedule():
+    """Takes and rotates snapshots every BACKUP_INTERVAL_MINUTES until cancelled."""
+    while True:
+        await asyncio.sleep(BACKUP_INTERVAL_MINUTES * 60)
+        try:
+            snapshot = await asyncio.to_thread(take_snapshot)
+            await asyncio.to_thread(rotate)
+            print(f"Backup: wrote {snapshot['name']} ({snapshot['size']} bytes)")
+        except Exception as e:
+            print(f"Backup failed: {e}")
+
+# --- Portable dumps ---
+
+def _encode(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _audit_projects(conn, label, rows) -> list:
+    # A shard holds one project's events; otherwise resolve them like the archive does
+    if database.SHARDING:
+        return [label] * len(rows)
+    projects = audit_archive.projects_of(conn, {row.req_id for row in rows if row.req_id is not None})
+    return [projects.get(row.req_id) for row in rows]
+
+def _dump_rows(engine, table_name):
+    table = models.Base.metadata.tables[table_name]
+    columns = [table.c[name] for name in DUMP_TABLES[table_name]]
+    order = [table.c[name] for name in DUMP_ORDER[table_name]]
+    with engine.connect() as conn:
+        for row in conn.execution_options(yield_per=RESTORE_BATCH_SIZE).execute(select(*columns).order_by(*order)):
+            yield [_encode(v) for v in row]
+
+def _audit_rows(engine, label):
+    """
+    One database's hot audit rows, then its archived ones. Events compacted while
+    the hot rows were read turn up in both tiers; the archive's copy is skipped.
+    """
+    audit = models.AuditLog.__table__
+    names = DUMP_TABLES["audit_logs"]
+    columns = [audit.c[name] for name in names if name != "project_id"]
+    order = [audit.c[name] for name in DUMP_ORDER["audit_logs"]]
+    dumped = set()
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=RESTORE_BATCH_SIZE).execute(select(audit.c.id, *columns).order_by(*order))
+        for rows in result.partitions():
+            for row, project_id in zip(rows, _audit_projects(conn, label, rows)):
+                dumped.add(row.id)
+                yield [_encode(v) for v in row[1:]] + [project_id]
+        for event in audit_archive.archived_rows(conn):
+            if event["id"] not in dumped:
+                yield [_encode(event[name]) for name in names]
+
+def write_dump(path: str = None) -> dict:
+    """Writes all projects, requirements, traces and audit logs to a gzip NDJSON file."""
+    path = path or os.path.join(BACKUP_DIR, f"dump-{_stamp()}{DUMP_SUFFIX}")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    engines = _engines()
+    counts = {}
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=5) as out:
+        out.write(json.dumps({"format": DUMP_FORMAT, "version": DUMP_VERSION, "created_at": datetime.utcnow().isoformat()}) + "\n")
+        for table_name, columns in DUMP_TABLES.items():
+            out.write(json.dumps({"table": table_name, "columns": columns}) + "\n")
+            if table_name == "audit_logs":
+                # The catalog as well: it indexes the events archived before the database was sharded
+                sources = [_audit_rows(engine, label) for label, engine in engines]
+            else:
+                sources = [_dump_rows(engine, table_name) for _, engine in
+                           (engines[:1] if table_name in database.CATALOG_TABLES or not database.SHARDING else engines[1:])]
+            counts[table_name] = 0
+            for rows in sources:
+                for row in rows:
+                    out.write(json.dumps(row, separators=(",", ":")) + "\n")
+                    counts[table_name] += 1
+    os.replace(tmp_path, path)
+    return {"path": path, "counts": counts}
+
+def read_dump(path: str):
+    """Yields (table_name, columns, rows) per table section; rows is a lazy iterator."""
+    with gzip.open(path, "rt", encoding="utf-8") as src:
+        header = json.loads(src.readline() or "{}")
+        if header.get("format") != DUMP_FORMAT or header.get("version") != DUMP_VERSION:
+            raise BackupError(f"{os.path.basename(path)} is not a version {DUMP_VERSION} dump")
+        section, pending = None, []
+        for line in src:
+            item = json.loads(line)
+            if isinstance(item, dict):
+                if section:
+                    yield section["table"], section["columns"], iter(pending)
+                section, pending = item, []
+                if section["table"] not in DUMP_TABLES:
+                    raise BackupError(f"Unknown table {section['table']} in dump")
+                continue
+            pending.append(item)
+            if len(pending) >= RESTORE_BATCH_SIZE:
+                yield section["table"], section["columns"], iter(pending)
+                pending = []
+        if section:
+            yield section["table"], section["columns"], iter(pending)
+
+class _Target:
+    """One database being restored into: an open transaction with deferred indexes."""
+    def __init__(self, engine):
+        self.conn = engine.connect()
+        self.pragmas = {name: self.conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in ("synchronous", "cache_size")}
+        self.conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        self.conn.exec_driver_sql("PRAGMA cache_size=-262144") # 256 MB while loading
+        self.conn.commit()
+        self.trans = self.conn.begin()
+        # The sync counter never moves backwards, so existing clients pick up every restored row
+        self.last_seq = sync.current_seq(self.conn)
+        self.before = _contents(self.conn)
+        for table in reversed(models.Base.metadata.sorted_tables):
+            if table.name in PURGED_ON_RESTORE:
+                self.conn.execute(delete(table))
+        self.indexes = [index for name in DUMP_TABLES for index in models.Base.metadata.tables[name].indexes]
+        for index in self.indexes:
+            self.conn.execute(DropIndex(index, if_exists=True))
+
+    def insert(self, table, records):
+        if "change_seq" in table.c:
+            # Stamped on the way in, which saves a sync.backfill pass over every row
+            for seq, record in enumerate(records, self.last_seq + 1):
+                record["change_seq"] = seq
+            self.last_seq += len(records)
+        self.conn.execute(insert(table), records)
+
+    def finish(self, gone_projects=()):
+        """Rebuilds the indexes and derived state, tombstones what the dump lacked and commits."""
+        for index in self.indexes:
+            self.conn.execute(CreateIndex(index, if_not_exists=True))
+        now = datetime.utcnow()
+        after = _contents(self.conn)
+        gone = {r: p for r, p in self.before["requirements"].items() if r not in after["requirements"]}
+        # Same rows sync.tombstone_for builds, numbered after the restored rows
+        tombstones = [{"entity": "trace", "entity_id": None, "source_id": s, "target_id": t, "project_id": None}
+                      for s, t in sorted(self.before["traces"] - after["traces"])]
+        tombstones += [{"entity": "requirement", "entity_id": r, "source_id": None, "target_id": None, "project_id": p}
+                       for r, p in sorted(gone.items())]
+        tombstones += [{"entity": "project", "entity_id": str(p), "source_id": None, "target_id": None, "project_id": p}
+                       for p in sorted(gone_projects)]
+        for seq, row in enumerate(tombstones, self.last_seq + 1):
+            row.update(seq=seq, deleted_at=now)
+        if tombstones:
+            self.conn.execute(insert(models.Tombstone), tombstones)
+            self.last_seq += len(tombstones)
+        self.conn.execute(insert(models.ChangeCounter).values(id=1, value=self.last_seq))
+        history.backfill(self.conn) # Requirements new to this database, as of their last update
+        # Checkpoints taken now override whatever history said before the restore
+        history.write_checkpoints(self.conn, history.states(self.conn, after["requirements"]), now, deleted=sorted(gone))
+        facets.backfill(self.conn) # Dumps taken before the column existed
+        audit_archive.drop_archived(self.conn)
+        metrics.recompute(self.conn)
+        self.trans.commit()
+
+    def close(self):
+        if self.trans.is_active:
+            self.trans.rollback()
+        for name, value in self.pragmas.items():
+            self.conn.exec_driver_sql(f"PRAGMA {name}={value}")
+        self.conn.commit()
+        self.conn.close()
+
+def _contents(conn) -> dict:
+    """Keys of the projects, requirements (with their project) and traces in one database."""
+    req, trace = models.Requirement.__table__, models.Trace.__table__
+    return {
+        "projects": set(conn.execute(select(models.Project.__table__.c.id)).scalars()),
+        "requirements": dict(conn.execute(select(req.c.id, req.c.project_id)).all()),
+        "traces": {tuple(row) for row in conn.execute(select(trace.c.source_id, trace.c.target_id))},
+    }
+
+def _decode_rows(table, columns, rows):
+    datetime_columns = [name for name in columns if name in table.c and table.c[name].type.python_type is datetime]
+    for row in rows:
+        record = dict(zip(columns, row))
+        for name in datetime_columns:
+            if record[name] is not None:
+                record[name] = datetime.fromisoformat(record[name])
+        yield record
+
+def restore_dump(path: str) -> dict:
+    """Replaces the dumped tables' contents with the dump. Runs in one transaction per database."""
+    if not os.path.exists(path):
+        raise BackupError(f"Dump {os.path.basename(path)} not found", status_code=404)
+    for _ in read_dump(path): # Validates the header before anything is deleted
+        break
+
+    targets = {}
+    floor = 0
+    def target_for(project_id):
+        key = project_id if database.SHARDING else "catalog"
+        if key not in targets:
+            targets[key] = _Target(database.shard_engine(project_id) if database.SHARDING else database.engine)
+            targets[key].last_seq = max(targets[key].last_seq, floor)
+        return targets[key]
+
+    counts = {name: 0 for name in DUMP_TABLES}
+    req_projects, project_ids = {}, set()
+    # Shards of projects that are about to disappear are emptied as well
+    current_shards = [label for label, _ in _engines()[1:]]
+    try:
+        catalog = targets["catalog"] = _Target(database.engine)
+        for project_id in current_shards:
+            target_for(project_id)
+        # A sharded client's cursor mixes catalog and shard sequence numbers, so everything
+        # the restore writes is numbered above the highest counter of any database
+        floor = max(target.last_seq for target in targets.values())
+        for target in targets.values():
+            target.last_seq = floor
+
+        for table_name, columns, rows in read_dump(path):
+            table = models.Base.metadata.tables[table_name]
+            records = list(_decode_rows(table, columns, rows))
+            counts[table_name] += len(records)
+            if not records:
+                continue
+            # Dumps from before audit rows carried a project fall back to the restored requirements
+            hints = [record.pop("project_id", None) for record in records] if table_name == "audit_logs" else None
+            if table_name == "projects":
+                project_ids.update(record["id"] for record in records)
+            if table_name == "projects" or not database.SHARDING:
+                catalog.insert(table, records)
+                if table_name == "requirements":
+                    req_projects.update((r["id"], r["project_id"]) for r in records)
+                continue
+            batches = {}
+            for i, record in enumerate(records):
+                if table_name == "requirements":
+                    req_projects[record["id"]] = project_id = record["project_id"]
+                elif table_name == "traces":
+                    project_id = req_projects.get(record["source_id"])
+                else:
+                    project_id = req_projects.get(record["req_id"], hints[i])
+                batches.setdefault(project_id, []).append(record)
+            for project_id, batch in batches.items():
+                target_for(project_id).insert(table, batch)
+
+        # In sharded mode a project's tombstone goes to its shard, which is what its clients sync from
+        gone_projects = catalog.before["projects"] - project_ids
+        for key, target in targets.items():
+            target.finish(gone_projects if not database.SHARDING else gone_projects & {key})
+    finally:
+        for target in targets.values():
+            target.close()
+
+    if database.SHARDING:
+        sharding.rebuild_directory()
+    return {"counts": counts}
+
+def index_duplicates() -> int:
+    """
+    Computes MinHash signatures for requirements that lack them, e.g. after a restore.
+    Kept out of restore_dump: it costs more than the restore itself on large databases.
+    """
+    indexed = 0
+    for label, _ in (_engines()[1:] if database.SHARDING else [(None, None)]):
+        db = database.SessionLocal()
+        try:
+            sharding.route(db, label)
+            indexed += minhash.index_missing(db)
+            db.commit()
+        finally:
+            db.close()
+    return indexed
@@ -0,0 +1,176 @@
+"""
+Content-addressed project baselines.
+
+Every requirement version is stored once in `requirement_versions`, keyed by a
+hash over its canonical field values. A baseline is a manifest of sorted
+(requirement id, version hash) lines plus the sorted trace edges, compressed
+and itself keyed by hash. Baselining an unchanged project therefore only adds
+one `baselines` row, and diffing two baselines is a merge of two manifests
+that never touches the requirement tables.
+"""
+import hashlib
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from types import SimpleNamespace
+from sqlalchemy import insert, select, or_
+from sqlalchemy.orm import Session
+from . import models
+
+VERSION_FIELDS = ("id", "title", "description", "rationale", "priority", "status", "parent_id", "project_id")
+CHUNK_SIZE = 500
+MANIFEST_CACHE_SIZE = 16
+
+_manifests = OrderedDict() # manifest hash -> decoded manifest; manifests never change
+_manifests_lock = threading.Lock()
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def canonical(row) -> str:
+    """JSON array of the VERSION_FIELDS values, in that order."""
+    return json.dumps(list(row), separators=(",", ":"), ensure_ascii=False)
+
+def encode_manifest(requirements, traces) -> bytes:
+    # Tab-separated lines split much faster than JSON parses; IDs never contain tabs
+    lines = [f"{req_id}\t{h}" for req_id, h in sorted(requirements)]
+    lines.append("")
+    lines += [f"{s}\t{t}" for s, t in sorted(traces)]
+    return "\n".join(lines).encode()
+
+def decode_manifest(raw: bytes) -> dict:
+    req_part, _, trace_part = raw.decode().partition("\n\n")
+    return {
+        "requirements": dict(line.split("\t") for line in req_part.split("\n") if line),
+        "traces": {tuple(line.split("\t")) for line in trace_part.split("\n") if line},
+    }
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start:start + CHUNK_SIZE]
+
+def create(db: Session, project_id: int, name: str, description: str = None) -> models.Baseline:
+    req = models.Requirement
+    rows = db.query(*[getattr(req, f) for f in VERSION_FIELDS]).filter(req.project_id == project_id).all()
+
+    versions = {}
+    for row in rows:
+        content = canonical(row)
+        versions[content_hash(content.encode())] = (row.id, content)
+
+    in_project = select(req.id).where(req.project_id == project_id)
+    known = set(db.execute(
+        select(models.RequirementVersion.hash).where(models.RequirementVersion.req_id.in_(in_project))
+    ).scalars())
+    new_versions = [{"hash": h, "req_id": r, "content": c} for h, (r, c) in versions.items() if h not in known]
+    if new_versions:
+        db.execute(insert(models.RequirementVersion), new_versions)
+
+    edges = db.query(models.Trace.source_id, models.Trace.target_id).filter(
+        or_(models.Trace.source_id.in_(in_project), models.Trace.target_id.in_(in_project))
+    ).all()
+
+    raw = encode_manifest([(row_id, h) for h, (row_id, _) in versions.items()], edges)
+    manifest_hash = content_hash(raw)
+    if not db.get(models.BaselineManifest, manifest_hash):
+        db.add(models.BaselineManifest(hash=manifest_hash, body=zlib.compress(raw, 6)))
+
+    baseline = models.Baseline(
+        project_id=project_id,
+        name=name,
+        description=description,
+        manifest_hash=manifest_hash,
+        requirement_count=len(versions),
+        trace_count=len(edges),
+    )
+    db.add(baseline)
+    db.add(models.AuditLog(action="BASELINE", details=f"Baseline '{name}' of project {project_id}: "
+                           f"{baseline.requirement_count} requirements, {len(new_versions)} new versions"))
+    db.flush()
+    return baseline
+
+def manifest(db: Session, manifest_hash: str) -> dict:
+    """{"requirements": {req_id: version hash}, "traces": {(source, target)}} for a manifest."""
+    with _manifests_lock:
+        if manifest_hash in _manifests:
+            _manifests.move_to_end(manifest_hash)
+            return _manifests[manifest_hash]
+
+    body = db.execute(
+        select(models.BaselineManifest.body).where(models.BaselineManifest.hash == manifest_hash)
+    ).scalar_one()
+    decoded = decode_manifest(zlib.decompress(body))
+    with _manifests_lock:
+        _manifests[manifest_hash] = decoded
+        while len(_manifests) > MANIFEST_CACHE_SIZE:
+            _manifests.popitem(last=False)
+    return decoded
+
+def load_versions(db: Session, hashes) -> dict:
+    """{version hash: field dict} for the given hashes."""
+    contents = {}
+    for chunk in _chunks(hashes):
+        for h, content in db.query(models.RequirementVersion.hash, models.RequirementVersion.content) \
+                .filter(models.RequirementVersion.hash.in_(chunk)):
+            contents[h] = dict(zip(VERSION_FIELDS, json.loads(content)))
+    return contents
+
+def diff(db: Session, old: models.Baseline, new: models.Baseline) -> dict:
+    """
+    Added, removed and modified requirements and added/removed traces between two
+    baselines. Only the versions of modified requirements are loaded, to name the
+    fields that changed.
+    """
+    a = manifest(db, old.manifest_hash)
+    b = manifest(db, new.manifest_hash)
+    a_reqs, b_reqs = a["requirements"], b["requirements"]
+
+    modified = sorted(r for r, h in b_reqs.items() if r in a_reqs and a_reqs[r] != h)
+    versions = load_versions(db, [a_reqs[r] for r in modified] + [b_reqs[r] for r in modified])
+    changes = []
+    for req_id in modified:
+        before, after = versions[a_reqs[req_id]], versions[b_reqs[req_id]]
+        changes.append({"id": req_id, "fields": [f for f in VERSION_FIELDS if before.get(f) != after.get(f)]})
+
+    return {
+        "from_id": old.id,
+        "to_id": new.id,
+        "added": sorted(b_reqs.keys() - a_reqs.keys()),
+        "removed": sorted(a_reqs.keys() - b_reqs.keys()),
+        "modified": changes,
+        "traces_added": [{"source_id": s, "target_id": t} for s, t in sorted(b["traces"] - a["traces"])],
+        "traces_removed": [{"source_id": s, "target_id": t} for s, t in sorted(a["traces"] - b["traces"])],
+    }
+
+def snapshot(db: Session, baseline: models.Baseline):
+    """
+    Rebuilds a baseline's requirements as plain objects shaped like the ORM rows
+    (project, outgoing/incoming traces included) for the export generators.
+    Returns (requirements, traces).
+    """
+    data = manifest(db, baseline.manifest_hash)
+    versions = load_versions(db, data["requirements"].values())
+    projects = {p.id: SimpleNamespace(id=p.id, name=p.name) for p in db.query(models.Project.id, models.Project.name)}
+
+    reqs = {}
+    for req_id, h in data["requirements"].items():
+        fields = versions[h]
+        reqs[req_id] = SimpleNamespace(
+            **fields,
+            project=projects.get(fields["project_id"]),
+            updated_at=baseline.created_at,
+            outgoing_traces=[],
+            incoming_traces=[],
+        )
+
+    traces = []
+    for source_id, target_id in sorted(data["traces"]):
+        trace = SimpleNamespace(source_id=source_id, target_id=target_id)
+        traces.append(trace)
+        if source_id in reqs:
+            reqs[source_id].outgoing_traces.append(trace)
+        if target_id in reqs:
+            reqs[target_id].incoming_traces.append(trace)
+    return list(reqs.values()), traces
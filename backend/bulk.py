@@ -0,0 +1,153 @@
+"""
+Set-based writes over many requirements at once.
+
+A bulk status transition reads the scope once, checks every move against
+models.STATUS_TRANSITIONS, then applies it with one UPDATE and inserts the
+audit and history rows with executemany, all on the caller's transaction.
+Because the ORM is bypassed, the bookkeeping the flush listeners would do
+(sync sequence, metrics counters, field history) is done here explicitly.
+
+A subtree delete resolves the subtree with a recursive CTE and fetches every
+trace touching it together with both endpoints' status in one join, so a link
+to an Approved requirement anywhere in the tree blocks the delete. Rows are
+then removed with a handful of DELETEs per chunk of IDs, leaving tombstones,
+deletion checkpoints and one audit row per removed requirement.
+"""
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import select, update, insert, delete, func, or_
+from . import models, database, sync, metrics, history, embeddings, minhash, sharding
+from .graph import subtree_cte
+
+CHUNK_SIZE = 500
+
+def _chunks(ids):
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+class TransitionError(Exception):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+def scope_filter(project_id: int = None, root_id: str = None, ids=None):
+    """WHERE clause for a project, a subtree (root included) or an explicit ID list."""
+    req = models.Requirement.__table__
+    if project_id is not None:
+        return req.c.project_id == project_id
+    if root_id is not None:
+        return req.c.id.in_(select(subtree_cte([root_id]).c.id))
+    return req.c.id.in_(list(ids))
+
+def transition_status(conn, scope, target: str, now: datetime = None, author: str = "System") -> dict:
+    """
+    Moves every requirement in `scope` to `target`. Requirements already there are
+    left alone; if any other one may not make the move, nothing is changed.
+    """
+    req = models.Requirement.__table__
+    now = now or datetime.utcnow()
+    in_scope = conn.execute(select(req.c.id, req.c.status, req.c.project_id).where(scope).order_by(req.c.id)).all()
+    rows = [r for r in in_scope if r.status != target]
+    unchanged = len(in_scope) - len(rows)
+
+    invalid = [r for r in rows if target not in models.STATUS_TRANSITIONS.get(r.status, ())]
+    if invalid:
+        sample = ", ".join(f"{r.id} ({r.status})" for r in invalid[:10])
+        more = f" and {len(invalid) - 10} more" if len(invalid) > 10 else ""
+        raise TransitionError(f"Cannot move {len(invalid)} requirement(s) to {target}: {sample}{more}")
+    if not rows:
+        return {"updated": 0, "unchanged": unchanged, "by_previous_status": {}}
+
+    # One statement; row_number hands each row its own sync sequence number, as a flush would
+    start = sync.reserve_seq(conn, len(rows))
+    ranked = select(req.c.id, func.row_number().over(order_by=req.c.id).label("rn")) \
+        .where(scope, req.c.status != target).subquery()
+    conn.execute(
+        update(req).where(req.c.id == ranked.c.id)
+        .values(status=target, updated_at=now, change_seq=start + ranked.c.rn - 1)
+    )
+
+    conn.execute(insert(models.AuditLog), [
+        {"req_id": r.id, "timestamp": now, "author": author, "action": "UPDATE", "details": f"Status: {r.status} -> {target}"}
+        for r in rows
+    ])
+    history.record_changes(conn, [(r.id, "status", r.status, target) for r in rows], now)
+
+    # Only the status counters move; feed apply_delta one aggregate per project
+    moved = Counter((r.project_id, r.status) for r in rows)
+    before, after = {}, {}
+    for (project_id, status), n in moved.items():
+        if project_id is None:
+            continue
+        before.setdefault(project_id, (project_id, Counter()))[1][f"status:{status}"] += n
+        after.setdefault(project_id, (project_id, Counter()))[1][f"status:{target}"] += n
+    metrics.apply_delta(conn, before, after)
+
+    previous = Counter()
+    for (_, status), n in moved.items():
+        previous[status] += n
+    return {"updated": len(rows), "unchanged": unchanged, "by_previous_status": dict(previous)}
+
+def plan_subtree_delete(conn, root_id: str) -> dict:
+    """What deleting root_id would remove, and the trace links that forbid it."""
+    req, trace = models.Requirement.__table__, models.Trace.__table__
+    subtree = subtree_cte([root_id])
+    nodes = conn.execute(
+        select(req.c.id, req.c.parent_id, req.c.project_id).where(req.c.id.in_(select(subtree.c.id))).order_by(req.c.id)
+    ).all()
+    source, target = req.alias("source"), req.alias("target")
+    links = conn.execute(
+        select(trace.c.source_id, trace.c.target_id, source.c.status.label("source_status"), target.c.status.label("target_status"))
+        .outerjoin(source, source.c.id == trace.c.source_id)
+        .outerjoin(target, target.c.id == trace.c.target_id)
+        .where(or_(trace.c.source_id.in_(select(subtree.c.id)), trace.c.target_id.in_(select(subtree.c.id))))
+        .order_by(trace.c.source_id, trace.c.target_id)
+    ).all()
+    approved = models.RequirementStatus.APPROVED.value
+    return {
+        "root_id": root_id,
+        "requirements": [n.id for n in nodes],
+        "project_ids": {n.id: n.project_id for n in nodes},
+        "parent_id": next((n.parent_id for n in nodes if n.id == root_id), None),
+        "traces": [(l.source_id, l.target_id) for l in links],
+        "blocked": [(l.source_id, l.target_id) for l in links if approved in (l.source_status, l.target_status)],
+    }
+
+def delete_subtree(db, plan: dict, now: datetime = None, author: str = "System"):
+    """Carries out a plan from plan_subtree_delete that has no blocked links."""
+    now = now or datetime.utcnow()
+    conn = db.connection()
+    ids, links = plan["requirements"], plan["traces"]
+    removed = set(ids)
+    neighbours = {e for link in links for e in link} - removed
+    if plan["parent_id"]:
+        neighbours.add(plan["parent_id"])
+    before = metrics.facts(conn, removed | neighbours)
+
+    seq = sync.reserve_seq(conn, len(ids) + len(links))
+    tombstones = [{"seq": seq + i, "entity": "trace", "entity_id": None, "source_id": s, "target_id": t,
+                   "project_id": None, "deleted_at": now} for i, (s, t) in enumerate(links)]
+    seq += len(links)
+    tombstones += [{"seq": seq + i, "entity": "requirement", "entity_id": r, "source_id": None, "target_id": None,
+                    "project_id": plan["project_ids"][r], "deleted_at": now} for i, r in enumerate(ids)]
+    conn.execute(insert(models.Tombstone), tombstones)
+    history.write_checkpoints(conn, {}, now, deleted=ids)
+
+    link_counts = Counter(e for link in links for e in link)
+    conn.execute(insert(models.AuditLog), [
+        {"req_id": r, "timestamp": now, "author": author, "action": "DELETE",
+         "details": f"Deleted requirement {r}" + (f" (subtree of {plan['root_id']})" if r != plan["root_id"] else "")
+                    + (f"; removed {link_counts[r]} trace link(s)" if link_counts[r] else "")}
+        for r in ids
+    ])
+
+    trace, req = models.Trace.__table__, models.Requirement.__table__
+    for chunk in _chunks(ids):
+        conn.execute(delete(trace).where(or_(trace.c.source_id.in_(chunk), trace.c.target_id.in_(chunk))))
+        embeddings.forget(db, chunk)
+        minhash.forget(db, chunk)
+        conn.execute(delete(req).where(req.c.id.in_(chunk)))
+        if database.SHARDING:
+            sharding.remove_from_directory(db, {r: plan["project_ids"][r] for r in chunk})
+
+    metrics.apply_delta(conn, before, metrics.facts(conn, neighbours))
@@ -0,0 +1,20 @@
+import os
+import tempfile
+import pytest
+
+# Point the app at a throwaway database before backend.database is imported
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/reqtool-test.db")
+# Tests that need the embedding index enable it with a fake Ollama
+os.environ.setdefault("EMBEDDINGS_ENABLED", "0")
+
+from fastapi.testclient import TestClient
+from backend.main import app
+from backend import models, database
+
+@pytest.fixture
+def client():
+    with TestClient(app) as c:
+        yield c
+    with database.engine.begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            conn.execute(table.delete())
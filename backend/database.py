@@ -1,20 +1,100 @@
+import asyncio
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base
+import threading
+import weakref
+from sqlalchemy import create_engine, event, Table
+from sqlalchemy.orm import declarative_base, Session
 from sqlalchemy.orm import sessionmaker
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./reqtool.db")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Sharded mode: the database above becomes the catalog, and each project's
+# requirements, traces, audit rows etc. live in their own SQLite file. See sharding.py.
+SHARDING = os.getenv("DATABASE_SHARDING", "0") == "1"
+SHARD_DIR = os.getenv("DATABASE_SHARD_DIR", "./shards")
+CATALOG_TABLES = {"projects", "requirement_shards", "generation_jobs", "generation_job_items", "baselines"}
+
+# A capped pool used to deadlock under load (found by scripts/loadtest.py): a sync endpoint's
+# response is serialized, and its session closed, after the endpoint returns, which needs a
+# threadpool worker, and none was free once all 40 were blocked in checkout. get_db therefore
+# admits fewer request sessions than there are connections, so checkout does not block on
+# other requests, and the checkout timeout turns any leftover stall into an error.
+POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "10"))
+POOL_MAX_OVERFLOW = int(os.getenv("DATABASE_POOL_MAX_OVERFLOW", "30"))
+POOL_TIMEOUT = float(os.getenv("DATABASE_POOL_TIMEOUT", "30")) # Seconds to wait for a connection
+# Leaves connections for background work (jobs, embeddings, backups) outside requests
+MAX_REQUEST_SESSIONS = int(os.getenv("DATABASE_MAX_REQUEST_SESSIONS", "32"))
+ENGINE_OPTIONS = {"connect_args": {"check_same_thread": False}, "pool_size": POOL_SIZE,
+                  "max_overflow": POOL_MAX_OVERFLOW, "pool_timeout": POOL_TIMEOUT}
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **ENGINE_OPTIONS)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+_shard_engines = {}
+_shard_lock = threading.Lock()
+
+def shard_name(project_id) -> str:
+    return f"project_{project_id}" if project_id is not None else "unassigned"
+
+def shard_engine(project_id):
+    """Engine for a project's shard file, created or upgraded to the current schema on first use."""
+    name = shard_name(project_id)
+    with _shard_lock:
+        shard = _shard_engines.get(name)
+        if shard is None:
+            os.makedirs(SHARD_DIR, exist_ok=True)
+            shard = create_engine(f"sqlite:///{os.path.join(SHARD_DIR, name)}.db", **ENGINE_OPTIONS)
+            # WAL lets fan-out readers proceed while the shard's single writer commits
+            event.listen(shard, "connect", lambda dbapi_conn, _: dbapi_conn.execute("PRAGMA journal_mode=WAL"))
+            # Imported here: migrations needs the models, which need this module
+            from . import migrations
+            migrations.upgrade(shard)
+            _shard_engines[name] = shard
+        return shard
+
+def dispose_shards():
+    with _shard_lock:
+        for shard in _shard_engines.values():
+            shard.dispose()
+        _shard_engines.clear()
+
+def _table_name(mapper, clause):
+    if mapper is not None:
+        return mapper.persist_selectable.name
+    table = getattr(clause, "table", None) # INSERT/UPDATE/DELETE
+    if table is None and clause is not None and hasattr(clause, "get_final_froms"):
+        table = next((f for f in clause.get_final_froms() if isinstance(f, Table)), None)
+    return getattr(table, "name", None)
+
+class RoutingSession(Session):
+    """
+    Outside sharded mode this is a plain Session. In sharded mode, catalog tables go to
+    the catalog engine and everything else to the shard picked by sharding.route(); a
+    session talks to the catalog plus at most one shard.
+    """
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if not SHARDING:
+            return super().get_bind(mapper=mapper, clause=clause, **kw)
+        table = _table_name(mapper, clause)
+        if table in CATALOG_TABLES or (table is None and "shard" not in self.info):
+            return engine
+        if "shard" not in self.info:
+            raise RuntimeError(f"Session is not routed to a project shard (accessing {table})")
+        return shard_engine(self.info["shard"])
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=RoutingSession)
+
+_admission = weakref.WeakKeyDictionary() # Event loop -> semaphore; test clients each run their own loop
+
+async def get_db():
+    # Requests over the limit wait here on the event loop, not in a worker thread
+    loop = asyncio.get_running_loop()
+    if loop not in _admission:
+        _admission[loop] = asyncio.Semaphore(MAX_REQUEST_SESSIONS)
+    async with _admission[loop]:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
@@ -0,0 +1,215 @@
+"""
+Semantic similarity index over requirement embeddings.
+
+Vectors come from Ollama's embedding API and are persisted as normalized
+float32 blobs in `requirement_embeddings`. Each process keeps them in one
+contiguous (n, dim) array so a top-k cosine query is a single matrix-vector
+product plus argpartition, a few milliseconds even for 100k requirements.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+from datetime import datetime
+import numpy as np
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+from . import models, database, ai_service, sharding
+
+ENABLED = os.getenv("EMBEDDINGS_ENABLED", "1") == "1"
+REINDEX_BATCH_SIZE = 64
+
+class EmbeddingIndex:
+    def __init__(self, dim: int = 0, capacity: int = 1024):
+        self.dim = dim
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.ids = []
+        self.rows = {} # req_id -> row in self.vectors
+        self.synced_at = None # Newest updated_at already loaded from the database
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def upsert(self, req_id: str, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        with self.lock:
+            if self.dim != vector.shape[0]:
+                # First vector, or the embedding model changed dimensions; start over
+                self.dim = vector.shape[0]
+                self.vectors = np.zeros((max(1024, len(self.ids)), self.dim), dtype=np.float32)
+                self.ids = []
+                self.rows = {}
+            row = self.rows.get(req_id)
+            if row is None:
+                row = len(self.ids)
+                if row == self.vectors.shape[0]:
+                    grown = np.zeros((row * 2, self.dim), dtype=np.float32)
+                    grown[:row] = self.vectors
+                    self.vectors = grown
+                self.ids.append(req_id)
+                self.rows[req_id] = row
+            self.vectors[row] = vector
+
+    def remove(self, req_id: str):
+        with self.lock:
+            row = self.rows.pop(req_id, None)
+            if row is None:
+                return
+            # Move the last row into the hole to keep the array dense
+            last = len(self.ids) - 1
+            if row != last:
+                moved = self.ids[last]
+                self.vectors[row] = self.vectors[last]
+                self.ids[row] = moved
+                self.rows[moved] = row
+            self.ids.pop()
+
+    def vector(self, req_id: str):
+        with self.lock:
+            row = self.rows.get(req_id)
+            return None if row is None else self.vectors[row].copy()
+
+    def top_k(self, query, k: int, exclude=()):
+        """Returns [(req_id, cosine score)] for the k most similar vectors."""
+        with self.lock:
+            n = len(self.ids)
+            if n == 0 or query is None:
+                return []
+            scores = self.vectors[:n] @ np.asarray(query, dtype=np.float32)
+            for req_id in exclude:
+                row = self.rows.get(req_id)
+                if row is not None:
+                    scores[row] = -np.inf
+            k = min(k, n)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self.ids[i], float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+_indexes = {} # (model, shard) -> EmbeddingIndex
+_indexes_lock = threading.Lock()
+
+def normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def content_text(title: str, description: str = None) -> str:
+    return f"{title}\n{description or ''}".strip()
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode()).hexdigest()
+
+def get_index(db: Session, model: str = None) -> EmbeddingIndex:
+    """Returns this process' index, first pulling in vectors written by other workers."""
+    model = model or ai_service.EMBEDDING_MODEL
+    with _indexes_lock:
+        # One index per shard in sharded mode, so similarity stays within a project
+        index = _indexes.setdefault((model, db.info.get("shard")), EmbeddingIndex())
+
+    query = db.query(models.RequirementEmbedding).filter(models.RequirementEmbedding.model == model)
+    if index.synced_at is not None:
+        query = query.filter(models.RequirementEmbedding.updated_at > index.synced_at)
+    for row in query.order_by(models.RequirementEmbedding.updated_at):
+        index.upsert(row.req_id, np.frombuffer(row.vector, dtype=np.float32))
+        index.synced_at = row.updated_at
+    return index
+
+def _pending(req_ids, model):
+    """Loads texts for the given requirements and keeps those whose content changed."""
+    db = database.SessionLocal()
+    try:
+        sharding.route_requirement(db, req_ids[0]) # Callers pass requirements of one project
+        reqs = db.query(models.Requirement.id, models.Requirement.title, models.Requirement.description) \
+            .filter(models.Requirement.id.in_(req_ids)).all()
+        known = dict(
+            db.query(models.RequirementEmbedding.req_id, models.RequirementEmbedding.content_hash)
+            .filter(models.RequirementEmbedding.model == model, models.RequirementEmbedding.req_id.in_(req_ids))
+        )
+        pending = []
+        for req_id, title, description in reqs:
+            text = content_text(title, description)
+            digest = content_hash(text)
+            if known.get(req_id) != digest:
+                pending.append((req_id, text, digest))
+        return pending
+    finally:
+        db.close()
+
+def _store(model, pending, vectors):
+    db = database.SessionLocal()
+    try:
+        sharding.route_requirement(db, pending[0][0])
+        index = get_index(db, model)
+        now = datetime.utcnow()
+        for (req_id, _, digest), vector in zip(pending, vectors):
+            vector = normalize(vector)
+            db.merge(models.RequirementEmbedding(
+                req_id=req_id, model=model, content_hash=digest, vector=vector.tobytes(), updated_at=now
+            ))
+            index.upsert(req_id, vector)
+        db.commit()
+    finally:
+        db.close()
+
+async def refresh(req_ids, model: str = None):
+    """Embeds requirements whose title/description changed since they were last embedded."""
+    model = model or ai_service.EMBEDDING_MODEL
+    req_ids = list(req_ids)
+    for start in range(0, len(req_ids), REINDEX_BATCH_SIZE):
+        pending = await asyncio.to_thread(_pending, req_ids[start:start + REINDEX_BATCH_SIZE], model)
+        if not pending:
+            continue
+        vectors = await ai_service.embed([text for _, text, _ in pending], model)
+        await asyncio.to_thread(_store, model, pending, vectors)
+
+async def refresh_quietly(req_ids, model: str = None):
+    # Used as a background task on writes; a missing Ollama host must not break editing
+    try:
+        await refresh(req_ids, model)
+    except Exception as e:
+        print(f"Embedding refresh failed: {e}")
+
+def _query(req_id, k, exclude_linked, model):
+    db = database.SessionLocal()
+    try:
+        sharding.route_requirement(db, req_id)
+        index = get_index(db, model)
+        exclude = {req_id}
+        if exclude_linked:
+            req = db.get(models.Requirement, req_id)
+            exclude.update(t.target_id for t in req.outgoing_traces)
+            exclude.update(t.source_id for t in req.incoming_traces)
+            exclude.update(c.id for c in req.children)
+            if req.parent_id:
+                exclude.add(req.parent_id)
+
+        # Over-fetch a little: vectors of requirements deleted by other workers may still be loaded
+        hits = index.top_k(index.vector(req_id), k + 10, exclude)
+        found = {
+            r.id: r for r in db.query(models.Requirement.id, models.Requirement.title,
+                                      models.Requirement.status, models.Requirement.project_id)
+            .filter(models.Requirement.id.in_([h[0] for h in hits]))
+        }
+        return [
+            {"id": hit_id, "title": found[hit_id].title, "status": found[hit_id].status,
+             "project_id": found[hit_id].project_id, "score": score}
+            for hit_id, score in hits if hit_id in found
+        ][:k]
+    finally:
+        db.close()
+
+async def similar(req_id: str, k: int = 10, exclude_linked: bool = False, model: str = None):
+    """
+    Top-k requirements by cosine similarity. With exclude_linked, requirements already
+    traced to or from req_id (and its parent/children) are skipped, giving trace suggestions.
+    """
+    model = model or ai_service.EMBEDDING_MODEL
+    await refresh([req_id], model) # No-op unless the requirement changed since it was embedded
+    return await asyncio.to_thread(_query, req_id, k, exclude_linked, model)
+
+def forget(db: Session, req_ids):
+    db.execute(delete(models.RequirementEmbedding).where(models.RequirementEmbedding.req_id.in_(req_ids)))
+    for index in list(_indexes.values()):
+        for req_id in req_ids:
+            index.remove(req_id)
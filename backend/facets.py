@@ -0,0 +1,104 @@
+"""
+Server-side filtering and facet counts for the requirement list.
+
+Each filter is kept per facet so that a facet's counts can be computed with
+every *other* filter applied: with status=Draft selected, the status facet
+still shows how many Approved and Released rows the remaining filters match,
+which is what a filter sidebar needs. Facets without a filter of their own
+share one GROUP BY, which the (project_id, status, priority, ears_pattern)
+index answers without touching the table; each filtered facet adds one more.
+
+EARS compliance is a regex over the title (scripts/ears_verifier.py), which
+SQL cannot filter on, so the matched pattern is stored in
+``requirements.ears_pattern`` whenever a title is written.
+"""
+from sqlalchemy import event, func, inspect, literal_column, select, update, bindparam
+from sqlalchemy.orm import Session
+from . import models
+from .scripts.ears_verifier import EARS_PATTERNS, verify_ears
+
+NOT_EARS = "none"
+EARS_VALUES = tuple(EARS_PATTERNS) + (NOT_EARS,)
+FACETS = ("project_id", "status", "priority", "ears_pattern")
+BACKFILL_BATCH = 5000
+# Filtered pages keep the table order of the unfiltered list (and of the read model)
+# instead of whichever composite index the planner picked
+TABLE_ORDER = literal_column("requirements.rowid")
+
+def classify(title: str) -> str:
+    compliant, pattern, _ = verify_ears(title or "")
+    return pattern if compliant else NOT_EARS
+
+@event.listens_for(Session, "before_flush")
+def _classify_titles(session, flush_context, instances):
+    for obj in session.new:
+        if isinstance(obj, models.Requirement):
+            obj.ears_pattern = classify(obj.title)
+    for obj in session.dirty:
+        if isinstance(obj, models.Requirement) and inspect(obj).attrs.title.history.has_changes():
+            obj.ears_pattern = classify(obj.title)
+
+def backfill(conn):
+    """Classifies requirements written before the column existed or through Core inserts."""
+    req = models.Requirement.__table__
+    rows = conn.execute(select(req.c.id, req.c.title).where(req.c.ears_pattern.is_(None))).all()
+    stmt = update(req).where(req.c.id == bindparam("req_id")).values(ears_pattern=bindparam("pattern"))
+    for start in range(0, len(rows), BACKFILL_BATCH):
+        conn.execute(stmt, [{"req_id": r.id, "pattern": classify(r.title)} for r in rows[start:start + BACKFILL_BATCH]])
+    return len(rows)
+
+def filters(project_id=None, status=None, priority=None, parent_id=None, updated_since=None,
+            ears=None, ears_pattern=None) -> dict:
+    """Clauses for the given filters, keyed by the facet they restrict."""
+    req = models.Requirement
+    clauses = {}
+    if project_id is not None:
+        clauses["project_id"] = req.project_id == project_id
+    if status:
+        clauses["status"] = req.status.in_([getattr(s, "value", s) for s in status])
+    if priority:
+        clauses["priority"] = req.priority.in_(priority)
+    if ears_pattern:
+        clauses["ears_pattern"] = req.ears_pattern.in_(ears_pattern)
+    elif ears is not None:
+        clauses["ears_pattern"] = req.ears_pattern != NOT_EARS if ears else req.ears_pattern == NOT_EARS
+    # Not facets, so they always apply
+    if parent_id is not None:
+        clauses["parent_id"] = req.parent_id == parent_id
+    if updated_since is not None:
+        clauses["updated_since"] = req.updated_at >= updated_since
+    return clauses
+
+def _key(value) -> str:
+    return str(value) if value is not None else "null"
+
+def counts(db: Session, clauses: dict) -> dict:
+    """Total matching rows plus {facet: {value: count}}, each facet ignoring its own filter."""
+    req = models.Requirement
+    facets = {facet: {} for facet in FACETS}
+    # Facets without a filter of their own see the same rows: one GROUP BY over all of them,
+    # which also yields the total. count(*) lets SQLite stay on the covering indexes.
+    shared = [facet for facet in FACETS if facet not in clauses]
+    total = 0
+    for row in db.query(*[getattr(req, f) for f in shared], func.count()).filter(*clauses.values()).group_by(*[getattr(req, f) for f in shared]):
+        *values, n = row
+        total += n
+        for facet, value in zip(shared, values):
+            facets[facet][_key(value)] = facets[facet].get(_key(value), 0) + n
+    for facet in FACETS:
+        if facet in clauses:
+            column = getattr(req, facet)
+            others = [clause for name, clause in clauses.items() if name != facet]
+            facets[facet] = {_key(value): n for value, n in db.query(column, func.count()).filter(*others).group_by(column)}
+    return {"total": total, "facets": facets}
+
+def merge_counts(parts) -> dict:
+    """Adds up per-shard counts."""
+    merged = {"total": 0, "facets": {facet: {} for facet in FACETS}}
+    for part in parts:
+        merged["total"] += part["total"]
+        for facet, values in part["facets"].items():
+            bucket = merged["facets"][facet]
+            for value, n in values.items():
+                bucket[value] = bucket.get(value, 0) + n
+    return merged
@@ -0,0 +1,105 @@
+"""
+Set-based queries over the requirement hierarchy and trace graph.
+"""
+from sqlalchemy import select, union, union_all, func, literal
+from . import models
+
+def subtree_cte(root_ids, name: str = "subtree"):
+    """Recursive CTE yielding `id` for the given roots and all their descendants."""
+    req = models.Requirement
+    subtree = select(req.id).where(req.id.in_(list(root_ids))).cte(name, recursive=True)
+    return subtree.union_all(select(req.id).where(req.parent_id == subtree.c.id))
+
+def trace_closure_cte(seed_ids, hops: int, name: str = "closure"):
+    """
+    Recursive CTE yielding `id` (with its `depth`) for the seeds and every requirement
+    within `hops` trace links of them, following links in both directions.
+    """
+    req, trace = models.Requirement, models.Trace
+    closure = select(req.id.label("id"), literal(0).label("depth")).where(req.id.in_(list(seed_ids))) \
+        .cte(name, recursive=True)
+    # UNION, not UNION ALL: a node reached again at the same depth is not expanded twice
+    return closure.union(
+        select(trace.target_id, closure.c.depth + 1).where(trace.source_id == closure.c.id, closure.c.depth < hops),
+        select(trace.source_id, closure.c.depth + 1).where(trace.target_id == closure.c.id, closure.c.depth < hops),
+    )
+
+def scope_ids(project_ids=None, root_id: str = None, ids=None, hops: int = 0):
+    """
+    A SELECT of the requirement IDs in an export scope: the union of the given projects,
+    the subtree under root_id, and `ids` plus their `hops`-link trace closure. None when
+    no scope is given, meaning everything.
+    """
+    req = models.Requirement
+    parts = []
+    if project_ids:
+        parts.append(select(req.id).where(req.project_id.in_(list(project_ids))))
+    if root_id is not None:
+        parts.append(select(subtree_cte([root_id], "scope_subtree").c.id))
+    if ids:
+        parts.append(select(trace_closure_cte(ids, hops, "scope_closure").c.id))
+    if not parts:
+        return None
+    return union(*parts) if len(parts) > 1 else parts[0]
+
+def neighborhood(db, root_id: str, depth: int, max_nodes: int):
+    """
+    Collects the requirements within `depth` trace or parent/child hops of root_id.
+    The frontier is expanded one hop per query, then nodes, edges and degree counts
+    are fetched in three more, regardless of how many nodes were reached.
+    Returns (nodes, traces, truncated).
+    """
+    req, trace = models.Requirement, models.Trace
+    distance = {root_id: 0}
+    frontier = [root_id]
+    truncated = False
+
+    for hop in range(1, depth + 1):
+        if not frontier:
+            break
+        step = union_all(
+            select(trace.target_id.label("id")).where(trace.source_id.in_(frontier)),
+            select(trace.source_id.label("id")).where(trace.target_id.in_(frontier)),
+            select(req.id.label("id")).where(req.parent_id.in_(frontier)),
+            select(req.parent_id.label("id")).where(req.id.in_(frontier), req.parent_id.isnot(None)),
+        )
+        reached = sorted({r for (r,) in db.execute(step)} - distance.keys())
+        room = max_nodes - len(distance)
+        if len(reached) > room:
+            reached, truncated = reached[:room], True
+        for node_id in reached:
+            distance[node_id] = hop
+        frontier = reached
+        if truncated:
+            break
+
+    ids = list(distance)
+    rows = db.query(req.id, req.title, req.status, req.priority, req.project_id, req.parent_id) \
+        .filter(req.id.in_(ids)).all()
+
+    degree = union_all(
+        select(trace.source_id.label("id"), literal("out").label("kind"), func.count().label("n"))
+        .where(trace.source_id.in_(ids)).group_by(trace.source_id),
+        select(trace.target_id.label("id"), literal("in").label("kind"), func.count().label("n"))
+        .where(trace.target_id.in_(ids)).group_by(trace.target_id),
+        select(req.parent_id.label("id"), literal("children").label("kind"), func.count().label("n"))
+        .where(req.parent_id.in_(ids)).group_by(req.parent_id),
+    )
+    counts = {}
+    for node_id, kind, n in db.execute(degree):
+        counts[(node_id, kind)] = n
+
+    nodes = [
+        {
+            "id": r.id, "title": r.title, "status": r.status, "priority": r.priority,
+            "project_id": r.project_id, "parent_id": r.parent_id, "distance": distance[r.id],
+            "out_degree": counts.get((r.id, "out"), 0),
+            "in_degree": counts.get((r.id, "in"), 0),
+            "child_count": counts.get((r.id, "children"), 0),
+        }
+        for r in rows
+    ]
+    nodes.sort(key=lambda n: (n["distance"], n["id"]))
+    traces = db.query(trace.source_id, trace.target_id) \
+        .filter(trace.source_id.in_(ids), trace.target_id.in_(ids)).all()
+    return nodes, [{"source_id": s, "target_id": t} for s, t in traces], truncated
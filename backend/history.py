@@ -0,0 +1,182 @@
+"""
+Field-level requirement history with periodic checkpoints.
+
+Every flush that creates, changes or deletes a Requirement records one
+`field_changes` row per changed field (JSON-encoded before/after values).
+A `requirement_checkpoints` row with the full state is written when a
+requirement is created or deleted (state NULL) and whenever
+CHECKPOINT_INTERVAL changes have piled up since its last checkpoint.
+Rebuilding a past state loads the nearest checkpoint at or before the
+requested time and replays at most about CHECKPOINT_INTERVAL changes, however
+long the history is.
+"""
+import json
+import os
+from datetime import datetime
+from sqlalchemy import event, select, insert, func
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from . import models
+
+HISTORY_FIELDS = ("title", "description", "rationale", "priority", "status", "parent_id", "project_id")
+CHECKPOINT_INTERVAL = int(os.getenv("HISTORY_CHECKPOINT_INTERVAL", "20"))
+CHUNK_SIZE = 500
+
+def _state(obj) -> dict:
+    state = {"id": obj.id, **{f: getattr(obj, f) for f in HISTORY_FIELDS}}
+    state["created_at"] = obj.created_at.isoformat() if obj.created_at else None
+    state["updated_at"] = obj.updated_at.isoformat() if obj.updated_at else None
+    return state
+
+def _encode(value) -> str:
+    return json.dumps(value)
+
+def record_changes(conn, changes, now: datetime = None):
+    """
+    Inserts field changes as (req_id, field, old, new) and writes checkpoints for
+    requirements that reached CHECKPOINT_INTERVAL changes since their last one.
+    Used by the flush listener and by Core bulk writes that bypass the ORM.
+    """
+    now = now or datetime.utcnow()
+    if changes:
+        conn.execute(insert(models.FieldChange), [
+            {"req_id": r, "field": f, "old_value": _encode(old), "new_value": _encode(new), "changed_at": now}
+            for r, f, old, new in changes
+        ])
+    due = due_for_checkpoint(conn, {c[0] for c in changes})
+    if due:
+        write_checkpoints(conn, states(conn, due), now)
+
+def due_for_checkpoint(conn, req_ids):
+    fc, cp = models.FieldChange, models.RequirementCheckpoint
+    due = []
+    req_ids = list(req_ids)
+    for start in range(0, len(req_ids), CHUNK_SIZE):
+        chunk = req_ids[start:start + CHUNK_SIZE]
+        last = select(cp.req_id, func.max(cp.last_change_id).label("last_change_id")) \
+            .where(cp.req_id.in_(chunk)).group_by(cp.req_id).subquery()
+        pending = select(fc.req_id, func.count()) \
+            .outerjoin(last, last.c.req_id == fc.req_id) \
+            .where(fc.req_id.in_(chunk), fc.id > func.coalesce(last.c.last_change_id, 0)) \
+            .group_by(fc.req_id).having(func.count() >= CHECKPOINT_INTERVAL)
+        due += [r for r, _ in conn.execute(pending)]
+    return due
+
+def states(conn, req_ids) -> dict:
+    """Current stored state of the given requirements, keyed by id."""
+    req = models.Requirement.__table__
+    result = {}
+    req_ids = list(req_ids)
+    for start in range(0, len(req_ids), CHUNK_SIZE):
+        for row in conn.execute(select(req).where(req.c.id.in_(req_ids[start:start + CHUNK_SIZE]))):
+            result[row.id] = _state(row)
+    return result
+
+def write_checkpoints(conn, snapshot: dict, now: datetime, deleted=()):
+    """Checkpoints the given states, plus deletion markers for `deleted` ids."""
+    fc = models.FieldChange
+    req_ids = list(snapshot) + list(deleted)
+    if not req_ids:
+        return
+    last_ids = {}
+    for start in range(0, len(req_ids), CHUNK_SIZE):
+        last_ids.update(conn.execute(
+            select(fc.req_id, func.max(fc.id)).where(fc.req_id.in_(req_ids[start:start + CHUNK_SIZE])).group_by(fc.req_id)
+        ).all())
+    rows = [
+        {"req_id": r, "taken_at": now, "last_change_id": last_ids.get(r, 0), "state": json.dumps(state)}
+        for r, state in snapshot.items()
+    ]
+    rows += [{"req_id": r, "taken_at": now, "last_change_id": last_ids.get(r, 0), "state": None} for r in deleted]
+    conn.execute(insert(models.RequirementCheckpoint), rows)
+
+@event.listens_for(Session, "after_flush")
+def _record_history(session, flush_context):
+    # Attribute history still holds the pre-flush values at this point
+    now = datetime.utcnow()
+    changes, created, deleted = [], {}, []
+    for obj in session.new:
+        if isinstance(obj, models.Requirement):
+            created[obj.id] = _state(obj)
+    for obj in session.deleted:
+        if isinstance(obj, models.Requirement):
+            deleted.append(obj.id)
+    for obj in session.dirty:
+        if not isinstance(obj, models.Requirement) or obj in session.deleted:
+            continue
+        for field in HISTORY_FIELDS:
+            added, _, removed = get_history(obj, field)
+            if added or removed:
+                old = removed[0] if removed else None
+                new = added[0] if added else None
+                if old != new:
+                    changes.append((obj.id, field, old, new))
+    if not (changes or created or deleted):
+        return
+
+    conn = session.connection()
+    if created or deleted:
+        write_checkpoints(conn, created, now, deleted)
+    record_changes(conn, changes, now)
+
+def _apply(state: dict, changes) -> dict:
+    state = dict(state)
+    for field, new_value, changed_at in changes:
+        state[field] = json.loads(new_value)
+        state["updated_at"] = changed_at.isoformat()
+    return state
+
+def as_of(conn, req_ids, when: datetime) -> dict:
+    """
+    {req_id: state} for the requirements that existed at `when`. One query for
+    the nearest checkpoints and one for the changes to replay on top of them.
+    """
+    fc, cp = models.FieldChange, models.RequirementCheckpoint
+    req_ids = list(req_ids)
+    result = {}
+    for start in range(0, len(req_ids), CHUNK_SIZE):
+        chunk = req_ids[start:start + CHUNK_SIZE]
+        latest = select(func.max(cp.id)).where(cp.req_id.in_(chunk), cp.taken_at <= when).group_by(cp.req_id)
+        base = select(cp.req_id, cp.last_change_id, cp.state).where(cp.id.in_(latest), cp.state.isnot(None)).subquery()
+        live = {r: json.loads(state) for r, _, state in conn.execute(select(base))}
+        if not live:
+            continue
+
+        replay = {}
+        for req_id, field, new_value, changed_at in conn.execute(
+            select(fc.req_id, fc.field, fc.new_value, fc.changed_at)
+            .join(base, (base.c.req_id == fc.req_id) & (fc.id > base.c.last_change_id))
+            .where(fc.changed_at <= when).order_by(fc.id)
+        ):
+            replay.setdefault(req_id, []).append((field, new_value, changed_at))
+        for req_id, state in live.items():
+            result[req_id] = _apply(state, replay.get(req_id, ()))
+    return result
+
+def project_as_of(conn, project_id: int, when: datetime) -> list:
+    """All requirements that belonged to the project at `when`, ordered by id."""
+    fc, cp = models.FieldChange, models.RequirementCheckpoint
+    # Anything that was ever in the project: checkpointed there, or moved in later
+    candidates = set(conn.execute(
+        select(cp.req_id).where(cp.taken_at <= when, func.json_extract(cp.state, "$.project_id") == project_id).distinct()
+    ).scalars())
+    candidates.update(conn.execute(
+        select(fc.req_id).where(fc.field == "project_id", fc.new_value == _encode(project_id), fc.changed_at <= when).distinct()
+    ).scalars())
+    states_then = as_of(conn, candidates, when)
+    return sorted((s for s in states_then.values() if s["project_id"] == project_id), key=lambda s: s["id"])
+
+def backfill(conn):
+    """Checkpoints requirements that predate history tracking, as of their last update."""
+    req = models.Requirement.__table__
+    cp = models.RequirementCheckpoint
+    missing = conn.execute(
+        select(req).where(~select(cp.id).where(cp.req_id == req.c.id).exists())
+    ).all()
+    if not missing:
+        return
+    conn.execute(insert(cp), [
+        {"req_id": row.id, "taken_at": row.updated_at or row.created_at or datetime.utcnow(),
+         "last_change_id": 0, "state": json.dumps(_state(row))}
+        for row in missing
+    ])
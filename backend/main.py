@@ -1,24 +1,35 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import requirements, traces, export, projects, audit
-from . import database, models
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES
+from .routers import requirements, traces, export, projects, audit, baselines, admin, sync as sync_router, ai_jobs as ai_jobs_router
+from . import migrations, ai_jobs, backup, audit_archive
 
-# Create DB tables
-models.Base.metadata.create_all(bind=database.engine)
+# Create DB tables and bring databases from earlier releases up to date
+migrations.upgrade_all()
 
-# "Poor man's migration" - Ensure description column exists
-try:
-    with database.engine.connect() as conn:
-        from sqlalchemy import text
-        conn.execute(text("ALTER TABLE projects ADD COLUMN description VARCHAR"))
-        conn.commit()
-        print("Migrated: Added description column to projects table")
-except Exception as e:
-    # Column likely exists
-    print(f"Migration note: {e}")
-    pass
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pick up batch generation jobs interrupted by the last shutdown
+    ai_jobs.resume_all()
+    schedule = asyncio.create_task(backup.run_schedule()) if backup.BACKUP_INTERVAL_MINUTES > 0 else None
+    compaction = asyncio.create_task(audit_archive.run_schedule()) if audit_archive.AUDIT_COMPACT_INTERVAL_MINUTES > 0 else None
+    yield
+    for task in (schedule, compaction):
+        if task:
+            task.cancel()
 
-app = FastAPI(title="ReqTool API")
+app = FastAPI(title="ReqTool API", lifespan=lifespan)
+
+# Large list/matrix payloads compress very well; AI token streams must not be buffered
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=1024,
+    compresslevel=5,
+    exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + ("application/x-ndjson",),
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -33,6 +44,10 @@ app.include_router(traces.router)
 app.include_router(export.router)
 app.include_router(projects.router) 
 app.include_router(audit.router)
+app.include_router(sync_router.router)
+app.include_router(ai_jobs_router.router)
+app.include_router(baselines.router)
+app.include_router(admin.router)
 
 @app.get("/")
 def read_root():
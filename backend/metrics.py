@@ -0,0 +1,189 @@
+"""
+Per-project traceability metrics kept as aggregate counters.
+
+`project_metrics` holds one (project_id, key, value) row per counter: the
+requirement count, one `status:<Status>` and `depth:<level>` row per value
+seen, plus `traces`, `untraced`, `orphans` and `leaves`. Each flush that
+touches requirements or traces computes the facts of only the affected
+requirements before and after the write and adds the difference, in the same
+transaction. A dashboard read is then one indexed lookup of a few rows,
+whatever the project's size. `recompute` rebuilds the counters from scratch.
+"""
+from collections import Counter
+from sqlalchemy import event, select, delete, exists, or_, func, literal, inspect
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from . import models
+from .graph import subtree_cte
+
+MAX_DEPTH = 100 # Guards the ancestor walk against a corrupted (cyclic) hierarchy
+CHUNK_SIZE = 500
+
+def _facts_query(ids=None):
+    req = models.Requirement.__table__
+    trace = models.Trace.__table__
+    child = req.alias("child")
+    parent = req.alias("parent")
+
+    start = select(req.c.id.label("req_id"), req.c.parent_id.label("ancestor"), literal(1).label("level"))
+    if ids is not None:
+        start = start.where(req.c.id.in_(ids))
+    ancestors = start.cte("ancestors", recursive=True)
+    ancestors = ancestors.union_all(
+        select(ancestors.c.req_id, parent.c.parent_id, ancestors.c.level + 1)
+        .join(parent, parent.c.id == ancestors.c.ancestor)
+        .where(ancestors.c.level < MAX_DEPTH)
+    )
+    levels = select(ancestors.c.req_id, func.max(ancestors.c.level).label("level")) \
+        .group_by(ancestors.c.req_id).subquery()
+
+    query = select(
+        req.c.id,
+        req.c.project_id,
+        req.c.status,
+        req.c.parent_id,
+        exists().where(child.c.parent_id == req.c.id).label("has_children"),
+        or_(exists().where(trace.c.source_id == req.c.id), exists().where(trace.c.target_id == req.c.id)).label("traced"),
+        select(func.count()).select_from(trace).where(trace.c.source_id == req.c.id).scalar_subquery().label("out_degree"),
+        levels.c.level,
+    ).join(levels, levels.c.req_id == req.c.id)
+    if ids is not None:
+        query = query.where(req.c.id.in_(ids))
+    return query
+
+def _counters(row):
+    """The counter contributions of one requirement."""
+    return {
+        "requirements": 1,
+        f"status:{row.status}": 1,
+        f"depth:{row.level}": 1,
+        "traces": row.out_degree,
+        "untraced": int(not row.traced),
+        "orphans": int(not row.traced and not row.has_children and not row.parent_id),
+        "leaves": int(not row.has_children),
+    }
+
+def facts(conn, ids):
+    """{req_id: (project_id, counters)} for the given requirements as currently stored."""
+    ids = list(ids)
+    result = {}
+    for start in range(0, len(ids), CHUNK_SIZE):
+        for row in conn.execute(_facts_query(ids[start:start + CHUNK_SIZE])):
+            if row.project_id is not None:
+                result[row.id] = (row.project_id, _counters(row))
+    return result
+
+def apply_delta(conn, before, after):
+    """Adds the difference between two `facts` snapshots to the stored counters."""
+    delta = Counter()
+    for snapshot, sign in ((before, -1), (after, 1)):
+        for project_id, counters in snapshot.values():
+            for key, value in counters.items():
+                delta[(project_id, key)] += sign * value
+    rows = [{"project_id": p, "key": k, "value": v} for (p, k), v in delta.items() if v]
+    if not rows:
+        return
+    stmt = sqlite_insert(models.ProjectMetric)
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=["project_id", "key"],
+        set_={"value": models.ProjectMetric.value + stmt.excluded.value},
+    ), rows)
+
+def affected_ids(conn, req_ids, moved_ids=()):
+    """
+    Expands changed requirements to everything whose facts can change with them:
+    their parents (leaf status) and, for requirements that moved, their subtrees (depth).
+    """
+    req = models.Requirement
+    ids = set(req_ids)
+    if moved_ids:
+        ids.update(conn.execute(select(subtree_cte(moved_ids).c.id)).scalars())
+    ids.update(conn.execute(
+        select(req.parent_id).where(req.id.in_(list(req_ids)), req.parent_id.isnot(None))
+    ).scalars())
+    return ids
+
+@event.listens_for(Session, "before_flush")
+def _snapshot_before(session, flush_context, instances):
+    changed, moved = set(), set()
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, models.Requirement):
+            changed.add(obj.id)
+            if obj.parent_id:
+                changed.add(obj.parent_id)
+        elif isinstance(obj, models.Trace):
+            changed.update((obj.source_id, obj.target_id))
+    for obj in session.dirty:
+        if not isinstance(obj, models.Requirement):
+            continue
+        state = inspect(obj)
+        parent_history = state.attrs.parent_id.history
+        if parent_history.has_changes():
+            moved.add(obj.id)
+            changed.add(obj.id)
+            changed.update(v for v in parent_history.sum() if v)
+        if state.attrs.status.history.has_changes() or state.attrs.project_id.history.has_changes():
+            changed.add(obj.id)
+    changed.discard(None)
+    if not changed:
+        return
+
+    conn = session.connection()
+    ids = affected_ids(conn, changed, moved)
+    session.info.setdefault("metrics_pending", []).append((ids, moved, facts(conn, ids)))
+
+@event.listens_for(Session, "after_flush")
+def _apply_after(session, flush_context):
+    pending = session.info.pop("metrics_pending", [])
+    conn = session.connection()
+    for ids, moved, before in pending:
+        # Moved subtrees are looked up again: new children may have joined them in this flush
+        if moved:
+            ids = ids | affected_ids(conn, moved, moved)
+        apply_delta(conn, before, facts(conn, ids))
+
+def recompute(conn, project_id: int = None):
+    """Rebuilds the counters of one project, or of all projects, with one scan."""
+    query = _facts_query()
+    if project_id is not None:
+        query = query.where(models.Requirement.__table__.c.project_id == project_id)
+        conn.execute(delete(models.ProjectMetric).where(models.ProjectMetric.project_id == project_id))
+    else:
+        conn.execute(delete(models.ProjectMetric))
+
+    totals = Counter()
+    for row in conn.execute(query):
+        if row.project_id is None:
+            continue
+        for key, value in _counters(row).items():
+            totals[(row.project_id, key)] += value
+    rows = [{"project_id": p, "key": k, "value": v} for (p, k), v in totals.items() if v]
+    if rows:
+        conn.execute(sqlite_insert(models.ProjectMetric), rows)
+    return len(rows)
+
+def backfill(conn):
+    """Computes counters once for databases created before they existed."""
+    has_metrics = conn.execute(select(models.ProjectMetric.project_id).limit(1)).first()
+    has_requirements = conn.execute(select(models.Requirement.id).where(models.Requirement.project_id.isnot(None)).limit(1)).first()
+    if has_requirements and not has_metrics:
+        recompute(conn)
+
+def read(db: Session, project_id: int) -> dict:
+    counters = dict(db.query(models.ProjectMetric.key, models.ProjectMetric.value)
+                    .filter(models.ProjectMetric.project_id == project_id))
+    total = counters.get("requirements", 0)
+    by_status = {k.split(":", 1)[1]: v for k, v in counters.items() if k.startswith("status:") and v}
+    by_depth = {int(k.split(":", 1)[1]): v for k, v in counters.items() if k.startswith("depth:") and v}
+    return {
+        "project_id": project_id,
+        "requirements": total,
+        "traces": counters.get("traces", 0),
+        "untraced": counters.get("untraced", 0),
+        "orphans": counters.get("orphans", 0),
+        "leaves": counters.get("leaves", 0),
+        "coverage": (total - counters.get("untraced", 0)) / total if total else 0.0,
+        "max_depth": max(by_depth, default=0),
+        "by_status": by_status,
+        "by_depth": by_depth,
+    }
@@ -0,0 +1,83 @@
+"""
+Schema upgrades for databases created by earlier releases.
+
+`upgrade` runs on the main database at startup and on every shard file when
+it is first opened (database.shard_engine), so shards created before a column
+existed get it as well; `upgrade_all` opens every shard up front. create_all only adds missing tables; columns come
+from MIGRATIONS, and the backfills fill in data the new columns and tables
+derive from existing rows.
+"""
+import re
+from sqlalchemy import inspect, select, text
+from . import database, models, sharding, sync, metrics, history, facets
+
+# "Poor man's migration" - Ensure columns added after the first release exist
+MIGRATIONS = [
+    "ALTER TABLE projects ADD COLUMN description VARCHAR",
+    "ALTER TABLE projects ADD COLUMN change_seq INTEGER",
+    "ALTER TABLE requirements ADD COLUMN change_seq INTEGER",
+    "ALTER TABLE traces ADD COLUMN change_seq INTEGER",
+    "CREATE INDEX IF NOT EXISTS ix_projects_change_seq ON projects (change_seq)",
+    "CREATE INDEX IF NOT EXISTS ix_requirements_change_seq ON requirements (change_seq)",
+    "CREATE INDEX IF NOT EXISTS ix_traces_change_seq ON traces (change_seq)",
+    "CREATE INDEX IF NOT EXISTS ix_requirements_parent_id ON requirements (parent_id)",
+    "CREATE INDEX IF NOT EXISTS ix_traces_target_id ON traces (target_id)",
+    "ALTER TABLE requirements ADD COLUMN ears_pattern VARCHAR",
+    "CREATE INDEX IF NOT EXISTS ix_requirements_facets ON requirements (project_id, status, priority, ears_pattern)",
+    "CREATE INDEX IF NOT EXISTS ix_requirements_project_updated ON requirements (project_id, updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_requirements_status_priority ON requirements (status, priority)",
+    "ALTER TABLE traces ADD COLUMN suspect BOOLEAN DEFAULT 0 NOT NULL",
+    "ALTER TABLE traces ADD COLUMN suspect_reason VARCHAR",
+    "ALTER TABLE traces ADD COLUMN suspect_since DATETIME",
+    "CREATE INDEX IF NOT EXISTS ix_traces_suspect ON traces (source_id, target_id) WHERE suspect = 1",
+    "CREATE INDEX IF NOT EXISTS ix_audit_logs_timestamp ON audit_logs (timestamp)",
+    "CREATE INDEX IF NOT EXISTS ix_audit_logs_req_timestamp ON audit_logs (req_id, timestamp)",
+]
+
+ADD_COLUMN = re.compile(r"ALTER TABLE (\w+) ADD COLUMN (\w+)")
+
+def _applied(conn, statement: str) -> bool:
+    match = ADD_COLUMN.match(statement)
+    return bool(match) and match.group(2) in {c["name"] for c in inspect(conn).get_columns(match.group(1))}
+
+def upgrade(engine):
+    """Creates missing tables, applies pending MIGRATIONS and runs the backfills."""
+    models.Base.metadata.create_all(bind=engine)
+    for statement in MIGRATIONS:
+        try:
+            with engine.connect() as conn:
+                if _applied(conn, statement):
+                    continue
+                conn.execute(text(statement))
+                conn.commit()
+                print(f"Migrated: {statement}")
+        except Exception as e:
+            print(f"Migration note: {e}")
+
+    with engine.begin() as conn:
+        sync.backfill(conn)
+        metrics.backfill(conn)
+        history.backfill(conn)
+        facets.backfill(conn)
+
+def upgrade_all():
+    """Upgrades the main database and, in sharded mode, every shard."""
+    upgrade(database.engine)
+    if database.SHARDING:
+        with database.engine.connect() as conn:
+            if conn.execute(select(models.Requirement.id).limit(1)).first():
+                # Would be invisible: sharded sessions only read requirements from shards
+                raise RuntimeError("The main database holds unsharded requirements; "
+                                   "move them with python -m backend.scripts.shard_database first")
+    for key in shard_keys():
+        database.shard_engine(key) # Upgraded on first open
+
+def shard_keys() -> list:
+    """Every shard key in sharded mode, else an empty list."""
+    if not database.SHARDING:
+        return []
+    db = database.SessionLocal()
+    try:
+        return sharding.shard_keys(db)
+    finally:
+        db.close()
@@ -0,0 +1,188 @@
+"""
+Lexical near-duplicate detection with MinHash and locality-sensitive hashing.
+
+Each requirement's title/description is reduced to character 4-gram shingles
+and a 128-value MinHash signature whose agreement rate estimates Jaccard
+similarity. The signature is cut into 21 bands of 6 rows; requirements sharing
+any band bucket are candidates, so a lookup is an indexed (band, bucket) query
+instead of a comparison against every requirement. The banding puts the
+collision threshold at ~0.6, the DUPLICATE_THRESHOLD: pairs at 0.6 similarity
+collide about two times in three and pairs above 0.7 more than 90% of the time,
+while shared boilerplate like "The system shall" alone almost never does.
+Needs no LLM.
+"""
+import hashlib
+import re
+import zlib
+import numpy as np
+from sqlalchemy import delete, insert, select, func, tuple_
+from sqlalchemy.orm import Session
+from . import models
+
+NUM_PERM = 128
+ROWS = 6
+BANDS = NUM_PERM // ROWS # 21 bands; the last 2 signature values only refine the estimate
+SHINGLE_SIZE = 4
+DUPLICATE_THRESHOLD = 0.6
+COMPARE_CHUNK = 1 << 24 # Signature values compared per vectorized step
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240601) # Fixed seed: signatures must stay comparable across restarts
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+
+def shingles(text: str):
+    text = re.sub(r"\W+", " ", text.lower()).strip()
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+def signature(title: str, description: str = None) -> np.ndarray:
+    grams = shingles(f"{title} {description or ''}")
+    if not grams:
+        return np.full(NUM_PERM, _PRIME, dtype=np.uint32)
+    hashes = np.fromiter((zlib.crc32(g.encode()) % _PRIME for g in grams), dtype=np.uint64, count=len(grams))
+    # (a*x + b) mod p for every permutation/shingle pair, then the minimum per permutation
+    permuted = (np.outer(hashes, _A) + _B) % _PRIME
+    return permuted.min(axis=0).astype(np.uint32)
+
+def band_buckets(sig: np.ndarray):
+    buckets = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, "big", signed=True)))
+    return buckets
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+def _load(blob) -> np.ndarray:
+    return np.frombuffer(blob, dtype=np.uint32)
+
+def index_requirement(db: Session, req: models.Requirement):
+    """(Re)indexes one requirement. Call inside the transaction that changes it."""
+    sig = signature(req.title, req.description)
+    forget(db, [req.id])
+    db.execute(insert(models.RequirementMinHash).values(req_id=req.id, project_id=req.project_id, signature=sig.tobytes()))
+    db.execute(insert(models.MinHashBand), [
+        {"band": band, "bucket": bucket, "req_id": req.id} for band, bucket in band_buckets(sig)
+    ])
+
+def forget(db: Session, req_ids):
+    db.execute(delete(models.MinHashBand).where(models.MinHashBand.req_id.in_(req_ids)))
+    db.execute(delete(models.RequirementMinHash).where(models.RequirementMinHash.req_id.in_(req_ids)))
+
+def index_missing(db: Session, project_id: int = None, batch_size: int = 1000):
+    """Indexes requirements that have no signature yet, e.g. rows created before this feature."""
+    req = models.Requirement
+    query = db.query(req.id, req.title, req.description, req.project_id).outerjoin(
+        models.RequirementMinHash, models.RequirementMinHash.req_id == req.id
+    ).filter(models.RequirementMinHash.req_id.is_(None))
+    if project_id is not None:
+        query = query.filter(req.project_id == project_id)
+
+    rows = query.all()
+    for start in range(0, len(rows), batch_size):
+        signatures, band_rows = [], []
+        for req_id, title, description, req_project in rows[start:start + batch_size]:
+            sig = signature(title, description)
+            signatures.append({"req_id": req_id, "project_id": req_project, "signature": sig.tobytes()})
+            band_rows += [{"band": band, "bucket": bucket, "req_id": req_id} for band, bucket in band_buckets(sig)]
+        db.execute(insert(models.RequirementMinHash.__table__), signatures)
+        db.execute(insert(models.MinHashBand.__table__), band_rows)
+    return len(rows)
+
+def find_duplicates(db: Session, title: str, description: str = None, project_id: int = None,
+                    exclude_id: str = None, threshold: float = DUPLICATE_THRESHOLD, limit: int = 10):
+    sig = signature(title, description)
+    bands = models.MinHashBand
+    candidates = select(bands.req_id).where(tuple_(bands.band, bands.bucket).in_(band_buckets(sig))).distinct()
+
+    rows = db.query(models.Requirement.id, models.Requirement.title, models.Requirement.status,
+                    models.Requirement.project_id, models.RequirementMinHash.signature) \
+        .join(models.RequirementMinHash, models.RequirementMinHash.req_id == models.Requirement.id) \
+        .filter(models.Requirement.id.in_(candidates))
+    if project_id is not None:
+        rows = rows.filter(models.Requirement.project_id == project_id)
+
+    matches = []
+    for req_id, req_title, status, req_project, blob in rows:
+        if req_id == exclude_id:
+            continue
+        score = similarity(sig, _load(blob))
+        if score >= threshold:
+            matches.append({"id": req_id, "title": req_title, "status": status,
+                            "project_id": req_project, "similarity": score})
+    matches.sort(key=lambda m: -m["similarity"])
+    return matches[:limit]
+
+def duplicate_clusters(db: Session, project_id: int, threshold: float = DUPLICATE_THRESHOLD):
+    """
+    Groups a project's requirements into near-duplicate clusters. Candidate pairs come
+    only from shared LSH buckets, are verified against the signatures and merged with
+    union-find, so the cost follows the number of collisions rather than n^2.
+    """
+    index_missing(db, project_id)
+    sigs = {req_id: _load(blob) for req_id, blob in db.query(
+        models.RequirementMinHash.req_id, models.RequirementMinHash.signature
+    ).filter(models.RequirementMinHash.project_id == project_id)}
+
+    bands = models.MinHashBand
+    shared = db.query(bands.band, bands.bucket) \
+        .join(models.RequirementMinHash, models.RequirementMinHash.req_id == bands.req_id) \
+        .filter(models.RequirementMinHash.project_id == project_id) \
+        .group_by(bands.band, bands.bucket).having(func.count() > 1).subquery()
+    members = db.query(bands.band, bands.bucket, bands.req_id) \
+        .join(shared, (shared.c.band == bands.band) & (shared.c.bucket == bands.bucket)) \
+        .order_by(bands.band, bands.bucket)
+
+    ids = list(sigs)
+    position = {req_id: i for i, req_id in enumerate(ids)}
+    matrix = np.stack([sigs[i] for i in ids]) if ids else np.zeros((0, NUM_PERM), dtype=np.uint32)
+
+    buckets = {}
+    for band, bucket, req_id in members:
+        if req_id in position:
+            buckets.setdefault((band, bucket), []).append(position[req_id])
+
+    parent = list(range(len(ids)))
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    best = {}
+    for rows in buckets.values():
+        rows = np.array(rows)
+        # Compare every bucket member with the others at once, in row chunks to bound memory
+        step = max(1, COMPARE_CHUNK // (len(rows) * NUM_PERM))
+        for start in range(0, len(rows), step):
+            chunk = rows[start:start + step]
+            scores = (matrix[chunk][:, None, :] == matrix[rows][None, :, :]).mean(axis=2)
+            for i, j in zip(*np.nonzero(scores >= threshold)):
+                a, b = int(chunk[i]), int(rows[j])
+                if a == b:
+                    continue
+                score = float(scores[i, j])
+                best[a] = max(best.get(a, 0.0), score)
+                ra, rb = find(a), find(b)
+                if ra != rb:
+                    parent[ra] = rb
+
+    groups = {}
+    for row in best:
+        groups.setdefault(find(row), []).append(ids[row])
+
+    info = {r.id: r for r in db.query(models.Requirement.id, models.Requirement.title,
+                                      models.Requirement.status, models.Requirement.project_id)
+            .filter(models.Requirement.id.in_([ids[row] for row in best]))}
+    clusters = []
+    for group in groups.values():
+        clusters.append({"requirements": [
+            {"id": i, "title": info[i].title, "status": info[i].status,
+             "project_id": info[i].project_id, "similarity": best[position[i]]}
+            for i in sorted(group) if i in info
+        ]})
+    clusters.sort(key=lambda c: -len(c["requirements"]))
+    return clusters
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, DateTime
+from sqlalchemy import Column, String, Integer, BigInteger, Boolean, ForeignKey, DateTime, LargeBinary, Index, text
 from sqlalchemy.orm import relationship, backref
 from datetime import datetime
 import enum
@@ -12,6 +12,7 @@ class Project(Base):
     prefix = Column(String, unique=True, index=True) # e.g. "KAS-REQ-"
     description = Column(String, nullable=True)
     next_number = Column(Integer, default=1)
+    change_seq = Column(Integer, index=True, nullable=True) # Sync sequence, see sync.py
     
     requirements = relationship("Requirement", back_populates="project")
 
@@ -20,6 +21,13 @@ class RequirementStatus(str, enum.Enum):
     APPROVED = "Approved"
     RELEASED = "Released"
 
+# Status moves allowed by bulk transitions; a release has to be approved first
+STATUS_TRANSITIONS = {
+    RequirementStatus.DRAFT.value: {RequirementStatus.APPROVED.value},
+    RequirementStatus.APPROVED.value: {RequirementStatus.DRAFT.value, RequirementStatus.RELEASED.value},
+    RequirementStatus.RELEASED.value: {RequirementStatus.DRAFT.value},
+}
+
 class Requirement(Base):
     __tablename__ = "requirements"
 
@@ -29,11 +37,20 @@ class Requirement(Base):
     rationale = Column(String, nullable=True)
     priority = Column(String, default="Medium")
     status = Column(String, default=RequirementStatus.DRAFT.value)
-    parent_id = Column(String, ForeignKey("requirements.id"), nullable=True)
+    parent_id = Column(String, ForeignKey("requirements.id"), nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)
     project = relationship("Project", back_populates="requirements")
+    change_seq = Column(Integer, index=True, nullable=True)
+    ears_pattern = Column(String, nullable=True) # Matched EARS pattern or "none", see facets.py
+
+    # Filtered listings and facet counts (facets.py)
+    __table_args__ = (
+        Index("ix_requirements_facets", "project_id", "status", "priority", "ears_pattern"),
+        Index("ix_requirements_project_updated", "project_id", "updated_at"),
+        Index("ix_requirements_status_priority", "status", "priority"),
+    )
 
     # Self-referential relationship for hierarchy
     # Self-referential relationship for hierarchy
@@ -49,7 +66,17 @@ class Trace(Base):
     __tablename__ = "traces"
 
     source_id = Column(String, ForeignKey("requirements.id"), primary_key=True)
-    target_id = Column(String, ForeignKey("requirements.id"), primary_key=True)
+    target_id = Column(String, ForeignKey("requirements.id"), primary_key=True, index=True)
+    change_seq = Column(Integer, index=True, nullable=True)
+    # Set when the target (upstream) end changed since the link was last reviewed, see suspect.py
+    suspect = Column(Boolean, default=False, server_default=text("0"), nullable=False)
+    suspect_reason = Column(String, nullable=True)
+    suspect_since = Column(DateTime, nullable=True)
+
+    # Only open suspects are indexed, so listing them never reads the reviewed links
+    __table_args__ = (
+        Index("ix_traces_suspect", "source_id", "target_id", sqlite_where=text("suspect = 1")),
+    )
     
     source = relationship("Requirement", foreign_keys=[source_id], back_populates="outgoing_traces")
     target = relationship("Requirement", foreign_keys=[target_id], back_populates="incoming_traces")
@@ -63,3 +90,144 @@ class AuditLog(Base):
     author = Column(String, default="System")
     action = Column(String) # CREATE, UPDATE, DELETE, LINK, UNLINK
     details = Column(String) # JSON or text diff
+
+    # Newest-first feeds, overall and per requirement (audit_archive.py)
+    __table_args__ = (
+        Index("ix_audit_logs_timestamp", "timestamp"),
+        Index("ix_audit_logs_req_timestamp", "req_id", "timestamp"),
+    )
+
+# One compressed archive file of audit events older than the hot window, see audit_archive.py
+class AuditSegment(Base):
+    __tablename__ = "audit_segments"
+
+    id = Column(Integer, primary_key=True)
+    path = Column(String, nullable=False, unique=True) # Relative to audit_archive.archive_dir()
+    period = Column(String, nullable=False, index=True) # Month partition, YYYY-MM
+    first_at = Column(DateTime, nullable=False)
+    last_at = Column(DateTime, nullable=False, index=True)
+    row_count = Column(Integer, nullable=False)
+    actions = Column(String, nullable=False) # JSON list of the actions inside
+    project_ids = Column(String, nullable=False) # JSON list of the projects inside
+    req_filter = Column(LargeBinary, nullable=False) # Bloom filter over the requirement IDs inside
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ChangeCounter(Base):
+    __tablename__ = "change_counter"
+
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer, default=0, nullable=False)
+
+class Tombstone(Base):
+    __tablename__ = "tombstones"
+
+    seq = Column(Integer, primary_key=True) # Shares the change_counter sequence
+    entity = Column(String, nullable=False) # project, requirement, trace
+    entity_id = Column(String, nullable=True) # Project / Requirement ID
+    source_id = Column(String, nullable=True) # Trace endpoints
+    target_id = Column(String, nullable=True)
+    project_id = Column(Integer, nullable=True)
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)
+    root_id = Column(String, nullable=True) # Subtree root, if scoped to a subtree
+    field = Column(String, nullable=False) # description, rationale
+    model = Column(String, nullable=True)
+    status = Column(String, default="running") # running, completed, cancelled, failed
+    total = Column(Integer, default=0)
+    completed = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class GenerationJobItem(Base):
+    __tablename__ = "generation_job_items"
+
+    job_id = Column(Integer, ForeignKey("generation_jobs.id"), primary_key=True)
+    req_id = Column(String, primary_key=True)
+    status = Column(String, default="pending", index=True) # pending, done, failed
+    error = Column(String, nullable=True)
+
+class RequirementEmbedding(Base):
+    __tablename__ = "requirement_embeddings"
+
+    req_id = Column(String, primary_key=True)
+    model = Column(String, primary_key=True)
+    content_hash = Column(String, nullable=False) # Hash of the embedded title/description
+    vector = Column(LargeBinary, nullable=False) # Normalized float32 array
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class RequirementMinHash(Base):
+    __tablename__ = "requirement_minhash"
+
+    req_id = Column(String, primary_key=True)
+    project_id = Column(Integer, nullable=True, index=True)
+    signature = Column(LargeBinary, nullable=False) # uint32 MinHash signature
+
+class MinHashBand(Base):
+    __tablename__ = "minhash_bands"
+
+    band = Column(Integer, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True) # Hash of the signature rows in this band
+    req_id = Column(String, primary_key=True, index=True)
+
+class ProjectMetric(Base):
+    __tablename__ = "project_metrics"
+
+    project_id = Column(Integer, primary_key=True)
+    key = Column(String, primary_key=True) # e.g. "untraced", "status:Draft", "depth:2"; see metrics.py
+    value = Column(Integer, default=0, nullable=False)
+
+class RequirementVersion(Base):
+    __tablename__ = "requirement_versions"
+
+    hash = Column(String, primary_key=True) # Content hash of `content`, see baselines.py
+    req_id = Column(String, nullable=False, index=True)
+    content = Column(String, nullable=False) # JSON array of baselines.VERSION_FIELDS values
+
+class BaselineManifest(Base):
+    __tablename__ = "baseline_manifests"
+
+    hash = Column(String, primary_key=True)
+    body = Column(LargeBinary, nullable=False) # zlib-compressed (id, version hash) lines and trace edges
+
+class Baseline(Base):
+    __tablename__ = "baselines"
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, index=True)
+    name = Column(String, nullable=False)
+    description = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    manifest_hash = Column(String, ForeignKey("baseline_manifests.hash"), nullable=False)
+    requirement_count = Column(Integer, default=0)
+    trace_count = Column(Integer, default=0)
+
+class FieldChange(Base):
+    __tablename__ = "field_changes"
+
+    id = Column(Integer, primary_key=True)
+    req_id = Column(String, nullable=False, index=True)
+    field = Column(String, nullable=False)
+    old_value = Column(String, nullable=True) # JSON-encoded
+    new_value = Column(String, nullable=True) # JSON-encoded
+    changed_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class RequirementCheckpoint(Base):
+    __tablename__ = "requirement_checkpoints"
+
+    id = Column(Integer, primary_key=True)
+    req_id = Column(String, nullable=False, index=True)
+    taken_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_change_id = Column(Integer, default=0) # Newest FieldChange already folded into `state`
+    state = Column(String, nullable=True) # JSON of the full requirement; NULL once deleted
+
+class RequirementShard(Base):
+    __tablename__ = "requirement_shards"
+
+    req_id = Column(String, primary_key=True) # Catalog directory in sharded mode, see sharding.py
+    project_id = Column(Integer, nullable=True, index=True)
@@ -0,0 +1,81 @@
+"""
+Sparse fieldsets for list endpoints.
+
+When a client passes ``fields=id,title,status`` we select just those columns
+with a Core query and serialize the plain rows straight to JSON bytes, skipping
+ORM identity-map bookkeeping and Pydantic validation entirely.
+"""
+import json
+from datetime import datetime
+from fastapi import HTTPException, Response
+from . import models
+
+REQUIREMENT_FIELDS = ("id", "title", "description", "rationale", "priority", "status",
+                      "parent_id", "project_id", "created_at", "updated_at")
+PROJECT_FIELDS = ("id", "name", "prefix", "description", "next_number")
+
+def parse_fields(fields: str, model, allowed):
+    """Turns a comma separated field list into table columns. `id` is always included."""
+    names = ["id"]
+    for name in fields.split(","):
+        name = name.strip()
+        if not name or name in names:
+            continue
+        if name not in allowed:
+            raise HTTPException(status_code=400, detail=f"Unknown field '{name}'. Allowed: {', '.join(allowed)}")
+        names.append(name)
+    table = model.__table__
+    return [table.c[name] for name in names]
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def dump_json(payload) -> bytes:
+    return json.dumps(payload, default=_json_default, separators=(",", ":")).encode()
+
+def json_response(payload) -> Response:
+    return Response(content=dump_json(payload), media_type="application/json")
+
+def select_rows(db, columns, skip: int = None, limit: int = None, filters=(), order_by=()):
+    query = db.query(*columns).filter(*filters).order_by(*order_by)
+    if skip:
+        query = query.offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+    return [dict(row._mapping) for row in query]
+
+def matrix_payload(db, columns):
+    """
+    Builds the traceability matrix from one requirement projection and one trace scan.
+    Children are taken from the same projected rows instead of a second query per node.
+    """
+    names = [c.name for c in columns]
+    select_cols = columns if "parent_id" in names else columns + [models.Requirement.__table__.c.parent_id]
+    rows = db.query(*select_cols).all()
+
+    nodes = {}
+    parents = []
+    for row in rows:
+        mapping = row._mapping
+        node = {name: mapping[name] for name in names}
+        node["outgoing_traces"] = []
+        node["incoming_traces"] = []
+        node["children"] = []
+        nodes[node["id"]] = node
+        parents.append((node, mapping["parent_id"]))
+
+    for node, parent_id in parents:
+        parent = nodes.get(parent_id)
+        if parent is not None:
+            parent["children"].append({name: node[name] for name in names})
+
+    for source_id, target_id in db.query(models.Trace.source_id, models.Trace.target_id):
+        link = {"source_id": source_id, "target_id": target_id}
+        if source_id in nodes:
+            nodes[source_id]["outgoing_traces"].append(link)
+        if target_id in nodes:
+            nodes[target_id]["incoming_traces"].append(link)
+
+    return list(nodes.values())
@@ -0,0 +1,242 @@
+"""
+Optional in-process read model for the hot list endpoints.
+
+With READ_MODEL=1 each worker keeps projects, requirements and traces in
+memory: rows are `__slots__` objects with interned IDs, so a requirement's
+id, its parent reference and the trace endpoints pointing at it share one
+string, and traces are two parallel arrays. The requirement list, project
+list and traceability matrix are then answered from memory, and their JSON is
+cached until the data changes.
+
+Coherence uses the sync counter (see sync.py) as the data revision: every
+write to these tables takes new sequence numbers, so a read first compares
+the stored counter with the revision the model was built at (one primary-key
+lookup) and reloads on mismatch. That also catches writes from other uvicorn
+workers and from Core bulk statements. Commits made through a session in this
+process are applied incrementally when their sequence numbers directly follow
+the model's revision.
+"""
+import os
+import sys
+import threading
+from itertools import islice
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from . import database, models, sync, projection
+
+ENABLED = os.getenv("READ_MODEL", "0") == "1"
+CACHED_RESPONSES = 64 # Per revision
+
+REQUIREMENT_FIELDS = projection.REQUIREMENT_FIELDS
+PROJECT_FIELDS = ("name", "prefix", "description", "id", "next_number") # ProjectOut order
+
+class RequirementRow:
+    __slots__ = REQUIREMENT_FIELDS
+
+class ProjectRow:
+    __slots__ = PROJECT_FIELDS
+
+def _intern(value):
+    return sys.intern(value) if value is not None else None
+
+def _requirement_row(values) -> RequirementRow:
+    row = RequirementRow()
+    for name in REQUIREMENT_FIELDS:
+        setattr(row, name, values[name])
+    row.id = _intern(row.id)
+    row.parent_id = _intern(row.parent_id)
+    return row
+
+def _project_row(values) -> ProjectRow:
+    row = ProjectRow()
+    for name in PROJECT_FIELDS:
+        setattr(row, name, values[name])
+    return row
+
+class ReadModel:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.revision = None
+        self.projects = {}      # id -> ProjectRow, in table order
+        self.requirements = {}  # id -> RequirementRow, in table order
+        self.by_project = {}    # project_id -> {req_id: None}, ordered like requirements
+        self.trace_sources = []
+        self.trace_targets = []
+        self.trace_rows = {}    # (source_id, target_id) -> position in the arrays
+        self.responses = {}
+
+    # --- Loading and maintenance ---
+
+    def load(self, conn, revision: int):
+        req, project, trace = models.Requirement.__table__, models.Project.__table__, models.Trace.__table__
+        self.projects = {r.id: _project_row(r._mapping) for r in conn.execute(select(*[project.c[n] for n in PROJECT_FIELDS]))}
+        self.requirements, self.by_project = {}, {}
+        for r in conn.execute(select(*[req.c[n] for n in REQUIREMENT_FIELDS])):
+            self._put_requirement(_requirement_row(r._mapping))
+        self.trace_sources, self.trace_targets, self.trace_rows = [], [], {}
+        for source_id, target_id in conn.execute(select(trace.c.source_id, trace.c.target_id)):
+            self._add_trace(source_id, target_id)
+        self.revision = revision
+        self.responses = {}
+
+    def _put_requirement(self, row: RequirementRow):
+        old = self.requirements.get(row.id)
+        if old is not None and old.project_id != row.project_id:
+            self.by_project.get(old.project_id, {}).pop(row.id, None)
+        self.requirements[row.id] = row
+        self.by_project.setdefault(row.project_id, {})[row.id] = None
+
+    def _remove_requirement(self, req_id: str):
+        row = self.requirements.pop(req_id, None)
+        if row is not None:
+            self.by_project.get(row.project_id, {}).pop(req_id, None)
+
+    def _add_trace(self, source_id: str, target_id: str):
+        # Endpoints share the requirement's own id string
+        key = (self._id(source_id), self._id(target_id))
+        if key in self.trace_rows:
+            return
+        self.trace_rows[key] = len(self.trace_sources)
+        self.trace_sources.append(key[0])
+        self.trace_targets.append(key[1])
+
+    def _remove_trace(self, source_id: str, target_id: str):
+        position = self.trace_rows.pop((source_id, target_id), None)
+        if position is None:
+            return
+        # Move the last pair into the hole to keep the arrays dense
+        last = len(self.trace_sources) - 1
+        if position != last:
+            moved = (self.trace_sources[last], self.trace_targets[last])
+            self.trace_sources[position], self.trace_targets[position] = moved
+            self.trace_rows[moved] = position
+        self.trace_sources.pop()
+        self.trace_targets.pop()
+
+    def _id(self, req_id: str) -> str:
+        row = self.requirements.get(req_id)
+        return row.id if row is not None else _intern(req_id)
+
+    def apply(self, changes, first_seq: int, last_seq: int):
+        """Applies one committed transaction's changes, or leaves the model for a reload."""
+        with self.lock:
+            if self.revision is None or first_seq != self.revision + 1:
+                return
+            for kind, key, values in changes:
+                if kind == "project":
+                    if values is None:
+                        self.projects.pop(key, None)
+                    else:
+                        self.projects[key] = _project_row(values)
+                elif kind == "requirement":
+                    if values is None:
+                        self._remove_requirement(key)
+                    else:
+                        self._put_requirement(_requirement_row(values))
+                elif values is None:
+                    self._remove_trace(*key)
+                else:
+                    self._add_trace(*key)
+            self.revision = last_seq
+            self.responses = {}
+
+    # --- Reads ---
+
+    def cached(self, key, build) -> bytes:
+        """JSON bytes for `key` at the current revision. Called with the lock held."""
+        body = self.responses.get(key)
+        if body is None:
+            if len(self.responses) >= CACHED_RESPONSES:
+                self.responses.clear()
+            body = self.responses[key] = projection.dump_json(build())
+        return body
+
+    def requirement_page(self, skip: int, limit: int, project_id=None, names=REQUIREMENT_FIELDS):
+        ids = self.requirements if project_id is None else self.by_project.get(project_id, {})
+        rows = (self.requirements[r] for r in islice(ids, skip, skip + limit))
+        return [{name: getattr(row, name) for name in names} for row in rows]
+
+    def project_page(self, skip: int, limit: int, names=PROJECT_FIELDS):
+        return [{name: getattr(row, name) for name in names} for row in islice(self.projects.values(), skip, skip + limit)]
+
+    def matrix(self, names=REQUIREMENT_FIELDS):
+        nodes = {}
+        for row in self.requirements.values():
+            node = {name: getattr(row, name) for name in names}
+            node["outgoing_traces"] = []
+            node["incoming_traces"] = []
+            node["children"] = []
+            nodes[row.id] = node
+        for row in self.requirements.values():
+            parent = nodes.get(row.parent_id)
+            if parent is not None:
+                parent["children"].append({name: getattr(row, name) for name in names})
+        for source_id, target_id in zip(self.trace_sources, self.trace_targets):
+            link = {"source_id": source_id, "target_id": target_id}
+            if source_id in nodes:
+                nodes[source_id]["outgoing_traces"].append(link)
+            if target_id in nodes:
+                nodes[target_id]["incoming_traces"].append(link)
+        return list(nodes.values())
+
+_model = ReadModel()
+
+def cached_json(db: Session, key, build):
+    """
+    JSON bytes of build(model) at the stored data revision, reloading the model if it
+    is behind. None when the read model is disabled; callers then query SQLite.
+    """
+    if not ENABLED or database.SHARDING:
+        return None
+    conn = db.connection()
+    revision = sync.current_seq(conn)
+    with _model.lock:
+        if _model.revision != revision:
+            _model.load(conn, revision)
+        return _model.cached(key, lambda: build(_model))
+
+def reset():
+    """Forgets the loaded data, e.g. after the database was replaced underneath the process."""
+    with _model.lock:
+        _model.revision = None
+        _model.responses = {}
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    if not ENABLED or _model.revision is None:
+        return
+    changes, seqs = [], []
+    dirty = [o for o in session.dirty if session.is_modified(o, include_collections=False)]
+    for obj in list(session.new) + dirty:
+        if isinstance(obj, models.Tombstone):
+            seqs.append(obj.seq)
+        elif isinstance(obj, models.Project) and obj not in session.deleted:
+            changes.append(("project", obj.id, {n: getattr(obj, n) for n in PROJECT_FIELDS}))
+            seqs.append(obj.change_seq)
+        elif isinstance(obj, models.Requirement) and obj not in session.deleted:
+            changes.append(("requirement", obj.id, {n: getattr(obj, n) for n in REQUIREMENT_FIELDS}))
+            seqs.append(obj.change_seq)
+        elif isinstance(obj, models.Trace) and obj not in session.deleted:
+            changes.append(("trace", (obj.source_id, obj.target_id), True))
+            seqs.append(obj.change_seq)
+    for obj in session.deleted:
+        if isinstance(obj, models.Project):
+            changes.append(("project", obj.id, None))
+        elif isinstance(obj, models.Requirement):
+            changes.append(("requirement", obj.id, None))
+        elif isinstance(obj, models.Trace):
+            changes.append(("trace", (obj.source_id, obj.target_id), None))
+    if changes:
+        pending = session.info.setdefault("read_model_changes", ([], []))
+        pending[0].extend(changes)
+        pending[1].extend(s for s in seqs if s is not None)
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    changes, seqs = session.info.pop("read_model_changes", ([], []))
+    if changes and seqs:
+        _model.apply(changes, min(seqs), max(seqs))
+
+@event.listens_for(Session, "after_rollback")
+def _drop_changes(session):
+    session.info.pop("read_model_changes", None)
@@ -0,0 +1,22 @@
+"""
+Follow-up work when a requirement's title or description changes, shared by the
+edit endpoint and batch generation jobs: the MinHash signature is rebuilt and
+dependent trace links are marked suspect in the writing transaction, and the
+embedding is refreshed once that has committed.
+"""
+from datetime import datetime
+from sqlalchemy.orm import Session
+from . import models, minhash, embeddings, suspect
+
+def text_changed(db: Session, req: models.Requirement, fields, now: datetime = None) -> int:
+    """
+    Call inside the transaction that changed `fields` (title, description) of req.
+    Returns how many trace links were marked suspect.
+    """
+    minhash.index_requirement(db, req)
+    return suspect.mark(db.connection(), req.id, f"{req.id} changed: {', '.join(fields)}", now=now)
+
+async def after_commit(req_ids):
+    """Refreshes embeddings of committed changes; usable as a background task."""
+    if embeddings.ENABLED and req_ids:
+        await embeddings.refresh_quietly(req_ids)
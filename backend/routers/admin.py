@@ -0,0 +1,72 @@
+import os
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request
+from fastapi.responses import FileResponse
+from typing import List
+from .. import schemas, backup, audit_archive
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"]
+)
+
+def _backup_error(e: backup.BackupError):
+    return HTTPException(status_code=e.status_code, detail=str(e))
+
+@router.get("/backups", response_model=List[schemas.BackupOut])
+def list_backups():
+    return backup.list_backups()
+
+@router.post("/backups", response_model=schemas.BackupOut)
+def create_snapshot(rotate: bool = True):
+    try:
+        snapshot = backup.take_snapshot()
+    except backup.BackupError as e:
+        raise _backup_error(e)
+    if rotate:
+        backup.rotate()
+    return snapshot
+
+@router.post("/dumps", response_model=schemas.BackupOut)
+def create_dump():
+    result = backup.write_dump()
+    return backup.describe(os.path.basename(result["path"]))
+
+@router.get("/dumps/{name}")
+def download_dump(name: str):
+    try:
+        info = backup.describe(name)
+    except backup.BackupError as e:
+        raise _backup_error(e)
+    if info["kind"] != "dump":
+        raise HTTPException(status_code=400, detail=f"{name} is not a dump")
+    return FileResponse(os.path.join(backup.BACKUP_DIR, name), media_type="application/gzip", filename=name)
+
+@router.put("/dumps/{name}", response_model=schemas.BackupOut)
+async def upload_dump(name: str, request: Request):
+    # Raw request body, streamed to disk; no multipart parsing for multi-GB files
+    if not name.endswith(backup.DUMP_SUFFIX):
+        raise HTTPException(status_code=400, detail=f"Dump names end in {backup.DUMP_SUFFIX}")
+    try:
+        path = backup.path_for(name)
+    except backup.BackupError as e:
+        raise _backup_error(e)
+    os.makedirs(backup.BACKUP_DIR, exist_ok=True)
+    with open(path + ".tmp", "wb") as out:
+        async for chunk in request.stream():
+            out.write(chunk)
+    os.replace(path + ".tmp", path)
+    return backup.describe(name)
+
+@router.post("/restore", response_model=schemas.RestoreResult)
+def restore_dump(req: schemas.RestoreRequest, background_tasks: BackgroundTasks):
+    try:
+        result = backup.restore_dump(backup.path_for(req.name))
+    except backup.BackupError as e:
+        raise _backup_error(e)
+    # Duplicate detection catches up in the background
+    background_tasks.add_task(backup.index_duplicates)
+    return result
+
+@router.post("/audit/compact", response_model=schemas.AuditCompactResult)
+def compact_audit_logs():
+    return audit_archive.compact()
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List
+from .. import models, schemas, database, sharding, ai_jobs
+
+router = APIRouter(
+    prefix="/ai-jobs",
+    tags=["ai-jobs"]
+)
+
+@router.post("/", response_model=schemas.GenerationJobOut)
+def create_generation_job(spec: schemas.GenerationJobCreate, background_tasks: BackgroundTasks, db: Session = Depends(database.get_db)):
+    if spec.project_id is None and not spec.root_id:
+        raise HTTPException(status_code=400, detail="Specify a project_id or a root_id")
+    if spec.project_id is not None and not db.get(models.Project, spec.project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+    if spec.root_id and not (sharding.route_requirement(db, spec.root_id) and db.get(models.Requirement, spec.root_id)):
+        raise HTTPException(status_code=404, detail="Root requirement not found")
+
+    job = ai_jobs.create_job(db, spec)
+    if job.status == "running":
+        background_tasks.add_task(ai_jobs.launch, job.id)
+    return job
+
+@router.get("/", response_model=List[schemas.GenerationJobOut])
+def list_generation_jobs(skip: int = 0, limit: int = 50, db: Session = Depends(database.get_db)):
+    return db.query(models.GenerationJob).order_by(models.GenerationJob.id.desc()).offset(skip).limit(limit).all()
+
+@router.get("/{job_id}", response_model=schemas.GenerationJobOut)
+def read_generation_job(job_id: int, db: Session = Depends(database.get_db)):
+    job = db.get(models.GenerationJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/{job_id}/cancel", response_model=schemas.GenerationJobOut)
+def cancel_generation_job(job_id: int, db: Session = Depends(database.get_db)):
+    job = db.get(models.GenerationJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    ai_jobs.cancel(db, job)
+    db.refresh(job)
+    return job
@@ -1,17 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
-from .. import models, schemas, database
+import json
+from datetime import datetime, timezone
+from typing import List, Optional
+from .. import models, schemas, database, sharding, audit_archive
 
 router = APIRouter(
     prefix="/audit",
     tags=["audit"]
 )
 
+def _naive_utc(value: datetime) -> datetime:
+    # Timestamps are stored as naive UTC
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value and value.tzinfo else value
+
 @router.get("/", response_model=List[schemas.AuditLogOut])
-def get_global_audit_logs(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db)):
-    return db.query(models.AuditLog).order_by(models.AuditLog.timestamp.desc()).offset(skip).limit(limit).all()
+def get_global_audit_logs(
+    skip: int = 0,
+    limit: int = 100,
+    action: Optional[List[str]] = Query(None),
+    project_id: Optional[int] = None,
+    since: Optional[datetime] = Query(None, description="Events at or after this time"),
+    until: Optional[datetime] = Query(None, description="Events before this time"),
+    db: Session = Depends(database.get_db)
+):
+    # Covers the hot table and the archive, see audit_archive.py
+    def fetch(s):
+        return audit_archive.events(s, skip + limit, None, action, project_id, _naive_utc(since), _naive_utc(until))
+    if not database.SHARDING or project_id is not None:
+        sharding.route(db, project_id)
+        return fetch(db)[skip:]
+    return sharding.merge_page(sharding.fan_out(db, fetch), skip, limit,
+                               key=lambda a: (a["timestamp"], a["id"]), reverse=True)
+
+def _for_requirement(db: Session, req_id: str, fetch):
+    if sharding.route_requirement(db, req_id):
+        return fetch(db)
+    # Deleted requirements leave the shard directory, but their history stays in some shard
+    return [row for part in sharding.fan_out(db, fetch) for row in part]
 
 @router.get("/requirements/{req_id}", response_model=List[schemas.AuditLogOut])
-def get_requirement_audit_logs(req_id: str, db: Session = Depends(database.get_db)):
-    return db.query(models.AuditLog).filter(models.AuditLog.req_id == req_id).order_by(models.AuditLog.timestamp.desc()).all()
+def get_requirement_audit_logs(
+    req_id: str,
+    action: Optional[List[str]] = Query(None),
+    since: Optional[datetime] = Query(None, description="Events at or after this time"),
+    until: Optional[datetime] = Query(None, description="Events before this time"),
+    db: Session = Depends(database.get_db)
+):
+    rows = _for_requirement(db, req_id, lambda s: audit_archive.events(s, None, req_id, action, None, _naive_utc(since), _naive_utc(until)))
+    return sorted(rows, key=lambda a: (a["timestamp"], a["id"]), reverse=True)
+
+@router.get("/requirements/{req_id}/changes", response_model=List[schemas.FieldChangeOut])
+def get_requirement_field_changes(req_id: str, skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db)):
+    changes = _for_requirement(db, req_id, lambda s: s.query(models.FieldChange).filter(models.FieldChange.req_id == req_id)
+                               .order_by(models.FieldChange.id.desc()).offset(skip).limit(limit).all())
+    return [
+        {"id": c.id, "req_id": c.req_id, "field": c.field, "changed_at": c.changed_at,
+         "old_value": json.loads(c.old_value), "new_value": json.loads(c.new_value)}
+        for c in changes
+    ]
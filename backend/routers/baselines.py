@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from .. import models, schemas, database, baselines, sharding
+from ..scripts.asciidoc_generator import render_asciidoc
+from ..scripts.reqif_generator import render_reqif
+
+router = APIRouter(
+    prefix="/baselines",
+    tags=["baselines"]
+)
+
+def _get_baseline(db: Session, baseline_id: int) -> models.Baseline:
+    baseline = db.get(models.Baseline, baseline_id)
+    if not baseline:
+        raise HTTPException(status_code=404, detail=f"Baseline {baseline_id} not found")
+    sharding.route(db, baseline.project_id)
+    return baseline
+
+@router.post("/", response_model=schemas.BaselineOut)
+def create_baseline(spec: schemas.BaselineCreate, db: Session = Depends(database.get_db)):
+    if not db.get(models.Project, spec.project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+    sharding.route(db, spec.project_id)
+    baseline = baselines.create(db, spec.project_id, spec.name, spec.description)
+    db.commit()
+    db.refresh(baseline)
+    return baseline
+
+@router.get("/", response_model=List[schemas.BaselineOut])
+def list_baselines(project_id: Optional[int] = None, skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db)):
+    query = db.query(models.Baseline)
+    if project_id is not None:
+        query = query.filter(models.Baseline.project_id == project_id)
+    return query.order_by(models.Baseline.id.desc()).offset(skip).limit(limit).all()
+
+@router.get("/{baseline_id}", response_model=schemas.BaselineOut)
+def read_baseline(baseline_id: int, db: Session = Depends(database.get_db)):
+    return _get_baseline(db, baseline_id)
+
+@router.get("/{baseline_id}/diff", response_model=schemas.BaselineDiff)
+def diff_baselines(baseline_id: int, against: int = Query(..., description="Baseline to compare with (the older one)"),
+                   db: Session = Depends(database.get_db)):
+    new = db.get(models.Baseline, baseline_id)
+    old = db.get(models.Baseline, against)
+    if not new or not old:
+        raise HTTPException(status_code=404, detail=f"Baseline {baseline_id if not new else against} not found")
+    if database.SHARDING and new.project_id != old.project_id:
+        raise HTTPException(status_code=400, detail="Baselines of different projects cannot be compared with sharded storage")
+    sharding.route(db, new.project_id)
+    return baselines.diff(db, old, new)
+
+@router.get("/{baseline_id}/export/asciidoc")
+def export_baseline_asciidoc(baseline_id: int, diagram_nodes: int = Query(None, ge=5, le=500),
+                             db: Session = Depends(database.get_db)):
+    baseline = _get_baseline(db, baseline_id)
+    reqs, _ = baselines.snapshot(db, baseline)
+    content = render_asciidoc(reqs, diagram_nodes, title=f"Requirements Baseline {baseline.name}")
+    return {"content": content}
+
+@router.get("/{baseline_id}/export/reqif")
+def export_baseline_reqif(baseline_id: int, db: Session = Depends(database.get_db)):
+    baseline = _get_baseline(db, baseline_id)
+    reqs, traces = baselines.snapshot(db, baseline)
+    content = render_reqif(reqs, traces, title=f"Requirements Baseline {baseline.name}")
+    return Response(content=content, media_type="application/xml")
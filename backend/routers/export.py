@@ -1,34 +1,61 @@
-from fastapi import APIRouter, Depends, Query, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
+from typing import List, Optional
 from ..scripts.asciidoc_generator import generate_asciidoc
 from ..scripts.reqif_generator import generate_reqif
-from .. import database
+from .. import database, graph, models, sharding
 
 router = APIRouter(
     prefix="/export",
     tags=["export"]
 )
 
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+get_db = database.get_db
+
+MAX_SCOPE_IDS = 1000
+MAX_HOPS = 10
+
+def export_scope(
+    project_id: Optional[List[int]] = Query(None, description="Only these projects"),
+    root_id: Optional[str] = Query(None, description="Only this requirement and its descendants"),
+    ids: Optional[List[str]] = Query(None, description="Only these requirements, plus `hops` trace links around them"),
+    hops: int = Query(0, ge=0, le=MAX_HOPS),
+    db: Session = Depends(get_db),
+):
+    """(scope SELECT or None, shard keys or None); parts given together are combined as a union."""
+    if hops and not ids:
+        raise HTTPException(status_code=400, detail="hops needs ids")
+    if ids and len(ids) > MAX_SCOPE_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SCOPE_IDS} ids per export")
+    named = ([root_id] if root_id is not None else []) + list(ids or [])
+    if named:
+        if database.SHARDING:
+            found = {r for (r,) in db.query(models.RequirementShard.req_id).filter(models.RequirementShard.req_id.in_(named))}
+        else:
+            found = {r for (r,) in db.query(models.Requirement.id).filter(models.Requirement.id.in_(named))}
+        missing = [r for r in named if r not in found]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Requirements not found: {', '.join(missing[:20])}")
+    scope = graph.scope_ids(project_id, root_id, ids, hops)
+    if scope is None or not database.SHARDING:
+        return scope, None
+    # Hierarchy and trace links stay within a project, so only the named requirements' shards are read
+    return scope, set(project_id or []) | sharding.shards_of(db, named)
 
 @router.get("/asciidoc")
 def export_asciidoc(
     status_filter: str = Query(None, alias="status"),
     priority_filter: str = Query(None, alias="priority"),
+    diagram_nodes: int = Query(None, ge=5, le=500),
+    scope = Depends(export_scope),
     db: Session = Depends(get_db)
 ):
     # Logic to fetch and generate
     # We'll delegate to a helper script/function to keep router clean
-    content = generate_asciidoc(db, status_filter, priority_filter)
+    content = generate_asciidoc(db, status_filter, priority_filter, diagram_nodes, *scope)
     return {"content": content}
 
 @router.get("/reqif")
-def export_reqif(db: Session = Depends(get_db)):
-    content = generate_reqif(db)
+def export_reqif(scope = Depends(export_scope), db: Session = Depends(get_db)):
+    content = generate_reqif(db, *scope)
     return Response(content=content, media_type="application/xml")
-
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
-from .. import models, schemas, database
+from typing import List, Optional
+from .. import models, schemas, database, projection, minhash, metrics, sharding, readmodel
 
 router = APIRouter(
     prefix="/projects",
@@ -21,6 +21,31 @@ def create_project(project: schemas.ProjectCreate, db: Session = Depends(databas
     return new_project
 
 @router.get("/", response_model=List[schemas.ProjectOut])
-def read_projects(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db)):
+def read_projects(skip: int = 0, limit: int = 100, fields: Optional[str] = None, db: Session = Depends(database.get_db)):
+    names = readmodel.PROJECT_FIELDS
+    if fields:
+        columns = projection.parse_fields(fields, models.Project, projection.PROJECT_FIELDS)
+        names = tuple(c.name for c in columns)
+    body = readmodel.cached_json(db, ("projects", skip, limit, names), lambda model: model.project_page(skip, limit, names))
+    if body is not None:
+        return Response(content=body, media_type="application/json")
+    if fields:
+        return projection.json_response(projection.select_rows(db, columns, skip, limit))
     projects = db.query(models.Project).offset(skip).limit(limit).all()
     return projects
+
+@router.get("/{project_id}/metrics", response_model=schemas.ProjectMetrics)
+def get_project_metrics(project_id: int, db: Session = Depends(database.get_db)):
+    if not db.get(models.Project, project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+    sharding.route(db, project_id)
+    return metrics.read(db, project_id)
+
+@router.get("/{project_id}/duplicates", response_model=List[schemas.DuplicateCluster])
+def get_duplicate_clusters(project_id: int, threshold: float = Query(minhash.DUPLICATE_THRESHOLD, gt=0, le=1), db: Session = Depends(database.get_db)):
+    if not db.get(models.Project, project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+    sharding.route(db, project_id)
+    clusters = minhash.duplicate_clusters(db, project_id, threshold)
+    db.commit() # Persist signatures computed for requirements indexed on the fly
+    return clusters
@@ -1,21 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from .. import models, schemas, database
+from sqlalchemy import exc
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional, Union
+from .. import models, schemas, database, projection, graph, history, sharding, bulk, readmodel
+from .. import facets as facet_filters
 from ..scripts.ears_verifier import verify_ears
-from .. import ai_service
-from datetime import datetime
+from .. import ai_service, embeddings, minhash, reindex
+from datetime import datetime, timezone
+import json
 
 router = APIRouter(
     prefix="/requirements",
     tags=["requirements"]
 )
 
+MAX_BULK_IDS = 20000 # Stays under SQLite's bound-parameter limit
+# SQLite ignores FOR UPDATE, so concurrent creates in a project can read the same counter.
+# The loser's insert fails on the primary key and it retries with a fresh counter.
+CREATE_ATTEMPTS = 5
+
+def _naive_utc(value: datetime) -> datetime:
+    # Timestamps are stored as naive UTC
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
 
 @router.get("/matrix", response_model=List[schemas.RequirementDetail])
-def get_traceability_matrix(db: Session = Depends(database.get_db)):
-    return db.query(models.Requirement).all()
+def get_traceability_matrix(fields: Optional[str] = None, db: Session = Depends(database.get_db)):
+    names = projection.REQUIREMENT_FIELDS
+    if fields:
+        columns = projection.parse_fields(fields, models.Requirement, projection.REQUIREMENT_FIELDS)
+        names = tuple(c.name for c in columns)
+    body = readmodel.cached_json(db, ("matrix", names), lambda model: model.matrix(names))
+    if body is not None:
+        return Response(content=body, media_type="application/json")
+    if fields:
+        parts = sharding.fan_out(db, lambda s: projection.matrix_payload(s, columns))
+        return projection.json_response([row for part in parts for row in part])
+    parts = sharding.fan_out(db, lambda s: s.query(models.Requirement).options(
+        selectinload(models.Requirement.outgoing_traces),
+        selectinload(models.Requirement.incoming_traces),
+        selectinload(models.Requirement.children),
+    ).all())
+    return [r for part in parts for r in part]
 
 @router.get("/models", response_model=List[str])
 async def list_ai_models():
@@ -45,16 +72,102 @@ def verify_req_ears(req: schemas.EARSVerificationRequest):
         hint=hint
     )
 
+@router.post("/check-duplicates", response_model=List[schemas.DuplicateCandidate])
+def check_duplicates(req: schemas.DuplicateCheckRequest, db: Session = Depends(database.get_db)):
+    if req.project_id is not None:
+        sharding.route(db, req.project_id)
+        return minhash.find_duplicates(db, req.title, req.description, req.project_id, req.exclude_id)
+    parts = sharding.fan_out(db, lambda s: minhash.find_duplicates(s, req.title, req.description, None, req.exclude_id))
+    return sorted((m for part in parts for m in part), key=lambda m: -m["similarity"])[:10]
+
+@router.post("/bulk-status", response_model=schemas.BulkStatusResult)
+def bulk_status(req: schemas.BulkStatusRequest, db: Session = Depends(database.get_db)):
+    scopes = [s for s in (req.project_id, req.root_id, req.ids) if s is not None]
+    if len(scopes) != 1:
+        raise HTTPException(status_code=400, detail="Give exactly one of project_id, root_id or ids")
+    if req.ids is not None and len(req.ids) > MAX_BULK_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_IDS} ids per request")
+
+    if req.project_id is not None:
+        if not db.query(models.Project.id).filter(models.Project.id == req.project_id).first():
+            raise HTTPException(status_code=404, detail="Project not found")
+        sharding.route(db, req.project_id)
+    elif req.root_id is not None:
+        if not sharding.route_requirement(db, req.root_id) or \
+                not db.query(models.Requirement.id).filter(models.Requirement.id == req.root_id).first():
+            raise HTTPException(status_code=404, detail="Requirement not found")
+    else:
+        ids = set(req.ids)
+        if database.SHARDING:
+            located = dict(db.query(models.RequirementShard.req_id, models.RequirementShard.project_id)
+                           .filter(models.RequirementShard.req_id.in_(ids)))
+            if len(set(located.values())) > 1:
+                raise HTTPException(status_code=400, detail="With sharded storage, bulk ids must belong to one project")
+            if located:
+                sharding.route(db, next(iter(located.values())))
+            found = set(located)
+        else:
+            found = {r for (r,) in db.query(models.Requirement.id).filter(models.Requirement.id.in_(ids))}
+        missing = sorted(ids - found)
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Requirements not found: {', '.join(missing[:10])}")
+
+    scope = bulk.scope_filter(req.project_id, req.root_id, req.ids)
+    try:
+        result = bulk.transition_status(db.connection(), scope, req.status.value)
+    except bulk.TransitionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    db.commit()
+    return schemas.BulkStatusResult(status=req.status, **result)
+
+async def _generation_response(request: Request, chunks):
+    events = ai_service.stream_events(chunks, request.is_disconnected)
+    # Wait for the first event so upstream failures get a real HTTP status
+    try:
+        first = await events.__anext__()
+    except StopAsyncIteration:
+        return Response(status_code=499) # Client went away before the first token
+    event = json.loads(first)
+    if event["type"] == "error":
+        await events.aclose()
+        raise HTTPException(status_code=event["status"], detail=event["message"])
+
+    async def replay():
+        yield first
+        async for line in events:
+            yield line
+
+    return StreamingResponse(replay(), media_type="application/x-ndjson")
+
 @router.post("/generate-description")
-async def generate_req_description(req: schemas.AIDescriptionRequest):
-    return StreamingResponse(ai_service.generate_description(req.title, req.current_description, req.model, req.project_description), media_type="text/plain")
+async def generate_req_description(req: schemas.AIDescriptionRequest, request: Request):
+    return await _generation_response(request, ai_service.generate_description(req.title, req.current_description, req.model, req.project_description))
 
 @router.post("/generate-rationale")
-async def generate_req_rationale(req: schemas.AIRationaleRequest):
-    return StreamingResponse(ai_service.generate_rationale(req.title, req.description, req.current_rationale, req.model, req.project_description), media_type="text/plain")
+async def generate_req_rationale(req: schemas.AIRationaleRequest, request: Request):
+    return await _generation_response(request, ai_service.generate_rationale(req.title, req.description, req.current_rationale, req.model, req.project_description))
+
+class _CounterRace(Exception):
+    pass
 
 @router.post("/", response_model=schemas.RequirementOut)
-def create_requirement(req: schemas.RequirementCreate, db: Session = Depends(database.get_db)):
+def create_requirement(req: schemas.RequirementCreate, background_tasks: BackgroundTasks, db: Session = Depends(database.get_db)):
+    sharding.route(db, req.project_id)
+    for attempt in range(CREATE_ATTEMPTS):
+        try:
+            new_req = _insert_requirement(db, req.model_copy(), last_attempt=attempt == CREATE_ATTEMPTS - 1)
+            break
+        except _CounterRace:
+            db.rollback()
+        except exc.IntegrityError: # A concurrent create with the same manual ID won
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Requirement ID already exists")
+    else:
+        raise HTTPException(status_code=409, detail="Concurrent creates kept taking the next ID, try again")
+    background_tasks.add_task(reindex.after_commit, [new_req.id])
+    return new_req
+
+def _insert_requirement(db: Session, req: schemas.RequirementCreate, last_attempt: bool) -> models.Requirement:
     # Auto-numbering logic
     if req.project_id:
         project = db.query(models.Project).filter(models.Project.id == req.project_id).with_for_update().first()
@@ -65,9 +178,10 @@ def create_requirement(req: schemas.RequirementCreate, db: Session = Depends(dat
         generated_id = f"{project.prefix}{project.next_number}"
         
         # Ensure generated ID doesn't exist (safety)
-        if db.query(models.Requirement).filter(models.Requirement.id == generated_id).first():
-             # Fallback/Error if manually taken?
-             # For now, just raise
+        if sharding.requirement_exists(db, generated_id):
+             # Another create may have taken it after we read the counter
+             if not last_attempt:
+                 raise _CounterRace()
              raise HTTPException(status_code=400, detail=f"Auto-generated ID {generated_id} already exists. Check project counter.")
              
         req.id = generated_id
@@ -77,7 +191,7 @@ def create_requirement(req: schemas.RequirementCreate, db: Session = Depends(dat
         db.add(project)
     
     # ID Uniqueness check (manual or auto)
-    if db.query(models.Requirement).filter(models.Requirement.id == req.id).first():
+    if sharding.requirement_exists(db, req.id):
         raise HTTPException(status_code=400, detail="Requirement ID already exists")
     
     # Parent validity
@@ -87,6 +201,7 @@ def create_requirement(req: schemas.RequirementCreate, db: Session = Depends(dat
 
     new_req = models.Requirement(**req.model_dump())
     db.add(new_req)
+    minhash.index_requirement(db, new_req)
     
     # Audit Log
     audit = models.AuditLog(
@@ -96,39 +211,150 @@ def create_requirement(req: schemas.RequirementCreate, db: Session = Depends(dat
     )
     db.add(audit)
     
-    db.commit()
+    try:
+        db.commit()
+    except exc.IntegrityError:
+        if req.project_id:
+            raise _CounterRace()
+        raise
     db.refresh(new_req)
     return new_req
 
-@router.get("/", response_model=List[schemas.RequirementOut])
-def list_requirements(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db)):
-    return db.query(models.Requirement).offset(skip).limit(limit).all()
+@router.get("/", response_model=Union[List[schemas.RequirementOut], schemas.RequirementPage])
+def list_requirements(
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    project_id: Optional[int] = None,
+    status: Optional[List[models.RequirementStatus]] = Query(None),
+    priority: Optional[List[str]] = Query(None),
+    parent_id: Optional[str] = None,
+    updated_since: Optional[datetime] = None,
+    ears: Optional[bool] = Query(None, description="Only EARS compliant (true) or non-compliant (false) titles"),
+    ears_pattern: Optional[List[str]] = Query(None),
+    facets: bool = Query(False, description="Wrap the page as {items, total, facets} with per-facet counts"),
+    as_of: Optional[datetime] = Query(None, description="Rebuild the project's requirements as they were at this time"),
+    db: Session = Depends(database.get_db)
+):
+    for pattern in ears_pattern or ():
+        if pattern not in facet_filters.EARS_VALUES:
+            raise HTTPException(status_code=400, detail=f"Unknown EARS pattern '{pattern}'. Allowed: {', '.join(facet_filters.EARS_VALUES)}")
+    if updated_since is not None:
+        updated_since = _naive_utc(updated_since)
+    clauses = facet_filters.filters(project_id, status, priority, parent_id, updated_since, ears, ears_pattern)
+    if as_of is not None:
+        if project_id is None:
+            raise HTTPException(status_code=400, detail="as_of needs a project_id")
+        if len(clauses) > 1 or facets:
+            raise HTTPException(status_code=400, detail="as_of cannot be combined with filters or facets")
+        sharding.route(db, project_id)
+        return history.project_as_of(db.connection(), project_id, _naive_utc(as_of))[skip:skip + limit]
+    filters = list(clauses.values())
+    names = projection.REQUIREMENT_FIELDS
+    if fields:
+        columns = projection.parse_fields(fields, models.Requirement, projection.REQUIREMENT_FIELDS)
+        names = tuple(c.name for c in columns)
+    if not facets and set(clauses) <= {"project_id"}:
+        body = readmodel.cached_json(db, ("requirements", skip, limit, project_id, names),
+                                     lambda model: model.requirement_page(skip, limit, project_id, names))
+        if body is not None:
+            return Response(content=body, media_type="application/json")
+    if facets:
+        # Rows come back as plain dicts either way, so the envelope skips ORM loading
+        columns = columns if fields else [models.Requirement.__table__.c[name] for name in names]
+        if database.SHARDING and project_id is None:
+            counted = facet_filters.merge_counts(sharding.fan_out(db, lambda s: facet_filters.counts(s, clauses)))
+            parts = sharding.fan_out(db, lambda s: projection.select_rows(
+                s, columns, 0, skip + limit, filters, order_by=[models.Requirement.id]))
+            items = sharding.merge_page(parts, skip, limit, key=lambda r: r["id"])
+        else:
+            if project_id is not None:
+                sharding.route(db, project_id)
+            counted = facet_filters.counts(db, clauses)
+            items = projection.select_rows(db, columns, skip, limit, filters, order_by=[facet_filters.TABLE_ORDER])
+        return projection.json_response({"items": items, **counted})
+    if project_id is not None:
+        sharding.route(db, project_id)
+    elif database.SHARDING:
+        # Every shard returns its first skip + limit rows by id; the merged page is cut from those
+        if fields:
+            parts = sharding.fan_out(db, lambda s: projection.select_rows(
+                s, columns, 0, skip + limit, filters, order_by=[models.Requirement.id]))
+            return projection.json_response(sharding.merge_page(parts, skip, limit, key=lambda r: r["id"]))
+        parts = sharding.fan_out(db, lambda s: s.query(models.Requirement).filter(*filters)
+                                 .order_by(models.Requirement.id).limit(skip + limit).all())
+        return sharding.merge_page(parts, skip, limit, key=lambda r: r.id)
+    if fields:
+        return projection.json_response(projection.select_rows(db, columns, skip, limit, filters, order_by=[facet_filters.TABLE_ORDER]))
+    return db.query(models.Requirement).filter(*filters).order_by(facet_filters.TABLE_ORDER).offset(skip).limit(limit).all()
 
-@router.get("/{req_id}", response_model=schemas.RequirementDetail)
-def read_requirement(req_id: str, db: Session = Depends(database.get_db)):
+@router.get("/{req_id}", response_model=schemas.RequirementDetail, response_model_exclude_unset=True)
+def read_requirement(req_id: str, as_of: Optional[datetime] = None, db: Session = Depends(database.get_db)):
+    if not sharding.route_requirement(db, req_id):
+        raise HTTPException(status_code=404, detail="Requirement not found")
+    if as_of is not None:
+        # Traces and children are not historized, so a past state comes without them
+        state = history.as_of(db.connection(), [req_id], _naive_utc(as_of)).get(req_id)
+        if not state:
+            raise HTTPException(status_code=404, detail=f"Requirement did not exist at {as_of.isoformat()}")
+        return state
     req = db.query(models.Requirement).filter(models.Requirement.id == req_id).first()
     if not req:
         raise HTTPException(status_code=404, detail="Requirement not found")
     return req
 
+@router.get("/{req_id}/neighborhood", response_model=schemas.Neighborhood)
+def read_neighborhood(
+    req_id: str,
+    depth: int = Query(1, ge=0, le=5),
+    max_nodes: int = Query(200, ge=1, le=1000),
+    db: Session = Depends(database.get_db)
+):
+    if not sharding.route_requirement(db, req_id) or not db.get(models.Requirement, req_id):
+        raise HTTPException(status_code=404, detail="Requirement not found")
+    nodes, traces, truncated = graph.neighborhood(db, req_id, depth, max_nodes)
+    return schemas.Neighborhood(root_id=req_id, depth=depth, nodes=nodes, traces=traces, truncated=truncated)
+
+@router.get("/{req_id}/similar", response_model=List[schemas.SimilarRequirement])
+async def similar_requirements(req_id: str, k: int = Query(10, ge=1, le=100), db: Session = Depends(database.get_db)):
+    return await _similar(req_id, k, False, db)
+
+@router.get("/{req_id}/suggested-traces", response_model=List[schemas.SimilarRequirement])
+async def suggested_traces(req_id: str, k: int = Query(10, ge=1, le=100), db: Session = Depends(database.get_db)):
+    return await _similar(req_id, k, True, db)
+
+async def _similar(req_id: str, k: int, exclude_linked: bool, db: Session):
+    if not sharding.route_requirement(db, req_id) or not db.get(models.Requirement, req_id):
+        raise HTTPException(status_code=404, detail="Requirement not found")
+    try:
+        return await embeddings.similar(req_id, k, exclude_linked)
+    except ai_service.GenerationError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
 @router.put("/{req_id}", response_model=schemas.RequirementOut)
-def update_requirement(req_id: str, update_data: schemas.RequirementUpdate, db: Session = Depends(database.get_db)):
+def update_requirement(req_id: str, update_data: schemas.RequirementUpdate, background_tasks: BackgroundTasks, db: Session = Depends(database.get_db)):
+    if not sharding.route_requirement(db, req_id):
+        raise HTTPException(status_code=404, detail="Requirement not found")
     req = db.query(models.Requirement).filter(models.Requirement.id == req_id).first()
     if not req:
         raise HTTPException(status_code=404, detail="Requirement not found")
     
     # Capture changes for Audit
     changes = []
+    content_changes = [] # What dependent trace links rely on
     
     if update_data.title is not None and update_data.title != req.title:
         changes.append(f"Title: '{req.title}' -> '{update_data.title}'")
+        content_changes.append("title")
         req.title = update_data.title
         
     if update_data.description is not None and update_data.description != req.description:
         changes.append("Description updated")
+        content_changes.append("description")
         req.description = update_data.description
 
-    if update_data.rationale is not None:
+    if update_data.rationale is not None and update_data.rationale != req.rationale:
+        changes.append("Rationale updated")
         req.rationale = update_data.rationale
     
     if update_data.priority is not None:
@@ -152,6 +378,10 @@ def update_requirement(req_id: str, update_data: schemas.RequirementUpdate, db:
         return req # No Db update needed
 
     req.updated_at = datetime.utcnow()
+    if content_changes:
+        marked = reindex.text_changed(db, req, content_changes, now=req.updated_at)
+        if marked:
+            changes.append(f"{marked} trace link(s) marked suspect")
     
     # Audit
     audit = models.AuditLog(
@@ -163,36 +393,35 @@ def update_requirement(req_id: str, update_data: schemas.RequirementUpdate, db:
     
     db.commit()
     db.refresh(req)
+    if content_changes:
+        background_tasks.add_task(reindex.after_commit, [req_id])
     return req
 
-@router.delete("/{req_id}")
-def delete_requirement(req_id: str, db: Session = Depends(database.get_db)):
-    req = db.query(models.Requirement).filter(models.Requirement.id == req_id).first()
-    if not req:
+@router.delete("/{req_id}", response_model=schemas.SubtreeDeleteResult)
+def delete_requirement(req_id: str, dry_run: bool = False, db: Session = Depends(database.get_db)):
+    if not sharding.route_requirement(db, req_id):
         raise HTTPException(status_code=404, detail="Requirement not found")
 
-    # Constraint: "While a requirement is in the “Approved” state, the application shall prevent deletion of trace links."
-    # If we delete the requirement, we delete trace links (cascade). 
-    # So if THIS requirement is Approved, or if it is linked to an Approved requirement?
-    # REQ-TRACE-003 says "While a requirement is in the “Approved” state, the application shall prevent deletion of trace links."
-    # If we delete the requirement, the links are deleted.
-    # So if this req is Approved, we can't delete it (as it would delete links).
-    # ALSO if it is linked to another req that is Approved, we can't delete the link.
-    
-    # 1. Check if self is Approved
-    if req.status == models.RequirementStatus.APPROVED.value:
-         if req.outgoing_traces or req.incoming_traces:
-             raise HTTPException(status_code=400, detail="Cannot delete Approved requirement with active traces.")
-    
-    # 2. Check connected requirements for Approved status
-    for trace in req.outgoing_traces:
-        if trace.target.status == models.RequirementStatus.APPROVED.value:
-            raise HTTPException(status_code=400, detail=f"Cannot delete: Linked to Approved requirement {trace.target_id}")
-
-    for trace in req.incoming_traces:
-        if trace.source.status == models.RequirementStatus.APPROVED.value:
-             raise HTTPException(status_code=400, detail=f"Cannot delete: Linked from Approved requirement {trace.source_id}")
+    # Deleting a requirement removes its whole subtree and every trace link touching it.
+    # REQ-TRACE-003: "While a requirement is in the “Approved” state, the application shall
+    # prevent deletion of trace links", so any such link with an Approved end blocks the delete.
+    plan = bulk.plan_subtree_delete(db.connection(), req_id)
+    if not plan["requirements"]:
+        raise HTTPException(status_code=404, detail="Requirement not found")
+    result = schemas.SubtreeDeleteResult(
+        ok=not plan["blocked"],
+        dry_run=dry_run,
+        requirements=plan["requirements"],
+        traces=[{"source_id": s, "target_id": t} for s, t in plan["traces"]],
+        blocked=[{"source_id": s, "target_id": t} for s, t in plan["blocked"]],
+    )
+    if dry_run:
+        return result
+    if plan["blocked"]:
+        source_id, target_id = plan["blocked"][0]
+        more = f" and {len(plan['blocked']) - 1} more" if len(plan["blocked"]) > 1 else ""
+        raise HTTPException(status_code=400, detail=f"Cannot delete: trace {source_id} -> {target_id}{more} involves an Approved requirement")
 
-    db.delete(req)
+    bulk.delete_subtree(db, plan)
     db.commit()
-    return {"ok": True}
+    return result
@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+from .. import models, schemas, database, sharding
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["sync"]
+)
+
+MAX_PAGE_SIZE = 5000
+
+@router.get("/", response_model=schemas.SyncResponse)
+def get_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=MAX_PAGE_SIZE),
+    project_id: Optional[int] = Query(None, description="Shard to read; required with sharded storage"),
+    db: Session = Depends(database.get_db)
+):
+    # Each shard keeps its own sequence, so sharded clients sync one project at a time
+    if database.SHARDING:
+        if project_id is None:
+            raise HTTPException(status_code=400, detail="project_id is required with sharded storage")
+        sharding.route(db, project_id)
+
+    # Each source is read through its change_seq index; at most `limit` rows from each.
+    # Sequence numbers are unique across all sources, so merging and cutting at
+    # `limit` yields a consistent page that the next call continues from.
+    sources = [
+        ("projects", db.query(models.Project).filter(models.Project.change_seq > since)
+            .order_by(models.Project.change_seq).limit(limit + 1).all(), "change_seq"),
+        ("requirements", db.query(models.Requirement).filter(models.Requirement.change_seq > since)
+            .order_by(models.Requirement.change_seq).limit(limit + 1).all(), "change_seq"),
+        ("traces", db.query(models.Trace).filter(models.Trace.change_seq > since)
+            .order_by(models.Trace.change_seq).limit(limit + 1).all(), "change_seq"),
+        ("deleted", db.query(models.Tombstone).filter(models.Tombstone.seq > since)
+            .order_by(models.Tombstone.seq).limit(limit + 1).all(), "seq"),
+    ]
+
+    merged = sorted(
+        ((getattr(row, seq_attr), key, row) for key, rows, seq_attr in sources for row in rows),
+        key=lambda item: item[0]
+    )
+    page = merged[:limit]
+
+    result = {key: [] for key, _, _ in sources}
+    for _, key, row in page:
+        result[key].append(row)
+
+    return schemas.SyncResponse(
+        **result,
+        next_since=page[-1][0] if page else since,
+        has_more=len(merged) > limit
+    )
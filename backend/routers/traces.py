@@ -1,21 +1,78 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import exc
 from sqlalchemy.orm import Session
-from .. import models, schemas, database
+from typing import List, Optional
+from .. import models, schemas, database, sharding, suspect
 
 router = APIRouter(
     prefix="/traces",
     tags=["traces"]
 )
 
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+get_db = database.get_db
+
+MAX_CLEAR_LINKS = 5000 # Two bound parameters each
+
+def _route(db: Session, trace: schemas.TraceCreate):
+    # A trace lives in its requirements' shard, so both ends must be in the same project
+    if not database.SHARDING:
+        return
+    source_found, source_project = sharding.locate(db, trace.source_id)
+    target_found, target_project = sharding.locate(db, trace.target_id)
+    if not source_found or not target_found:
+        raise HTTPException(status_code=404, detail="Source or Target Requirement not found")
+    if source_project != target_project:
+        raise HTTPException(status_code=400, detail="Traces across projects are not supported with sharded storage")
+    sharding.route(db, source_project)
+
+@router.get("/suspect", response_model=List[schemas.SuspectTraceOut])
+def list_suspect_traces(project_id: Optional[int] = None, target_id: Optional[str] = None,
+                        skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    scopes = []
+    if project_id is not None:
+        scopes.append(suspect.scope_filter(project_id=project_id))
+    if target_id is not None:
+        scopes.append(suspect.scope_filter(target_id=target_id))
+    if project_id is not None:
+        sharding.route(db, project_id)
+    elif target_id is not None:
+        if not sharding.route_requirement(db, target_id):
+            return []
+    elif database.SHARDING:
+        parts = sharding.fan_out(db, lambda s: suspect.open_links(s.connection(), scopes, 0, skip + limit))
+        return sharding.merge_page(parts, skip, limit, key=lambda r: (r["source_id"], r["target_id"]))
+    return suspect.open_links(db.connection(), scopes, skip, limit)
+
+@router.post("/suspect/clear", response_model=schemas.SuspectClearResult)
+def clear_suspect_traces(req: schemas.SuspectClearRequest, db: Session = Depends(get_db)):
+    scopes = [s for s in (req.project_id, req.target_id, req.links) if s is not None]
+    if len(scopes) != 1:
+        raise HTTPException(status_code=400, detail="Give exactly one of project_id, target_id or links")
+    if req.links is not None and len(req.links) > MAX_CLEAR_LINKS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CLEAR_LINKS} links per request")
+
+    if req.project_id is not None:
+        if not db.query(models.Project.id).filter(models.Project.id == req.project_id).first():
+            raise HTTPException(status_code=404, detail="Project not found")
+        sharding.route(db, req.project_id)
+    elif req.target_id is not None:
+        if not sharding.route_requirement(db, req.target_id) or \
+                not db.query(models.Requirement.id).filter(models.Requirement.id == req.target_id).first():
+            raise HTTPException(status_code=404, detail="Requirement not found")
+    elif database.SHARDING and req.links:
+        located = sharding.shards_of(db, {link.source_id for link in req.links})
+        if len(located) > 1:
+            raise HTTPException(status_code=400, detail="With sharded storage, links must belong to one project")
+        if located:
+            sharding.route(db, next(iter(located)))
+
+    cleared = suspect.clear(db.connection(), suspect.scope_filter(req.project_id, req.target_id, req.links))
+    db.commit()
+    return schemas.SuspectClearResult(cleared=cleared)
 
 @router.post("/", response_model=schemas.TraceOut)
 def create_trace(trace: schemas.TraceCreate, db: Session = Depends(get_db)):
+    _route(db, trace)
     # Check if link exists
     existing = db.query(models.Trace).filter(
         models.Trace.source_id == trace.source_id,
@@ -48,12 +105,17 @@ def create_trace(trace: schemas.TraceCreate, db: Session = Depends(get_db)):
     db.add(models.AuditLog(req_id=source.id, action="LINK", details=f"Linked to {target.id}"))
     db.add(models.AuditLog(req_id=target.id, action="LINK", details=f"Linked from {source.id}"))
     
-    db.commit()
+    try:
+        db.commit()
+    except exc.IntegrityError: # A concurrent request created the same link
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Trace link already exists")
     db.refresh(new_trace)
     return new_trace
 
 @router.delete("/", status_code=204)
 def delete_trace(trace: schemas.TraceCreate, db: Session = Depends(get_db)):
+    _route(db, trace)
     trace_obj = db.query(models.Trace).filter(
         models.Trace.source_id == trace.source_id,
         models.Trace.target_id == trace.target_id
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Literal
 from datetime import datetime
 from enum import Enum
 
@@ -36,6 +36,19 @@ class TraceOut(BaseModel):
     
     model_config = ConfigDict(from_attributes=True)
 
+class SuspectTraceOut(TraceOut):
+    suspect_reason: Optional[str] = None
+    suspect_since: Optional[datetime] = None
+
+class SuspectClearRequest(BaseModel):
+    # Exactly one scope
+    project_id: Optional[int] = None
+    target_id: Optional[str] = None # Every suspect link pointing at this requirement
+    links: Optional[List[TraceCreate]] = None
+
+class SuspectClearResult(BaseModel):
+    cleared: List[TraceOut] = []
+
 class RequirementBase(BaseModel):
     id: str
     title: str
@@ -58,6 +71,26 @@ class RequirementUpdate(BaseModel):
     parent_id: Optional[str] = None
     project_id: Optional[int] = None
 
+class BulkStatusRequest(BaseModel):
+    status: RequirementStatus
+    # Exactly one scope
+    project_id: Optional[int] = None
+    root_id: Optional[str] = None
+    ids: Optional[List[str]] = None
+
+class BulkStatusResult(BaseModel):
+    status: RequirementStatus
+    updated: int
+    unchanged: int
+    by_previous_status: Dict[str, int] = {}
+
+class SubtreeDeleteResult(BaseModel):
+    ok: bool
+    dry_run: bool = False
+    requirements: List[str] = []
+    traces: List[TraceOut] = []
+    blocked: List[TraceOut] = [] # Links touching an Approved requirement
+
 class RequirementOut(RequirementBase):
     project_id: Optional[int] = None
     created_at: datetime
@@ -65,6 +98,12 @@ class RequirementOut(RequirementBase):
     
     model_config = ConfigDict(from_attributes=True)
 
+class RequirementPage(BaseModel):
+    # GET /requirements/?facets=true
+    items: List[RequirementOut]
+    total: int
+    facets: Dict[str, Dict[str, int]] # facet -> value -> count, see facets.py
+
 class RequirementNode(RequirementOut):
     # For tree structure, simplified
     children: List["RequirementNode"] = []
@@ -92,6 +131,11 @@ class AuditLogOut(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class AuditCompactResult(BaseModel):
+    archived: int
+    segments: int
+    cutoff: datetime
+
 class AIDescriptionRequest(BaseModel):
     title: str
     model: Optional[str] = None
@@ -107,3 +151,148 @@ class AIRationaleRequest(BaseModel):
 
 class AIGenerationResponse(BaseModel):
     generated_text: str
+
+class TombstoneOut(BaseModel):
+    seq: int
+    entity: str
+    entity_id: Optional[str] = None
+    source_id: Optional[str] = None
+    target_id: Optional[str] = None
+    project_id: Optional[int] = None
+    deleted_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class SyncResponse(BaseModel):
+    projects: List[ProjectOut] = []
+    requirements: List[RequirementOut] = []
+    traces: List[TraceOut] = []
+    deleted: List[TombstoneOut] = []
+    next_since: int
+    has_more: bool
+
+class GenerationJobCreate(BaseModel):
+    project_id: Optional[int] = None
+    root_id: Optional[str] = None
+    field: Literal["description", "rationale"]
+    model: Optional[str] = None
+    overwrite: bool = False
+
+class GenerationJobOut(BaseModel):
+    id: int
+    project_id: Optional[int] = None
+    root_id: Optional[str] = None
+    field: str
+    model: Optional[str] = None
+    status: str
+    total: int
+    completed: int
+    failed: int
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class SimilarRequirement(BaseModel):
+    id: str
+    title: str
+    status: str
+    project_id: Optional[int] = None
+    score: float
+
+class DuplicateCheckRequest(BaseModel):
+    title: str
+    description: Optional[str] = None
+    project_id: Optional[int] = None
+    exclude_id: Optional[str] = None
+
+class DuplicateCandidate(BaseModel):
+    id: str
+    title: str
+    status: str
+    project_id: Optional[int] = None
+    similarity: float
+
+class DuplicateCluster(BaseModel):
+    requirements: List[DuplicateCandidate]
+
+class NeighborhoodNode(BaseModel):
+    id: str
+    title: str
+    status: str
+    priority: Optional[str] = None
+    project_id: Optional[int] = None
+    parent_id: Optional[str] = None
+    distance: int
+    in_degree: int
+    out_degree: int
+    child_count: int
+
+class Neighborhood(BaseModel):
+    root_id: str
+    depth: int
+    nodes: List[NeighborhoodNode]
+    traces: List[TraceOut]
+    truncated: bool
+
+class ProjectMetrics(BaseModel):
+    project_id: int
+    requirements: int
+    traces: int
+    untraced: int
+    orphans: int # No parent, no children and no traces
+    leaves: int
+    coverage: float # Share of requirements with at least one trace
+    max_depth: int
+    by_status: Dict[str, int]
+    by_depth: Dict[int, int]
+
+class BaselineCreate(BaseModel):
+    project_id: int
+    name: str
+    description: Optional[str] = None
+
+class BaselineOut(BaseModel):
+    id: int
+    project_id: int
+    name: str
+    description: Optional[str] = None
+    created_at: datetime
+    manifest_hash: str
+    requirement_count: int
+    trace_count: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ModifiedRequirement(BaseModel):
+    id: str
+    fields: List[str]
+
+class BaselineDiff(BaseModel):
+    from_id: int
+    to_id: int
+    added: List[str]
+    removed: List[str]
+    modified: List[ModifiedRequirement]
+    traces_added: List[TraceOut]
+    traces_removed: List[TraceOut]
+
+class FieldChangeOut(BaseModel):
+    id: int
+    req_id: str
+    field: str
+    old_value: Optional[Any] = None
+    new_value: Optional[Any] = None
+    changed_at: datetime
+
+class BackupOut(BaseModel):
+    name: str
+    kind: Literal["snapshot", "dump"]
+    size: int
+    created_at: datetime
+
+class RestoreRequest(BaseModel):
+    name: str # A dump in the backup directory, e.g. uploaded with PUT /admin/dumps/{name}
+
+class RestoreResult(BaseModel):
+    counts: Dict[str, int]
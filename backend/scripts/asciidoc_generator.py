@@ -1,16 +1,144 @@
-from sqlalchemy.orm import Session, joinedload
-from .. import models
+import os
+from collections import deque
+from sqlalchemy.orm import Session, selectinload
+from .. import models, sharding
 
-def generate_asciidoc(db: Session, status_filter: str = None, priority_filter: str = None):
-    # Eager load project to avoid N+1 and ensure we have project names
-    query = db.query(models.Requirement).options(joinedload(models.Requirement.project))
-    
-    if status_filter:
-        query = query.filter(models.Requirement.status == status_filter)
-    if priority_filter:
-        query = query.filter(models.Requirement.priority == priority_filter)
-        
-    reqs = query.all()
+# Kroki/PlantUML stop rendering readable (or at all) past a few hundred nodes
+DIAGRAM_NODE_BUDGET = int(os.getenv("EXPORT_DIAGRAM_NODE_BUDGET", "50"))
+
+def _puml_id(req_id: str) -> str:
+    return req_id.replace("-", "_")
+
+def partition_trace_graph(reqs, edges, budget: int):
+    """
+    Splits requirements into diagram partitions of at most `budget` nodes in O(V+E).
+    Partitions never mix projects. Connected components (over traces within a
+    project) are discovered by BFS; components larger than the budget are cut
+    into BFS-ordered chunks so each chunk stays locally connected, and small
+    components are packed together. Returns [(project_name, [requirement])].
+    """
+    project_of = {r.id: (r.project.name if r.project else "Unassigned") for r in reqs}
+    by_id = {r.id: r for r in reqs}
+    adjacency = {r.id: [] for r in reqs}
+    for source, target in edges:
+        if source in adjacency and target in adjacency and project_of[source] == project_of[target]:
+            adjacency[source].append(target)
+            adjacency[target].append(source)
+
+    components = {} # project_name -> [[requirement ids in BFS order]]
+    seen = set()
+    for r in reqs:
+        if r.id in seen:
+            continue
+        seen.add(r.id)
+        component, queue = [], deque([r.id])
+        while queue:
+            node = queue.popleft()
+            component.append(node)
+            for neighbour in adjacency[node]:
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    queue.append(neighbour)
+        components.setdefault(project_of[r.id], []).append(component)
+
+    partitions = []
+    for p_name in sorted(components):
+        current = []
+        for component in components[p_name]:
+            if len(component) > budget:
+                for start in range(0, len(component), budget):
+                    partitions.append((p_name, component[start:start + budget]))
+            else:
+                if len(current) + len(component) > budget:
+                    partitions.append((p_name, current))
+                    current = []
+                current = current + component
+        if current:
+            partitions.append((p_name, current))
+    return [(p_name, [by_id[i] for i in ids]) for p_name, ids in partitions]
+
+def render_partition(number: int, members, part_of, edges, budget: int):
+    """
+    Renders one partition as a PlantUML block. Traces leaving the partition point at
+    small reference boxes naming the diagram that holds the other end; past
+    budget // 2 distinct references the remainder is summarized in a note.
+    `part_of` maps requirement ID to diagram number; `edges` only need to include the
+    partition's own traces.
+    """
+    inside = {r.id for r in members}
+
+    lines = []
+    lines.append(f"[plantuml, traceability_diag_{number}, svg]")
+    lines.append("----")
+    lines.append("@startuml")
+    lines.append("left to right direction")
+    lines.append("skinparam rectangle {")
+    lines.append("    BackgroundColor<<Approved>> #LightGreen")
+    lines.append("    BackgroundColor<<Released>> #LightBlue")
+    lines.append("    BackgroundColor<<Draft>> #White")
+    lines.append("    BackgroundColor<<Reference>> #WhiteSmoke")
+    lines.append("}")
+    lines.append("allow_mixing")
+
+    for r in members:
+        # Puml IDs can't have hyphens if they are not quoted, or we can just use the ID as a name
+        # Using quotes to be safe
+        lines.append(f'rectangle "{r.id}\\n{r.title}" as {_puml_id(r.id)} <<{r.status}>>')
+
+    references = {}
+    omitted = 0
+    arrows = []
+    for source, target in edges:
+        if source not in inside and target not in inside:
+            continue
+        if source in inside and target in inside:
+            arrows.append(f"{_puml_id(source)} --> {_puml_id(target)}")
+            continue
+        other = target if source in inside else source
+        if other not in references:
+            if len(references) >= max(1, budget // 2):
+                omitted += 1
+                continue
+            references[other] = f"ref_{_puml_id(other)}"
+            lines.append(f'rectangle "{other}\\n(see Diagram {part_of[other]})" as {references[other]} <<Reference>>')
+        if source in inside:
+            arrows.append(f"{_puml_id(source)} ..> {references[other]}")
+        else:
+            arrows.append(f"{references[other]} ..> {_puml_id(target)}")
+
+    lines.extend(arrows)
+    if omitted:
+        lines.append(f"note as overflow\n{omitted} more links to requirements in other diagrams\nend note")
+    lines.append("@enduml")
+    lines.append("----")
+    return lines
+
+def generate_asciidoc(db: Session, status_filter: str = None, priority_filter: str = None, diagram_node_budget: int = None,
+                      scope=None, shard_keys=None):
+    """`scope` is a SELECT of requirement IDs (graph.scope_ids); None exports everything."""
+    def load(session):
+        # Eager load project and traces to avoid N+1; selectin also works when projects sit in the catalog database
+        query = session.query(models.Requirement).options(
+            selectinload(models.Requirement.project),
+            selectinload(models.Requirement.outgoing_traces),
+            selectinload(models.Requirement.incoming_traces),
+        )
+        if scope is not None:
+            query = query.filter(models.Requirement.id.in_(scope))
+        if status_filter:
+            query = query.filter(models.Requirement.status == status_filter)
+        if priority_filter:
+            query = query.filter(models.Requirement.priority == priority_filter)
+        return query.all()
+
+    reqs = [r for part in sharding.fan_out(db, load, shard_keys) for r in part]
+    return render_asciidoc(reqs, diagram_node_budget)
+
+def render_asciidoc(reqs, diagram_node_budget: int = None, title: str = "Requirements Document"):
+    """
+    Renders requirements as AsciiDoc. Works on ORM rows as well as on any objects with
+    the same attributes (id, title, ..., project.name, outgoing/incoming_traces), e.g. baselines.
+    """
     req_map = {r.id: r for r in reqs}
     
     # Build tree structure
@@ -32,7 +160,7 @@ def generate_asciidoc(db: Session, status_filter: str = None, priority_filter: s
         projects_map.setdefault(p_name, []).append(r)
         
     output = []
-    output.append("= Requirements Document")
+    output.append(f"= {title}")
     output.append(":doctype: book")
     output.append(":toc:")
     output.append("")
@@ -94,37 +222,31 @@ def generate_asciidoc(db: Session, status_filter: str = None, priority_filter: s
     # Sort all requirements by ID for the matrix and diagram
     sorted_reqs = sorted(reqs, key=lambda x: x.id)
 
-    # Traceability Diagram
+    # Traceability Diagrams, one per partition so each stays renderable
+    edges = [(r.id, t.target_id) for r in sorted_reqs for t in r.outgoing_traces if t.target_id in req_map]
+    partitions = partition_trace_graph(sorted_reqs, edges, diagram_node_budget or DIAGRAM_NODE_BUDGET)
+
     output.append("")
-    output.append("== Traceability Diagram")
+    output.append("== Traceability Diagrams")
     output.append("")
-    output.append("[plantuml, traceability_diag, svg]")
-    output.append("----")
-    output.append("@startuml")
-    output.append("left to right direction")
-    output.append("skinparam rectangle {")
-    output.append("    BackgroundColor<<Approved>> #LightGreen")
-    output.append("    BackgroundColor<<Released>> #LightBlue")
-    output.append("    BackgroundColor<<Draft>> #White")
-    output.append("}")
-    output.append("allow_mixing")
-    
-    # Add requirements as rectangles
-    for r in sorted_reqs:
-        # Puml IDs can't have hyphens if they are not quoted, or we can just use the ID as a name
-        # Using quotes to be safe
-        status_tag = f"<<{r.status}>>"
-        output.append(f'rectangle "{r.id}\\n{r.title}" as {r.id.replace("-", "_")} {status_tag}')
-        
-    # Add traces
-    for r in sorted_reqs:
-        for t in r.outgoing_traces:
-            source = r.id.replace("-", "_")
-            target = t.target_id.replace("-", "_")
-            output.append(f"{source} --> {target}")
-            
-    output.append("@enduml")
-    output.append("----")
+    # Each partition gets only its own edges, so rendering all of them stays O(V+E)
+    part_of = {r.id: number for number, (_, members) in enumerate(partitions, start=1) for r in members}
+    edges_of = {}
+    for source, target in edges:
+        edges_of.setdefault(part_of[source], []).append((source, target))
+        if part_of[target] != part_of[source]:
+            edges_of.setdefault(part_of[target], []).append((source, target))
+    project_parts = {}
+    for p_name, _ in partitions:
+        project_parts[p_name] = project_parts.get(p_name, 0) + 1
+    part_numbers = {}
+    for number, (p_name, members) in enumerate(partitions, start=1):
+        part_numbers[p_name] = part_numbers.get(p_name, 0) + 1
+        title = p_name if project_parts[p_name] == 1 else f"{p_name} ({part_numbers[p_name]}/{project_parts[p_name]})"
+        output.append(f"=== Diagram {number}: {title}")
+        output.append("")
+        output.extend(render_partition(number, members, part_of, edges_of.get(number, []), diagram_node_budget or DIAGRAM_NODE_BUDGET))
+        output.append("")
 
     # Traceability Matrix
     output.append("")
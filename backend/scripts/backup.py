@@ -0,0 +1,59 @@
+"""
+Online snapshots and portable dumps of the ReqTool database.
+
+Usage:
+  python -m backend.scripts.backup snapshot [--keep N]
+  python -m backend.scripts.backup dump [PATH]
+  python -m backend.scripts.backup restore PATH
+  python -m backend.scripts.backup list
+
+Snapshots and dumps can be taken while the server runs. A restore replaces
+all data; stop writers first. Settings come from the same environment
+variables as the server (DATABASE_URL, BACKUP_DIR, ...).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from backend import database, models, backup
+
+def main():
+    parser = argparse.ArgumentParser(description="Back up and restore the ReqTool database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    snapshot = commands.add_parser("snapshot", help="Online copy of the database files")
+    snapshot.add_argument("--keep", type=int, default=None, help="Snapshots to keep (default BACKUP_KEEP)")
+    dump = commands.add_parser("dump", help="Write a gzip NDJSON dump")
+    dump.add_argument("path", nargs="?", default=None)
+    restore = commands.add_parser("restore", help="Replace all data with a dump")
+    restore.add_argument("path")
+    commands.add_parser("list", help="List snapshots and dumps in BACKUP_DIR")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=database.engine)
+    started = time.perf_counter()
+    try:
+        if args.command == "snapshot":
+            result = backup.take_snapshot()
+            removed = backup.rotate(args.keep)
+            print(f"Wrote {result['name']} ({result['size']} bytes); removed {len(removed)} old snapshot(s)")
+        elif args.command == "dump":
+            result = backup.write_dump(args.path)
+            print(f"Wrote {result['path']}: " + ", ".join(f"{n} {t}" for t, n in result["counts"].items()))
+        elif args.command == "restore":
+            result = backup.restore_dump(args.path)
+            print("Restored " + ", ".join(f"{n} {t}" for t, n in result["counts"].items())
+                  + f" in {time.perf_counter() - started:.1f}s; indexing duplicates...")
+            print(f"Indexed {backup.index_duplicates()} requirements for duplicate detection")
+        else:
+            for item in backup.list_backups():
+                print(f"{item['created_at']:%Y-%m-%d %H:%M:%S}  {item['kind']:8}  {item['size']:>12}  {item['name']}")
+            return
+    except backup.BackupError as e:
+        sys.exit(f"Error: {e}")
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
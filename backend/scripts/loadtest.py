@@ -0,0 +1,387 @@
+"""
+Open-loop load generator for the ReqTool API.
+
+Requests arrive as a Poisson process at the target rate, whatever the latency
+of earlier ones, and latency is measured from each request's scheduled start.
+An overloaded server therefore shows up as growing latency and errors, not as
+a politely reduced request rate. Each arrival picks a scenario from the mix:
+
+  sidebar   Sidebar poll: sparse requirement list + project list
+  detail    detail view: requirement, its audit log and trace neighborhood
+  create    new requirement in a random project
+  update    title change on a random requirement
+  link      trace between two random requirements of one project
+  export    AsciiDoc export
+  ai        streamed description generation (fake Ollama unless --url)
+
+By default the app runs in-process behind httpx's ASGI transport on a
+throwaway database. --uvicorn serves it from a local uvicorn instead, and
+--url targets an already running server. --search steps the rate up until a
+step breaks the SLO (error rate, p95 or achieved throughput), then bisects
+to the saturation point.
+
+Usage:
+  python -m backend.scripts.loadtest [--rate 20] [--duration 15] [--mix sidebar=6,detail=3,update=1]
+  python -m backend.scripts.loadtest --search [--slo-p95 500] [--max-error-rate 0.01]
+  python -m backend.scripts.loadtest --uvicorn --search
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import httpx
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+DEFAULT_MIX = {"sidebar": 50, "detail": 25, "update": 10, "create": 5, "link": 5, "export": 2, "ai": 3}
+SIDEBAR_FIELDS = "title,status,parent_id,project_id"
+MAX_IN_FLIGHT = 2000
+
+class FakeOllama(httpx.AsyncBaseTransport):
+    """Streams a fixed number of tokens with a delay between them, like a busy model, and embeds instantly."""
+    def __init__(self, tokens: int = 20, delay: float = 0.02, dim: int = 64):
+        self.tokens = tokens
+        self.delay = delay
+        self.dim = dim
+
+    async def handle_async_request(self, request):
+        if request.url.path == "/api/embed":
+            texts = json.loads(request.content)["input"]
+            return httpx.Response(200, json={"embeddings": [
+                [random.random() for _ in range(self.dim)] for _ in texts
+            ]})
+        async def body():
+            for i in range(self.tokens):
+                await asyncio.sleep(self.delay)
+                yield (json.dumps({"response": f"token{i} ", "done": i == self.tokens - 1}) + "\n").encode()
+        return httpx.Response(200, content=body())
+
+# --- Scenarios ---
+
+class Workload:
+    """Shared state the scenarios draw from: the projects and requirement IDs seen so far."""
+    def __init__(self, client: httpx.AsyncClient, recorder, timeout: float):
+        self.client = client
+        self.record = recorder
+        self.timeout = timeout
+        self.pending = set() # Requests still running, including ones the client gave up on
+        self.projects = []
+        self.requirements = defaultdict(list) # project_id -> [req_id]
+
+    def random_requirement(self):
+        project_id = random.choice(self.projects)
+        return project_id, random.choice(self.requirements[project_id])
+
+    async def _send(self, method, url, stream, **kwargs):
+        if not stream:
+            return await self.client.request(method, url, **kwargs)
+        async with self.client.stream(method, url, **kwargs) as response:
+            async for _ in response.aiter_lines():
+                pass
+        return response
+
+    async def call(self, label, method, url, started, **kwargs):
+        # A timed-out request keeps running, as it would on a real server after the client hung up.
+        # wait_for because the ASGI transport ignores httpx timeouts.
+        request = asyncio.ensure_future(self._send(method, url, label == "ai", **kwargs))
+        self.pending.add(request)
+        request.add_done_callback(self._finished)
+        try:
+            response = await asyncio.wait_for(asyncio.shield(request), self.timeout)
+            self.record(label, response.status_code, time.perf_counter() - started)
+            return response
+        except asyncio.TimeoutError:
+            self.record(label, "timeout", time.perf_counter() - started)
+        except httpx.HTTPError as e:
+            self.record(label, type(e).__name__, time.perf_counter() - started)
+        return None
+
+    def _finished(self, request):
+        self.pending.discard(request)
+        if not request.cancelled():
+            request.exception() # Retrieved here in case nobody waits for it any more
+
+    async def drain(self, timeout: float):
+        """Waits for abandoned requests so a step does not start with the previous step's backlog."""
+        if self.pending:
+            await asyncio.wait(list(self.pending), timeout=timeout)
+        return len(self.pending)
+
+    async def sidebar(self, started):
+        await asyncio.gather(
+            self.call("sidebar:requirements", "GET", "/requirements/", started, params={"fields": SIDEBAR_FIELDS}),
+            self.call("sidebar:projects", "GET", "/projects/", started),
+        )
+
+    async def detail(self, started):
+        _, req_id = self.random_requirement()
+        await asyncio.gather(
+            self.call("detail:requirement", "GET", f"/requirements/{req_id}", started),
+            self.call("detail:audit", "GET", f"/audit/requirements/{req_id}", started),
+            self.call("detail:neighborhood", "GET", f"/requirements/{req_id}/neighborhood", started),
+        )
+
+    async def create(self, started):
+        project_id = random.choice(self.projects)
+        response = await self.call("create", "POST", "/requirements/", started, json={
+            "id": "", "title": "The system shall respond within 2 seconds", "project_id": project_id,
+        })
+        if response is not None and response.status_code == 200:
+            self.requirements[project_id].append(response.json()["id"])
+
+    async def update(self, started):
+        _, req_id = self.random_requirement()
+        await self.call("update", "PUT", f"/requirements/{req_id}", started, json={"title": f"Updated at {time.time():.6f}"})
+
+    async def link(self, started):
+        project_id = random.choice(self.projects)
+        source_id, target_id = random.sample(self.requirements[project_id], 2)
+        await self.call("link", "POST", "/traces/", started, json={"source_id": source_id, "target_id": target_id})
+
+    async def export(self, started):
+        await self.call("export", "GET", "/export/asciidoc", started)
+
+    async def ai(self, started):
+        await self.call("ai", "POST", "/requirements/generate-description", started, json={"title": "The system shall log in users"})
+
+async def seed(client: httpx.AsyncClient, workload: Workload, projects: int, per_project: int):
+    """Creates the starting data through the API, or reuses what a running server already has."""
+    existing = (await client.get("/projects/", params={"limit": 1000})).json()
+    for project in existing:
+        workload.projects.append(project["id"])
+        rows = (await client.get("/requirements/", params={"project_id": project["id"], "limit": 100000, "fields": "id"})).json()
+        workload.requirements[project["id"]] = [r["id"] for r in rows]
+    run = int(time.time())
+    while len(workload.projects) < projects:
+        n = len(workload.projects)
+        response = await client.post("/projects/", json={"name": f"Load {run}-{n}", "prefix": f"LT{run}{n}-"})
+        response.raise_for_status()
+        workload.projects.append(response.json()["id"])
+    async def fill(project_id):
+        # One at a time per project: IDs come from the project's counter
+        for i in range(len(workload.requirements[project_id]), per_project):
+            response = await client.post("/requirements/", json={
+                "id": "", "title": f"The system shall handle case {i}", "project_id": project_id,
+            })
+            response.raise_for_status()
+            workload.requirements[project_id].append(response.json()["id"])
+    await asyncio.gather(*[fill(project_id) for project_id in workload.projects])
+
+# --- Running a step ---
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+class Step:
+    def __init__(self, rate, duration):
+        self.rate = rate
+        self.duration = duration
+        self.latencies = defaultdict(list)
+        self.outcomes = defaultdict(lambda: defaultdict(int))
+        self.completed = 0 # Scenarios (one or more requests each) finished within the arrival window
+        self.elapsed = 0.0
+
+    def record(self, label, status, latency):
+        self.latencies[label].append(latency)
+        self.outcomes[label][status] += 1
+
+    def summary(self):
+        rows = {}
+        for label in sorted(self.latencies):
+            values = sorted(self.latencies[label])
+            outcomes = self.outcomes[label]
+            errors = sum(n for s, n in outcomes.items() if not isinstance(s, int) or s >= 500)
+            rejected = sum(n for s, n in outcomes.items() if isinstance(s, int) and 400 <= s < 500)
+            rows[label] = {
+                "count": len(values), "throughput": len(values) / self.elapsed if self.elapsed else 0.0,
+                "p50": percentile(values, 0.50), "p95": percentile(values, 0.95), "p99": percentile(values, 0.99),
+                "errors": errors, "rejected": rejected,
+                "error_kinds": {str(s): n for s, n in outcomes.items() if not isinstance(s, int) or s >= 500},
+            }
+        every = sorted(v for values in self.latencies.values() for v in values)
+        total = len(every)
+        errors = sum(r["errors"] for r in rows.values())
+        rows["ALL"] = {
+            "count": total, "throughput": total / self.elapsed if self.elapsed else 0.0,
+            "p50": percentile(every, 0.50), "p95": percentile(every, 0.95), "p99": percentile(every, 0.99),
+            "errors": errors, "rejected": sum(r["rejected"] for r in rows.values()),
+            "error_rate": errors / total if total else 0.0,
+            "scenarios_per_s": self.completed / self.duration if self.duration else 0.0,
+        }
+        return rows
+
+async def run_step(workload: Workload, mix: dict, rate: float, duration: float) -> Step:
+    backlog = await workload.drain(workload.timeout * 3)
+    if backlog:
+        print(f"\n{backlog} requests of the previous step still running")
+    step = Step(rate, duration)
+    workload.record = step.record
+    names, weights = list(mix), list(mix.values())
+    tasks = set()
+    begin = time.perf_counter()
+    next_arrival = begin
+    def completed(_):
+        if time.perf_counter() - begin <= duration:
+            step.completed += 1
+    while next_arrival - begin < duration:
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(tasks) < MAX_IN_FLIGHT:
+            scenario = getattr(workload, random.choices(names, weights)[0])
+            task = asyncio.ensure_future(scenario(next_arrival))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            task.add_done_callback(completed)
+        else:
+            step.record("dropped", "in-flight limit", 0.0)
+        next_arrival += random.expovariate(rate)
+    if tasks:
+        await asyncio.wait(tasks)
+    step.elapsed = time.perf_counter() - begin
+    return step
+
+def passes(summary, rate, args) -> bool:
+    total = summary["ALL"]
+    return (total["error_rate"] <= args.max_error_rate
+            and total["p95"] * 1000 <= args.slo_p95
+            and total["scenarios_per_s"] >= rate * args.min_throughput)
+
+def print_step(step: Step, summary, ok=None):
+    verdict = "" if ok is None else ("  OK" if ok else "  SATURATED")
+    print(f"\n== {step.rate:.1f} scenarios/s target, {summary['ALL']['scenarios_per_s']:.1f} completed/s "
+          f"over {step.elapsed:.1f}s{verdict}")
+    print(f"{'endpoint':24} {'count':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'4xx':>6} {'errors':>7}")
+    for label, row in summary.items():
+        print(f"{label:24} {row['count']:>7} {row['throughput']:>8.1f} {row['p50'] * 1000:>8.1f} "
+              f"{row['p95'] * 1000:>8.1f} {row['p99'] * 1000:>8.1f} {row['rejected']:>6} {row['errors']:>7}")
+        for kind, n in row.get("error_kinds", {}).items():
+            print(f"{'':24}   {n} x {kind}")
+
+async def search(workload, mix, args):
+    """Multiplies the rate by --step-factor until a step fails, then bisects between the last good and first bad."""
+    results = []
+    async def measure(rate):
+        step = await run_step(workload, mix, rate, args.duration)
+        summary = step.summary()
+        ok = passes(summary, rate, args)
+        print_step(step, summary, ok)
+        results.append((rate, ok, summary))
+        return ok
+
+    good, bad, rate = None, None, args.rate
+    while bad is None and rate <= args.max_rate:
+        if await measure(rate):
+            good, rate = rate, rate * args.step_factor
+        else:
+            bad = rate
+    for _ in range(args.bisect if good is not None and bad is not None else 0):
+        rate = (good + bad) / 2
+        if await measure(rate):
+            good = rate
+        else:
+            bad = rate
+    if bad is None:
+        print(f"\nNo saturation up to {args.max_rate:.1f} scenarios/s")
+    elif good is None:
+        print(f"\nSaturated already at {bad:.1f} scenarios/s")
+    else:
+        print(f"\nSaturation point: between {good:.1f} and {bad:.1f} scenarios/s "
+              f"(p95 <= {args.slo_p95:.0f} ms, errors <= {args.max_error_rate:.1%}, throughput >= {args.min_throughput:.0%} of target)")
+    return results
+
+# --- Entry point ---
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown scenario '{name}'")
+        mix[name] = float(weight or 1)
+    return mix
+
+def start_uvicorn(app, port: int):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+async def main_async(args):
+    mix = args.mix or DEFAULT_MIX
+    server = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        if not os.getenv("DATABASE_URL"):
+            os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/loadtest.db"
+        # Imported here so the throwaway DATABASE_URL is in place first
+        from backend import ai_service
+        from backend.main import app
+        ai_service.TRANSPORT = FakeOllama(args.ai_tokens, args.ai_token_delay)
+        if args.uvicorn:
+            server, _ = start_uvicorn(app, args.port)
+            client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout,
+                                       limits=httpx.Limits(max_connections=MAX_IN_FLIGHT))
+        else:
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://loadtest", timeout=args.timeout)
+    workload = Workload(client, lambda *a: None, args.timeout)
+    try:
+        await seed(client, workload, args.projects, args.requirements)
+        print(f"Seeded {len(workload.projects)} projects, {sum(map(len, workload.requirements.values()))} requirements")
+        if args.search:
+            results = await search(workload, mix, args)
+        else:
+            step = await run_step(workload, mix, args.rate, args.duration)
+            summary = step.summary()
+            print_step(step, summary)
+            results = [(args.rate, None, summary)]
+        if args.json:
+            with open(args.json, "w") as out:
+                json.dump([{"rate": r, "ok": ok, "endpoints": s} for r, ok, s in results], out, indent=2)
+    finally:
+        await workload.drain(args.timeout)
+        await client.aclose()
+        if server:
+            server.should_exit = True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive the ReqTool API with a mixed workload")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="Running server to test instead of the in-process app")
+    target.add_argument("--uvicorn", action="store_true", help="Serve the app from a local uvicorn")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--mix", type=parse_mix, default=None, help="e.g. sidebar=6,detail=3,update=1")
+    parser.add_argument("--rate", type=float, default=20.0, help="Target scenario arrivals per second (start rate with --search)")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per step")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout in seconds")
+    parser.add_argument("--projects", type=int, default=3)
+    parser.add_argument("--requirements", type=int, default=200, help="Requirements per project to seed")
+    parser.add_argument("--ai-tokens", type=int, default=20)
+    parser.add_argument("--ai-token-delay", type=float, default=0.02)
+    parser.add_argument("--search", action="store_true", help="Find the saturation point")
+    parser.add_argument("--step-factor", type=float, default=1.5)
+    parser.add_argument("--bisect", type=int, default=3, help="Bisection steps after the first failing rate")
+    parser.add_argument("--max-rate", type=float, default=5000.0)
+    parser.add_argument("--slo-p95", type=float, default=500.0, help="p95 latency budget in ms")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--min-throughput", type=float, default=0.9, help="Achieved/target rate a step must reach")
+    parser.add_argument("--json", help="Also write per-step results to this file")
+    args = parser.parse_args(argv)
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+Rebuilds the per-project metric counters from the requirements and traces tables.
+With DATABASE_SHARDING=1 every shard is rebuilt (or just the project's).
+
+Usage: python -m backend.scripts.recompute_metrics [--project ID]
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from backend import database, metrics, migrations
+
+def recompute(project_id: int = None) -> int:
+    migrations.upgrade(database.engine)
+    if database.SHARDING:
+        keys = [project_id] if project_id is not None else migrations.shard_keys()
+        engines = [database.shard_engine(key) for key in keys]
+    else:
+        engines = [database.engine]
+    rows = 0
+    for engine in engines:
+        with engine.begin() as conn:
+            rows += metrics.recompute(conn, project_id)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute project traceability metrics")
+    parser.add_argument("--project", type=int, default=None, help="Only rebuild this project")
+    args = parser.parse_args()
+    print(f"Recomputed {recompute(args.project)} counters")
+
+if __name__ == "__main__":
+    main()
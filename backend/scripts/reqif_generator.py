@@ -1,17 +1,31 @@
 import uuid
 import datetime
 from xml.etree.ElementTree import Element, SubElement, tostring
-from sqlalchemy.orm import Session, joinedload
-from .. import models
+from sqlalchemy.orm import Session, selectinload
+from .. import models, sharding
 
 NS = "http://www.omg.org/spec/ReqIF/20110401/reqif.xsd"
 XSI = "http://www.w3.org/2001/XMLSchema-instance"
 REQIF_SCHEMA_LOC = "http://www.omg.org/spec/ReqIF/20110401/reqif.xsd reqif.xsd"
 
-def generate_reqif(db: Session):
-    # Fetch all requirements eager loading projects
-    reqs = db.query(models.Requirement).options(joinedload(models.Requirement.project)).all()
-    
+def generate_reqif(db: Session, scope=None, shard_keys=None):
+    """`scope` is a SELECT of requirement IDs (graph.scope_ids); None exports everything."""
+    def load(session):
+        reqs = session.query(models.Requirement).options(selectinload(models.Requirement.project))
+        traces = session.query(models.Trace)
+        if scope is None:
+            return reqs.all(), traces.all()
+        reqs = reqs.filter(models.Requirement.id.in_(scope)).all()
+        # Links leaving the scope are dropped: ReqIF relations need both ends
+        ids = {r.id for r in reqs}
+        return reqs, [t for t in traces.filter(models.Trace.source_id.in_(scope)) if t.target_id in ids]
+
+    # From every shard in sharded mode
+    parts = sharding.fan_out(db, load, shard_keys)
+    return render_reqif([r for reqs, _ in parts for r in reqs], [t for _, traces in parts for t in traces])
+
+def render_reqif(reqs, traces, title: str = "Exported Requirements"):
+    """Renders requirements and traces (anything with source_id/target_id) as ReqIF XML."""
     # Generate UUIDs for standard types
     dt_string_id = f"_{uuid.uuid4()}"
     spec_object_type_id = f"_{uuid.uuid4()}" 
@@ -43,7 +57,7 @@ def generate_reqif(db: Session):
     SubElement(header, "REQ-IF-TOOL-ID").text = "ReqTool"
     SubElement(header, "REQ-IF-VERSION").text = "1.0"
     SubElement(header, "SOURCE-TOOL-ID").text = "ReqTool"
-    SubElement(header, "TITLE").text = "Exported Requirements"
+    SubElement(header, "TITLE").text = title
     
     # CORE CONTENT
     core_content = SubElement(root, "CORE-CONTENT")
@@ -197,7 +211,6 @@ def generate_reqif(db: Session):
             add_hierarchy(children_container, root_req)
 
     # 5. SPEC-RELATIONS (Traces)
-    traces = db.query(models.Trace).all()
     if traces:
         spec_relations_container = SubElement(req_if_content, "SPEC-RELATIONS")
         for t in traces:
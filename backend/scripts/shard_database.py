@@ -0,0 +1,41 @@
+"""
+Moves an existing single-file database into per-project shards, for switching
+on DATABASE_SHARDING=1. Stop the server first; settings come from the same
+environment variables (DATABASE_URL, DATABASE_SHARD_DIR).
+
+Usage:
+  DATABASE_SHARDING=1 python -m backend.scripts.shard_database
+  DATABASE_SHARDING=1 python -m backend.scripts.shard_database --rebuild-directory
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from backend import database, migrations, sharding
+
+def main():
+    parser = argparse.ArgumentParser(description="Split the ReqTool database into per-project shards")
+    parser.add_argument("--rebuild-directory", action="store_true",
+                        help="Only recreate the requirement directory from the shards, e.g. after a crash")
+    args = parser.parse_args()
+    if not database.SHARDING:
+        sys.exit("Error: set DATABASE_SHARDING=1")
+
+    migrations.upgrade(database.engine)
+    started = time.perf_counter()
+    if args.rebuild_directory:
+        sharding.rebuild_directory()
+        print(f"Rebuilt the shard directory in {time.perf_counter() - started:.1f}s")
+        return
+    try:
+        counts = sharding.split_database()
+    except RuntimeError as e:
+        sys.exit(f"Error: {e}")
+    print("Moved " + ", ".join(f"{n} {t}" for t, n in counts.items() if n)
+          + f" in {time.perf_counter() - started:.1f}s; VACUUM the main database to reclaim space")
+
+if __name__ == "__main__":
+    main()
@@ -47,7 +47,7 @@ def test_asciidoc_traceability():
         
         # Basic validation
         assert "== Traceability Diagram" in output
-        assert "[plantuml, traceability_diag, svg]" in output
+        assert "[plantuml, traceability_diag_1, svg]" in output
         assert "rectangle \"TP-001\\nReq 1\" as TP_001 <<Draft>>" in output
         assert "TP_001 --> TP_002" in output
         assert "== Traceability Matrix" in output
@@ -60,5 +60,32 @@ def test_asciidoc_traceability():
     finally:
         db.close()
 
+def test_asciidoc_partitions():
+    db = SessionLocal()
+    try:
+        project = models.Project(id=2, name="Big Project", prefix="BP-", next_number=13)
+        db.add(project)
+        # A chain BP-001 -> ... -> BP-008 and four isolated requirements
+        db.add_all([models.Requirement(id=f"BP-{i:03d}", title=f"Big {i}", project_id=2) for i in range(1, 13)])
+        db.add_all([models.Trace(source_id=f"BP-{i:03d}", target_id=f"BP-{i + 1:03d}") for i in range(1, 8)])
+        db.commit()
+
+        output = generate_asciidoc(db, diagram_node_budget=5)
+
+        assert "[plantuml, traceability_diag_1, svg]" in output
+        assert "[plantuml, traceability_diag_4, svg]" in output
+        assert "[plantuml, traceability_diag_5, svg]" not in output
+        for block in output.split("[plantuml, ")[1:]:
+            assert block.count(" <<Draft>>") <= 5
+        # The chain is cut between BP-005 and BP-006; both halves point at each other
+        assert "BP_005 ..> ref_BP_006" in output
+        assert 'rectangle "BP-006\\n(see Diagram ' in output
+        assert "ref_BP_005 ..> BP_006" in output
+
+        print("Partition Verification Successful!")
+    finally:
+        db.close()
+
 if __name__ == "__main__":
     test_asciidoc_traceability()
+    test_asciidoc_partitions()
@@ -0,0 +1,257 @@
+"""
+Per-project SQLite shards.
+
+With DATABASE_SHARDING=1 the database at DATABASE_URL only holds the catalog:
+projects, batch job bookkeeping, baseline records and `requirement_shards`, a
+directory from requirement ID to project. Everything else lives in
+`<DATABASE_SHARD_DIR>/project_<id>.db` (or `unassigned.db`), so writes to
+different projects take different SQLite locks and proceed in parallel.
+
+Endpoints route their session with `route` / `route_requirement` before
+touching requirement data. Cross-project reads use `fan_out`, which runs a
+function against every shard in parallel and returns the per-shard results
+for the caller to merge. Traces and hierarchy links stay within one project.
+Outside sharded mode all helpers are no-ops.
+
+A session commits the catalog and the shard one after the other, so a commit
+can reach only one of them. The directory entries a session touches are
+remembered, and if its commit fails they are reconciled against the shards.
+A crash between the two commits can leave entries stale until
+`rebuild_directory` runs (``scripts/shard_database.py --rebuild-directory``).
+An existing unsharded database is split into shards by `split_database`
+(``scripts/shard_database.py``); the app refuses to start in sharded mode
+while the main database still holds requirements.
+"""
+import heapq
+import os
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import event, delete, select, func, text
+from sqlalchemy.orm import Session
+from . import database, models
+
+FANOUT_WORKERS = int(os.getenv("SHARD_FANOUT_WORKERS", "8"))
+
+def route(db: Session, project_id):
+    """Points the session's non-catalog tables at the project's shard."""
+    if not database.SHARDING:
+        return
+    if "shard" in db.info and db.info["shard"] != project_id:
+        raise RuntimeError(f"Session already routed to project {db.info['shard']}, not {project_id}")
+    db.info["shard"] = project_id
+
+def locate(db: Session, req_id: str):
+    """(found, project_id) for a requirement, from the catalog directory."""
+    row = db.execute(
+        select(models.RequirementShard.project_id).where(models.RequirementShard.req_id == req_id)
+    ).first()
+    return (row is not None, row[0] if row else None)
+
+def route_requirement(db: Session, req_id: str) -> bool:
+    """Routes to the shard holding req_id. False if no shard has it (sharded mode only)."""
+    if not database.SHARDING:
+        return True
+    found, project_id = locate(db, req_id)
+    if found:
+        route(db, project_id)
+    return found
+
+def requirement_exists(db: Session, req_id: str) -> bool:
+    """Whether the ID is taken in any project; IDs stay globally unique across shards."""
+    if database.SHARDING:
+        return locate(db, req_id)[0]
+    return db.query(models.Requirement.id).filter(models.Requirement.id == req_id).first() is not None
+
+def shard_keys(db: Session):
+    return [None] + [p for (p,) in db.query(models.Project.id).order_by(models.Project.id)]
+
+def shards_of(db: Session, req_ids):
+    """Project IDs (shard keys) holding the given requirements, from the catalog directory."""
+    return set(db.execute(
+        select(models.RequirementShard.project_id).where(models.RequirementShard.req_id.in_(list(req_ids))).distinct()
+    ).scalars())
+
+def _run_on_shard(project_id, fn):
+    db = database.SessionLocal()
+    try:
+        route(db, project_id)
+        return fn(db)
+    finally:
+        db.close()
+
+def fan_out(db: Session, fn, keys=None):
+    """
+    Runs fn(session) once per shard (or per shard in `keys`), or once on `db`
+    outside sharded mode, and returns the list of results. Returned ORM objects
+    are detached, so fn must load whatever relationships the caller needs.
+    """
+    if not database.SHARDING:
+        return [fn(db)]
+    keys = shard_keys(db) if keys is None else list(keys)
+    if not keys:
+        return []
+    with ThreadPoolExecutor(max_workers=min(FANOUT_WORKERS, len(keys))) as pool:
+        return list(pool.map(lambda key: _run_on_shard(key, fn), keys))
+
+def merge_page(parts, skip: int, limit: int, key, reverse: bool = False):
+    """Cuts one page from per-shard results that are each sorted by `key`."""
+    return list(islice(heapq.merge(*parts, key=key, reverse=reverse), skip, skip + limit))
+
+def rebuild_directory():
+    """Recreates `requirement_shards` from the shard contents, e.g. after restoring a shard file."""
+    db = database.SessionLocal()
+    try:
+        db.execute(delete(models.RequirementShard))
+        for project_id in shard_keys(db):
+            ids = _run_on_shard(project_id, lambda s: [r for (r,) in s.query(models.Requirement.id)])
+            if ids:
+                db.execute(models.RequirementShard.__table__.insert(),
+                           [{"req_id": r, "project_id": project_id} for r in ids])
+        db.commit()
+    finally:
+        db.close()
+
+def remove_from_directory(db: Session, projects: dict):
+    """Drops the entries of requirements deleted through Core, given as {req_id: project_id}."""
+    db.info.setdefault("directory", {}).update(projects)
+    db.execute(delete(models.RequirementShard).where(models.RequirementShard.req_id.in_(list(projects))))
+
+def reconcile(projects: dict):
+    """Makes the entries of the given requirements ({req_id: project_id}) match what their shards hold."""
+    by_shard = {}
+    for req_id, project_id in projects.items():
+        by_shard.setdefault(project_id, []).append(req_id)
+    db = database.SessionLocal()
+    try:
+        for project_id, ids in by_shard.items():
+            present = _run_on_shard(project_id, lambda s: [
+                r for (r,) in s.query(models.Requirement.id).filter(models.Requirement.id.in_(ids))])
+            db.execute(delete(models.RequirementShard).where(models.RequirementShard.req_id.in_(ids)))
+            if present:
+                db.execute(models.RequirementShard.__table__.insert(),
+                           [{"req_id": r, "project_id": project_id} for r in present])
+        db.commit()
+    finally:
+        db.close()
+
+@event.listens_for(Session, "before_flush")
+def _maintain_directory(session, flush_context, instances):
+    if not database.SHARDING:
+        return
+    touched = session.info.setdefault("directory", {})
+    for obj in session.new:
+        if isinstance(obj, models.Requirement):
+            session.add(models.RequirementShard(req_id=obj.id, project_id=obj.project_id))
+            touched[obj.id] = obj.project_id
+    deleted = {obj.id: obj.project_id for obj in session.deleted if isinstance(obj, models.Requirement)}
+    if deleted:
+        session.execute(delete(models.RequirementShard).where(models.RequirementShard.req_id.in_(list(deleted))))
+        touched.update(deleted)
+
+@event.listens_for(Session, "before_commit")
+def _commit_started(session):
+    session.info["committing"] = True
+
+@event.listens_for(Session, "after_commit")
+def _commit_finished(session):
+    session.info.pop("directory", None)
+    session.info.pop("committing", None)
+
+@event.listens_for(Session, "after_transaction_end")
+def _commit_failed(session, transaction):
+    if transaction.parent is not None:
+        return
+    touched = session.info.pop("directory", None)
+    # Only a failed commit gets here with entries left; a plain rollback undid both sides
+    if touched and session.info.pop("committing", None):
+        try:
+            reconcile(touched)
+        except Exception as e:
+            print(f"Shard directory may be stale for {len(touched)} requirement(s), rebuild it: {e}")
+    session.info.pop("committing", None)
+
+# --- Moving an unsharded database into shards ---
+
+# Tables that stay in the main database: the catalog, and the audit archive index,
+# whose segments are read from "main" in either mode (audit_archive.py)
+KEPT_IN_MAIN = database.CATALOG_TABLES | {"audit_segments", "change_counter"}
+
+def _owner(table) -> str:
+    """SQL for the project owning a row of `table` (alias t), given the split_owner map."""
+    of = "(SELECT project_id FROM split_owner WHERE req_id = t.{})".format
+    if table.name == "traces":
+        return of("source_id")
+    if table.name == "tombstones":
+        return f"COALESCE(t.project_id, {of('source_id')})" # Trace tombstones carry no project
+    if "project_id" in table.c:
+        return "t.project_id"
+    return of("req_id")
+
+def _split_filter(table) -> str:
+    if table.name == "baseline_manifests":
+        # Content-addressed, so a manifest goes to every project with a baseline using it
+        return "t.hash IN (SELECT manifest_hash FROM baselines WHERE project_id IS :key)"
+    # Rows of projects that no longer exist go to the unassigned shard
+    return f"({_owner(table)} IS :key OR (:key IS NULL AND {_owner(table)} NOT IN (SELECT id FROM projects)))"
+
+def split_database() -> dict:
+    """
+    Moves the requirement data of an unsharded main database into per-project shard
+    files; run with DATABASE_SHARDING=1 and the server stopped. Each shard is filled
+    in its own transaction and the main database is cleared last, so a failure
+    empties the shards filled so far and leaves the main database as it was.
+    Returns the number of rows moved per table.
+    """
+    if not database.SHARDING:
+        raise RuntimeError("Set DATABASE_SHARDING=1 to split the database into shards")
+    tables = [t for t in models.Base.metadata.sorted_tables if t.name not in KEPT_IN_MAIN]
+    db = database.SessionLocal()
+    try:
+        keys = shard_keys(db)
+        if db.execute(select(func.count()).select_from(models.RequirementShard)).scalar():
+            raise RuntimeError("The database is already sharded")
+    finally:
+        db.close()
+
+    counts = {t.name: 0 for t in tables}
+    filled = []
+    with database.engine.connect() as conn:
+        conn.exec_driver_sql("CREATE TEMP TABLE split_owner (req_id VARCHAR PRIMARY KEY, project_id INTEGER)")
+        # Deleted requirements first, so a live requirement with a reused ID wins
+        conn.exec_driver_sql("INSERT OR REPLACE INTO split_owner SELECT entity_id, project_id FROM tombstones "
+                             "WHERE entity = 'requirement' ORDER BY seq")
+        conn.exec_driver_sql("INSERT OR REPLACE INTO split_owner SELECT id, project_id FROM requirements")
+        conn.commit()
+        try:
+            for key in keys:
+                path = database.shard_engine(key).url.database
+                conn.exec_driver_sql("ATTACH DATABASE ? AS shard", (path,))
+                try:
+                    if conn.exec_driver_sql("SELECT 1 FROM shard.requirements LIMIT 1").first():
+                        raise RuntimeError(f"Shard {database.shard_name(key)} already holds requirements")
+                    filled.append(key)
+                    for table in tables:
+                        columns = ", ".join(table.c.keys())
+                        counts[table.name] += conn.execute(text(
+                            f"INSERT INTO shard.{table.name} ({columns}) "
+                            f"SELECT {', '.join('t.' + c for c in table.c.keys())} FROM main.{table.name} AS t "
+                            f"WHERE {_split_filter(table)}"
+                        ), {"key": key}).rowcount
+                    conn.exec_driver_sql("INSERT OR REPLACE INTO shard.change_counter SELECT * FROM main.change_counter")
+                    conn.commit()
+                finally:
+                    conn.rollback()
+                    conn.exec_driver_sql("DETACH DATABASE shard")
+
+            conn.exec_driver_sql("INSERT INTO requirement_shards (req_id, project_id) SELECT id, project_id FROM requirements")
+            for table in reversed(tables):
+                conn.execute(delete(table))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            for key in filled:
+                with database.shard_engine(key).begin() as shard:
+                    for table in reversed(tables):
+                        shard.execute(delete(table))
+            raise
+    return counts
@@ -0,0 +1,86 @@
+"""
+Suspect links: trace links whose upstream end changed since they were last reviewed.
+
+A trace source -> target means the source traces to (depends on) the target, so
+when a requirement's title or description changes, the links pointing *at* it
+become suspect; with SUSPECT_DEPTH > 1 so do the links pointing at their
+sources, and so on. Marking is one UPDATE over a recursive CTE that walks the
+target_id index outward from the changed requirement, on the caller's
+transaction, so only the edges within reach are read or written no matter how
+large the trace table is. A link that is already suspect keeps the reason and
+timestamp it was first flagged with until someone clears it.
+
+Open suspects are covered by a partial index (``WHERE suspect = 1``), so
+listing and clearing them never reads the reviewed links. The flag is review
+state rather than trace content, so these Core writes leave change_seq alone:
+sync clients and the read model only carry the link endpoints.
+"""
+import os
+from datetime import datetime
+from sqlalchemy import select, update, insert, literal, literal_column, true, false, tuple_
+from . import models
+
+SUSPECT_DEPTH = int(os.getenv("SUSPECT_DEPTH", "1")) # Trace hops marked per change; 0 disables marking
+
+# Spelled as in the partial index so SQLite can use it
+OPEN = models.Trace.__table__.c.suspect == true()
+
+def dependents_cte(req_id: str, depth: int, name: str = "dependents"):
+    """Recursive CTE yielding the `rowid` of every link within `depth` hops downstream of req_id."""
+    trace = models.Trace.__table__
+    rowid = literal_column("traces.rowid")
+    edges = select(rowid.label("rowid"), trace.c.source_id, literal(1).label("depth")) \
+        .where(trace.c.target_id == req_id).cte(name, recursive=True)
+    return edges.union(
+        select(rowid, trace.c.source_id, edges.c.depth + 1)
+        .where(trace.c.target_id == edges.c.source_id, edges.c.depth < depth)
+    )
+
+def mark(conn, req_id: str, reason: str, depth: int = None, now: datetime = None) -> int:
+    """Flags the links downstream of req_id that are not suspect yet. Returns how many."""
+    depth = SUSPECT_DEPTH if depth is None else depth
+    if depth < 1:
+        return 0
+    trace = models.Trace.__table__
+    edges = dependents_cte(req_id, depth)
+    # Counted through RETURNING: the driver reports no rowcount for statements starting with WITH
+    return len(conn.execute(
+        update(trace)
+        .where(literal_column("traces.rowid").in_(select(edges.c.rowid)), trace.c.suspect == false())
+        .values(suspect=True, suspect_reason=reason, suspect_since=now or datetime.utcnow())
+        .returning(trace.c.source_id)
+    ).all())
+
+def scope_filter(project_id: int = None, target_id: str = None, links=None):
+    """WHERE clause for the links of a project (by source), the links pointing at target_id, or explicit links."""
+    trace, req = models.Trace.__table__, models.Requirement.__table__
+    if project_id is not None:
+        return trace.c.source_id.in_(select(req.c.id).where(req.c.project_id == project_id))
+    if target_id is not None:
+        return trace.c.target_id == target_id
+    return tuple_(trace.c.source_id, trace.c.target_id).in_([(l.source_id, l.target_id) for l in links])
+
+def open_links(conn, scopes=(), skip: int = 0, limit: int = None):
+    """Open suspects matching every clause in `scopes`, in (source_id, target_id) order."""
+    trace = models.Trace.__table__
+    query = select(trace.c.source_id, trace.c.target_id, trace.c.suspect_reason, trace.c.suspect_since) \
+        .where(OPEN, *scopes) \
+        .order_by(trace.c.source_id, trace.c.target_id).offset(skip).limit(limit)
+    return [dict(r._mapping) for r in conn.execute(query)]
+
+def clear(conn, scope, now: datetime = None, author: str = "System") -> list:
+    """Marks the suspect links in scope as reviewed, with one audit row per link. Returns them."""
+    trace = models.Trace.__table__
+    now = now or datetime.utcnow()
+    cleared = conn.execute(
+        update(trace).where(OPEN, scope)
+        .values(suspect=False, suspect_reason=None, suspect_since=None)
+        .returning(trace.c.source_id, trace.c.target_id)
+    ).all()
+    cleared.sort()
+    if cleared:
+        conn.execute(insert(models.AuditLog), [
+            {"req_id": s, "timestamp": now, "author": author, "action": "REVIEW", "details": f"Reviewed suspect link to {t}"}
+            for s, t in cleared
+        ])
+    return [{"source_id": s, "target_id": t} for s, t in cleared]
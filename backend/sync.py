@@ -0,0 +1,75 @@
+"""
+Change sequencing for incremental client sync.
+
+Every insert/update of a Project, Requirement or Trace is stamped with a value
+from a single monotonically increasing counter (``change_counter``), and every
+delete leaves a Tombstone carrying its own sequence number. A client that
+remembers the highest sequence it has seen can ask for everything newer.
+
+SQLite only allows one writer at a time and the counter row stays locked until
+commit, so sequence numbers become visible in increasing order.
+"""
+from sqlalchemy import event, update, insert, select, func, bindparam
+from sqlalchemy.orm import Session
+from . import models
+
+SYNCED_MODELS = (models.Project, models.Requirement, models.Trace)
+
+def reserve_seq(conn, count: int = 1) -> int:
+    """Reserves `count` consecutive sequence numbers and returns the first one."""
+    new_value = conn.execute(
+        update(models.ChangeCounter)
+        .where(models.ChangeCounter.id == 1)
+        .values(value=models.ChangeCounter.value + count)
+        .returning(models.ChangeCounter.value)
+    ).scalar()
+    if new_value is None:
+        conn.execute(insert(models.ChangeCounter).values(id=1, value=count))
+        new_value = count
+    return new_value - count + 1
+
+def current_seq(conn) -> int:
+    value = conn.execute(select(models.ChangeCounter.value).where(models.ChangeCounter.id == 1)).scalar()
+    return value or 0
+
+def tombstone_for(obj, seq: int) -> models.Tombstone:
+    if isinstance(obj, models.Trace):
+        return models.Tombstone(seq=seq, entity="trace", source_id=obj.source_id, target_id=obj.target_id)
+    if isinstance(obj, models.Requirement):
+        return models.Tombstone(seq=seq, entity="requirement", entity_id=obj.id, project_id=obj.project_id)
+    return models.Tombstone(seq=seq, entity="project", entity_id=str(obj.id), project_id=obj.id)
+
+@event.listens_for(Session, "before_flush")
+def _stamp_changes(session, flush_context, instances):
+    changed = [o for o in session.new if isinstance(o, SYNCED_MODELS)]
+    changed += [
+        o for o in session.dirty
+        if isinstance(o, SYNCED_MODELS) and session.is_modified(o, include_collections=False)
+    ]
+    deleted = [o for o in session.deleted if isinstance(o, SYNCED_MODELS)]
+    if not changed and not deleted:
+        return
+
+    seq = reserve_seq(session.connection(), len(changed) + len(deleted))
+    for obj in changed:
+        obj.change_seq = seq
+        seq += 1
+    for obj in deleted:
+        session.add(tombstone_for(obj, seq))
+        seq += 1
+
+def backfill(conn):
+    """Assigns sequence numbers to rows created before change tracking existed."""
+    for model in SYNCED_MODELS:
+        table = model.__table__
+        pending = conn.execute(select(func.count()).select_from(table).where(table.c.change_seq.is_(None))).scalar()
+        if not pending:
+            continue
+        start = reserve_seq(conn, pending)
+        pk_cols = list(table.primary_key.columns)
+        rows = conn.execute(select(*pk_cols).where(table.c.change_seq.is_(None))).all()
+        stmt = update(table).where(*[col == bindparam(f"pk_{col.name}") for col in pk_cols]).values(change_seq=bindparam("seq"))
+        conn.execute(stmt, [
+            {**{f"pk_{col.name}": value for col, value in zip(pk_cols, row)}, "seq": start + offset}
+            for offset, row in enumerate(rows)
+        ])
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import time
+import httpx
+import pytest
+from backend import ai_service, ai_jobs
+from backend.test_sharding import sharded
+
+def fake_ollama(request: httpx.Request):
+    prompt = json.loads(request.content)["prompt"]
+    if "FAIL" in prompt:
+        return httpx.Response(500)
+    lines = [json.dumps({"response": "Generated "}), json.dumps({"response": "text", "done": True})]
+    return httpx.Response(200, content="\n".join(lines))
+
+@pytest.fixture
+def fake_ai(monkeypatch):
+    monkeypatch.setattr(ai_service, "TRANSPORT", httpx.MockTransport(fake_ollama))
+
+def wait_for_job(client, job_id):
+    for _ in range(200):
+        job = client.get(f"/ai-jobs/{job_id}").json()
+        if job["status"] != "running":
+            return job
+        time.sleep(0.02)
+    raise AssertionError("job did not finish")
+
+def test_batch_job_fills_draft_requirements(client, fake_ai):
+    project = client.post("/projects/", json={"name": "Batch", "prefix": "BJ-"}).json()
+    for title in ["The system shall log", "The system shall FAIL", "The system shall warn"]:
+        client.post("/requirements/", json={"id": "x", "title": title, "project_id": project["id"]})
+    client.post("/traces/", json={"source_id": "BJ-3", "target_id": "BJ-1"})
+    client.put("/requirements/BJ-3", json={"status": "Approved"})
+
+    job = client.post("/ai-jobs/", json={"project_id": project["id"], "field": "description"}).json()
+    assert job["total"] == 2
+
+    job = wait_for_job(client, job["id"])
+    assert job["status"] == "completed"
+    assert (job["completed"], job["failed"]) == (1, 1)
+
+    assert client.get("/requirements/BJ-1").json()["description"] == "Generated text"
+    assert client.get("/requirements/BJ-2").json()["description"] is None
+    assert client.get("/requirements/BJ-3").json()["description"] is None
+    assert any("generated" in log["details"] for log in client.get("/audit/requirements/BJ-1").json())
+    # Generated descriptions are reindexed like edits
+    dupes = client.post("/requirements/check-duplicates", json={"title": "The system shall log", "description": "Generated text"}).json()
+    assert [(d["id"], d["similarity"]) for d in dupes] == [("BJ-1", 1.0)]
+    assert [(l["source_id"], l["suspect_reason"]) for l in client.get("/traces/suspect").json()] == [("BJ-3", "BJ-1 changed: description")]
+
+    # Already filled requirements are skipped unless overwrite is requested
+    again = client.post("/ai-jobs/", json={"project_id": project["id"], "field": "description"}).json()
+    assert again["total"] == 1
+
+def test_job_requires_scope(client):
+    assert client.post("/ai-jobs/", json={"field": "rationale"}).status_code == 400
+    assert client.post("/ai-jobs/999/cancel").status_code == 404
+
+def test_jobs_always_end(client, fake_ai, monkeypatch):
+    # Started by hand, so the requirements can change before the runner loads them
+    async def hold(job_id):
+        pass
+    monkeypatch.setattr(ai_jobs, "launch", hold)
+    project = client.post("/projects/", json={"name": "Ends", "prefix": "EN-"}).json()
+    for title in ["The system shall stay", "The system shall go"]:
+        client.post("/requirements/", json={"id": "x", "title": title, "project_id": project["id"]})
+    job = client.post("/ai-jobs/", json={"project_id": project["id"], "field": "rationale"}).json()
+    client.delete("/requirements/EN-2")
+    asyncio.run(ai_jobs._run(job["id"]))
+    job = client.get(f"/ai-jobs/{job['id']}").json()
+    assert (job["status"], job["completed"], job["failed"]) == ("completed", 1, 1)
+
+    def crash(job_id):
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(ai_jobs, "_load_pending", crash)
+    job = client.post("/ai-jobs/", json={"project_id": project["id"], "field": "description"}).json()
+    asyncio.run(ai_jobs._run(job["id"]))
+    job = client.get(f"/ai-jobs/{job['id']}").json()
+    assert (job["status"], job["completed"], job["failed"]) == ("failed", 0, 1)
+
+def test_jobs_on_sharded_storage(client, fake_ai, sharded):
+    project = client.post("/projects/", json={"name": "Sharded", "prefix": "SJ-"}).json()
+    client.post("/requirements/", json={"id": "x", "title": "The system shall log", "project_id": project["id"]})
+    client.post("/requirements/", json={"id": "x", "title": "The logger shall rotate", "project_id": project["id"], "parent_id": "SJ-1"})
+    client.post("/requirements/", json={"id": "x", "title": "The system shall warn", "project_id": project["id"]})
+
+    assert client.post("/ai-jobs/", json={"root_id": "missing", "field": "description"}).status_code == 404
+    job = client.post("/ai-jobs/", json={"root_id": "SJ-1", "field": "description"}).json()
+    assert job["total"] == 2
+    assert wait_for_job(client, job["id"])["completed"] == 2
+    assert client.get("/requirements/SJ-2").json()["description"] == "Generated text"
+    assert client.get("/requirements/SJ-3").json()["description"] is None
+
+    job = client.post("/ai-jobs/", json={"project_id": project["id"], "field": "rationale"}).json()
+    assert wait_for_job(client, job["id"])["completed"] == 3
+    assert client.post(f"/ai-jobs/{job['id']}/cancel").json()["status"] == "completed"
@@ -0,0 +1,54 @@
+import asyncio
+import json
+import httpx
+import pytest
+from backend import ai_service
+
+def fake_ollama(request: httpx.Request):
+    prompt = json.loads(request.content)["prompt"]
+    if "broken" in prompt:
+        return httpx.Response(500, text="model crashed")
+    lines = [json.dumps({"response": "Hello "}), json.dumps({"response": "world", "done": True})]
+    return httpx.Response(200, content="\n".join(lines))
+
+@pytest.fixture
+def fake_ai(monkeypatch):
+    monkeypatch.setattr(ai_service, "TRANSPORT", httpx.MockTransport(fake_ollama))
+
+def test_generation_streams_structured_events(client, fake_ai):
+    response = client.post("/requirements/generate-description", json={"title": "The system shall greet"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events == [
+        {"type": "token", "text": "Hello "},
+        {"type": "token", "text": "world"},
+        {"type": "done"},
+    ]
+
+def test_upstream_failure_is_an_http_error(client, fake_ai):
+    response = client.post("/requirements/generate-description", json={"title": "broken"})
+    assert response.status_code == 502
+    assert "model crashed" in response.json()["detail"]
+
+def test_disconnect_aborts_upstream_generation(monkeypatch):
+    monkeypatch.setattr(ai_service, "DISCONNECT_POLL_INTERVAL", 0.01)
+    closed = []
+
+    async def slow_tokens():
+        try:
+            yield "first"
+            await asyncio.sleep(10)
+            yield "never"
+        finally:
+            closed.append(True)
+
+    async def is_disconnected():
+        return True
+
+    async def run():
+        return [e async for e in ai_service.stream_events(slow_tokens(), is_disconnected)]
+
+    events = asyncio.run(asyncio.wait_for(run(), 2))
+    assert [json.loads(e)["type"] for e in events] == ["token"]
+    assert closed == [True]
@@ -0,0 +1,107 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import update, select, func
+from backend import audit_archive, backup, database, models
+
+def _all(client, **params):
+    return client.get("/audit/", params={"limit": 1000, **params}).json()
+
+def _without_ids(rows):
+    return [{k: v for k, v in row.items() if k != "id"} for row in rows]
+
+def test_compaction_keeps_every_query_answer(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(audit_archive, "AUDIT_ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(audit_archive, "AUDIT_SEGMENT_ROWS", 4)
+    first = client.post("/projects/", json={"name": "Archive", "prefix": "AR-"}).json()["id"]
+    second = client.post("/projects/", json={"name": "Other", "prefix": "OT-"}).json()["id"]
+    for title in ("Alpha", "Beta", "Gamma"):
+        client.post("/requirements/", json={"id": "", "title": title, "project_id": first})
+    client.post("/requirements/", json={"id": "", "title": "Elsewhere", "project_id": second})
+    client.post("/traces/", json={"source_id": "AR-2", "target_id": "AR-1"})
+    client.put("/requirements/AR-3", json={"title": "Gamma, revised"})
+    client.delete("/requirements/AR-3")
+
+    # Spread the events over the last months so some fall outside the hot window
+    now = datetime.utcnow()
+    with database.engine.begin() as conn:
+        ids = conn.execute(select(models.AuditLog.id).order_by(models.AuditLog.id)).scalars().all()
+        for n, audit_id in enumerate(ids):
+            conn.execute(update(models.AuditLog).where(models.AuditLog.id == audit_id)
+                         .values(timestamp=now - timedelta(days=200 - 20 * n)))
+    old = sum(1 for n in range(len(ids)) if 200 - 20 * n > audit_archive.AUDIT_HOT_DAYS)
+
+    queries = [{}, {"action": ["LINK", "DELETE"]}, {"project_id": first}, {"project_id": second},
+               {"since": (now - timedelta(days=150)).isoformat(), "until": (now - timedelta(days=50)).isoformat()},
+               {"skip": 2, "limit": 3}]
+    before = [client.get("/audit/", params=q).json() for q in queries]
+    history_before = client.get("/audit/requirements/AR-3").json()
+    assert [e["action"] for e in history_before] == ["DELETE", "UPDATE", "CREATE"]
+
+    result = client.post("/admin/audit/compact").json()
+    assert result["archived"] == old and result["segments"] >= 2
+    with database.engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(models.AuditLog)).scalar() == len(ids) - old
+        segments = conn.execute(select(models.AuditSegment)).all()
+    assert all(os.path.exists(os.path.join(audit_archive.AUDIT_ARCHIVE_DIR, s.path)) for s in segments)
+    assert all(s.first_at.strftime("%Y-%m") == s.period == s.last_at.strftime("%Y-%m") for s in segments)
+
+    audit_archive._read.cache_clear()
+    assert [client.get("/audit/", params=q).json() for q in queries] == before
+    # Deleted requirements keep their project and their history
+    assert client.get("/audit/requirements/AR-3").json() == history_before
+    assert client.post("/admin/audit/compact").json()["archived"] == 0
+
+def test_restore_drops_rows_the_archive_holds(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(audit_archive, "AUDIT_ARCHIVE_DIR", str(tmp_path / "archive"))
+    project_id = client.post("/projects/", json={"name": "Restore", "prefix": "RS-"}).json()["id"]
+    for title in ("One", "Two"):
+        client.post("/requirements/", json={"id": "", "title": title, "project_id": project_id})
+    then = datetime.utcnow() - timedelta(days=365)
+    with database.engine.begin() as conn:
+        conn.execute(update(models.AuditLog).values(timestamp=then))
+    expected = _without_ids(_all(client))
+
+    dump = backup.write_dump(str(tmp_path / "before.ndjson.gz"))["path"]
+    # RS-2's event stays hot, so the dump's copy at the archived timestamp was never archived
+    with database.engine.begin() as conn:
+        conn.execute(update(models.AuditLog).where(models.AuditLog.req_id == "RS-2")
+                     .values(timestamp=datetime.utcnow()))
+    assert client.post("/admin/audit/compact").json()["archived"] == 1
+    backup.restore_dump(dump)
+    assert _without_ids(_all(client)) == expected
+
+def test_backups_include_the_archive(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(audit_archive, "AUDIT_ARCHIVE_DIR", None)
+    assert audit_archive.archive_dir() == os.path.join(os.path.dirname(os.path.abspath(database.engine.url.database)), "audit-archive")
+    monkeypatch.setattr(audit_archive, "AUDIT_ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(backup, "BACKUP_DIR", str(tmp_path / "backups"))
+    project_id = client.post("/projects/", json={"name": "Kept", "prefix": "KA-"}).json()["id"]
+    for title in ("One", "Two"):
+        client.post("/requirements/", json={"id": "", "title": title, "project_id": project_id})
+    client.delete("/requirements/KA-2")
+    with database.engine.begin() as conn:
+        conn.execute(update(models.AuditLog).where(models.AuditLog.req_id == "KA-2")
+                     .values(timestamp=datetime.utcnow() - timedelta(days=365)))
+    expected = _without_ids(_all(client))
+    assert client.post("/admin/audit/compact").json()["archived"] == 2
+
+    snapshot = backup.take_snapshot()["name"]
+    with database.engine.connect() as conn:
+        paths = conn.execute(select(models.AuditSegment.path)).scalars().all()
+    assert paths and all(os.path.exists(tmp_path / "backups" / snapshot / "audit-archive" / p) for p in paths)
+
+    dump = backup.write_dump(str(tmp_path / "dump.ndjson.gz"))
+    assert dump["counts"]["audit_logs"] == len(expected)
+    # Restoring on a machine without the archive brings the events back
+    monkeypatch.setattr(audit_archive, "AUDIT_ARCHIVE_DIR", str(tmp_path / "elsewhere"))
+    with database.engine.begin() as conn:
+        conn.execute(models.AuditSegment.__table__.delete())
+    backup.restore_dump(dump["path"])
+    assert _without_ids(_all(client)) == expected
+    assert _without_ids(_all(client, project_id=project_id)) == expected
+
+def test_bloom_filter_has_no_false_negatives():
+    keys = [f"REQ-{n}" for n in range(2000)]
+    bits = audit_archive.bloom(keys)
+    assert all(audit_archive.might_contain(bits, k) for k in keys)
+    assert sum(audit_archive.might_contain(bits, f"OTHER-{n}") for n in range(2000)) < 100
@@ -0,0 +1,89 @@
+import gzip
+import json
+import os
+import sqlite3
+from datetime import datetime
+from backend import backup, database
+
+def test_snapshot_dump_and_restore(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, "BACKUP_DIR", str(tmp_path))
+    monkeypatch.setattr(backup, "PAGES_PER_STEP", 1) # Exercise the stepped copy
+    project_id = client.post("/projects/", json={"name": "Backup", "prefix": "BK-"}).json()["id"]
+    client.post("/requirements/", json={"id": "", "title": "Root", "project_id": project_id})
+    client.post("/requirements/", json={"id": "", "title": "Child", "project_id": project_id, "parent_id": "BK-1"})
+    client.post("/traces/", json={"source_id": "BK-2", "target_id": "BK-1"})
+    client.put("/requirements/BK-2", json={"description": "Reworded"})
+    baseline = client.post("/baselines/", json={"project_id": project_id, "name": "v1"}).json()
+
+    names = [client.post("/admin/backups", params={"rotate": False}).json()["name"] for _ in range(3)]
+    db_file = os.path.basename(database.engine.url.database)
+    copy = sqlite3.connect(os.path.join(tmp_path, names[0], db_file))
+    assert copy.execute("SELECT id FROM requirements ORDER BY id").fetchall() == [("BK-1",), ("BK-2",)]
+    copy.close()
+    assert backup.rotate(keep=2) == names[:1]
+
+    dump = client.post("/admin/dumps").json()
+    with gzip.open(os.path.join(tmp_path, dump["name"]), "rt") as f:
+        lines = [json.loads(line) for line in f]
+    assert lines[0]["format"] == "reqtool-dump"
+    assert {"table": "traces", "columns": ["source_id", "target_id", "suspect", "suspect_reason", "suspect_since"]} in lines
+    before = client.get("/requirements/BK-1").json()
+    metrics_before = client.get(f"/projects/{project_id}/metrics").json()
+    audit_count = len(client.get("/audit/").json())
+    changes = client.get("/audit/requirements/BK-2/changes").json()
+    assert [c["field"] for c in changes] == ["description"]
+
+    # Change things, then restore the dump through an upload
+    client.post("/requirements/", json={"id": "", "title": "Extra", "project_id": project_id})
+    client.delete("/requirements/BK-2")
+    client.put("/requirements/BK-1", json={"title": "Renamed"})
+    cursor = client.get("/sync/").json()["next_since"]
+    body = open(os.path.join(tmp_path, dump["name"]), "rb").read()
+    assert client.put("/admin/dumps/uploaded.ndjson.gz", content=body).json()["size"] == len(body)
+    assert client.put("/admin/dumps/..%2Fescape.ndjson.gz", content=body).status_code in (400, 404)
+    counts = client.post("/admin/restore", json={"name": "uploaded.ndjson.gz"}).json()["counts"]
+    assert counts == {"projects": 1, "requirements": 2, "traces": 1, "audit_logs": audit_count}
+
+    after = client.get("/requirements/BK-1").json()
+    assert after["title"] == before["title"] and after["incoming_traces"] == [{"source_id": "BK-2", "target_id": "BK-1"}]
+    assert after["children"][0]["id"] == "BK-2"
+    assert client.get("/requirements/BK-3").status_code == 404
+    assert client.get(f"/projects/{project_id}/metrics").json() == metrics_before
+    assert len(client.get("/audit/").json()) == audit_count
+    # History and sync agree with the restored data
+    now = datetime.utcnow().isoformat()
+    assert client.get("/requirements/BK-1", params={"as_of": now}).json()["title"] == "Root"
+    listed = client.get("/requirements/", params={"project_id": project_id, "as_of": now}).json()
+    assert [r["id"] for r in listed] == ["BK-1", "BK-2"]
+    changes_since = client.get("/sync/", params={"since": cursor}).json()
+    assert sorted(r["id"] for r in changes_since["requirements"]) == ["BK-1", "BK-2"]
+    assert [(t["entity"], t["entity_id"]) for t in changes_since["deleted"]] == [("requirement", "BK-3")]
+    # Tables outside the dump are left alone
+    assert client.get("/baselines/").json() == [baseline]
+    assert client.get("/audit/requirements/BK-2/changes").json() == changes
+    # Auto-numbering continues from the restored counter
+    assert client.post("/requirements/", json={"id": "", "title": "Next", "project_id": project_id}).json()["id"] == "BK-3"
+    kinds = sorted(b["kind"] for b in client.get("/admin/backups").json())
+    assert kinds == ["dump", "dump", "snapshot", "snapshot"]
+
+def test_restore_on_sharded_storage(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, "BACKUP_DIR", str(tmp_path))
+    monkeypatch.setattr(database, "SHARDING", True)
+    monkeypatch.setattr(database, "SHARD_DIR", str(tmp_path / "shards"))
+    try:
+        keep = client.post("/projects/", json={"name": "Keep", "prefix": "KP-"}).json()["id"]
+        client.post("/requirements/", json={"id": "", "title": "Kept", "project_id": keep})
+        client.post("/requirements/", json={"id": "", "title": "Removed", "project_id": keep})
+        client.delete("/requirements/KP-2")
+        dump = client.post("/admin/dumps").json()
+        drop = client.post("/projects/", json={"name": "Drop", "prefix": "DR-"}).json()["id"]
+        client.post("/requirements/", json={"id": "", "title": "Later", "project_id": drop})
+        cursor = client.get("/sync/", params={"project_id": drop}).json()["next_since"]
+
+        client.post("/admin/restore", json={"name": dump["name"]})
+        # The deleted requirement's history is back in its project's shard
+        assert [a["action"] for a in client.get("/audit/", params={"project_id": keep}).json()] == ["DELETE", "CREATE", "CREATE"]
+        deleted = client.get("/sync/", params={"project_id": drop, "since": cursor}).json()["deleted"]
+        assert sorted((t["entity"], t["entity_id"]) for t in deleted) == [("project", str(drop)), ("requirement", "DR-1")]
+    finally:
+        database.dispose_shards()
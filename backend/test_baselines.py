@@ -0,0 +1,49 @@
+from backend import database, models
+
+def version_count():
+    db = database.SessionLocal()
+    try:
+        return db.query(models.RequirementVersion).count()
+    finally:
+        db.close()
+
+def test_baselines_share_versions_and_diff(client):
+    project_id = client.post("/projects/", json={"name": "Baselined", "prefix": "BL-"}).json()["id"]
+    for i in range(1, 4):
+        client.post("/requirements/", json={"id": f"BL-{i}", "title": f"Original {i}", "project_id": project_id})
+    client.post("/traces/", json={"source_id": "BL-1", "target_id": "BL-2"})
+
+    first = client.post("/baselines/", json={"project_id": project_id, "name": "1.0"}).json()
+    assert (first["requirement_count"], first["trace_count"]) == (3, 1)
+    assert version_count() == 3
+
+    # Nothing changed: same manifest, no new versions
+    second = client.post("/baselines/", json={"project_id": project_id, "name": "1.1"}).json()
+    assert second["manifest_hash"] == first["manifest_hash"]
+    assert version_count() == 3
+
+    client.put("/requirements/BL-2", json={"title": "Changed 2"})
+    client.request("DELETE", "/traces/", json={"source_id": "BL-1", "target_id": "BL-2"})
+    client.delete("/requirements/BL-3")
+    client.post("/requirements/", json={"id": "BL-4", "title": "New 4", "project_id": project_id})
+    client.post("/traces/", json={"source_id": "BL-4", "target_id": "BL-1"})
+    third = client.post("/baselines/", json={"project_id": project_id, "name": "2.0"}).json()
+    assert version_count() == 5
+
+    diff = client.get(f"/baselines/{third['id']}/diff", params={"against": first["id"]}).json()
+    assert diff["added"] == ["BL-4"]
+    assert diff["removed"] == ["BL-3"]
+    assert diff["modified"] == [{"id": "BL-2", "fields": ["title"]}]
+    assert diff["traces_added"] == [{"source_id": "BL-4", "target_id": "BL-1"}]
+    assert diff["traces_removed"] == [{"source_id": "BL-1", "target_id": "BL-2"}]
+
+    # Exports render the frozen content, not the current one
+    adoc = client.get(f"/baselines/{first['id']}/export/asciidoc").json()["content"]
+    assert "BL-2: Original 2" in adoc and "Changed 2" not in adoc
+    assert "| <<BL-1>> | Original 1 | <<BL-2>> | N/A" in adoc
+    reqif = client.get(f"/baselines/{third['id']}/export/reqif").text
+    assert "Changed 2" in reqif and "Original 3" not in reqif
+
+    listed = client.get("/baselines/", params={"project_id": project_id}).json()
+    assert [b["name"] for b in listed] == ["2.0", "1.1", "1.0"]
+    assert client.get("/baselines/999/diff", params={"against": first["id"]}).status_code == 404
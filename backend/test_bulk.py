@@ -0,0 +1,82 @@
+import time
+from datetime import datetime
+from backend import database, models
+from backend.test_metrics import recomputed
+
+def test_bulk_status_transitions(client):
+    project_id = client.post("/projects/", json={"name": "Release", "prefix": "RL-"}).json()["id"]
+    client.post("/requirements/", json={"id": "", "title": "Root", "project_id": project_id})
+    client.post("/requirements/", json={"id": "", "title": "Child", "project_id": project_id, "parent_id": "RL-1"})
+    client.post("/requirements/", json={"id": "", "title": "Grandchild", "project_id": project_id, "parent_id": "RL-2"})
+    client.post("/requirements/", json={"id": "", "title": "Elsewhere", "project_id": project_id})
+    since = client.get("/sync/").json()["next_since"]
+
+    assert client.post("/requirements/bulk-status", json={"status": "Approved"}).status_code == 400
+    assert client.post("/requirements/bulk-status", json={"status": "Approved", "ids": ["RL-1", "NOPE"]}).status_code == 404
+
+    # Draft cannot be released directly, and a rejected batch changes nothing
+    r = client.post("/requirements/bulk-status", json={"status": "Released", "root_id": "RL-1"})
+    assert r.status_code == 400 and "RL-1 (Draft)" in r.json()["detail"]
+
+    r = client.post("/requirements/bulk-status", json={"status": "Approved", "root_id": "RL-1"})
+    assert r.json() == {"status": "Approved", "updated": 3, "unchanged": 0, "by_previous_status": {"Draft": 3}}
+    assert client.get("/requirements/RL-4").json()["status"] == "Draft"
+    between = datetime.utcnow().isoformat()
+    time.sleep(0.002)
+
+    r = client.post("/requirements/bulk-status", json={"status": "Approved", "project_id": project_id})
+    assert (r.json()["updated"], r.json()["unchanged"]) == (1, 3)
+    r = client.post("/requirements/bulk-status", json={"status": "Released", "ids": ["RL-1", "RL-3"]})
+    assert r.json()["updated"] == 2
+
+    statuses = {r["id"]: r["status"] for r in client.get("/requirements/", params={"project_id": project_id}).json()}
+    assert statuses == {"RL-1": "Released", "RL-2": "Approved", "RL-3": "Released", "RL-4": "Approved"}
+
+    # Everything the ORM listeners would have kept up to date
+    metrics = client.get(f"/projects/{project_id}/metrics").json()
+    assert metrics == recomputed(project_id)
+    assert metrics["by_status"] == {"Approved": 2, "Released": 2}
+
+    changes = client.get("/sync/", params={"since": since}).json()["requirements"]
+    assert sorted(c["id"] for c in changes) == ["RL-1", "RL-2", "RL-3", "RL-4"]
+    db = database.SessionLocal()
+    seqs = [s for (s,) in db.query(models.Requirement.change_seq)]
+    db.close()
+    assert len(set(seqs)) == len(seqs)
+
+    assert client.get("/requirements/RL-3", params={"as_of": between}).json()["status"] == "Approved"
+    audit = client.get("/audit/requirements/RL-3").json()
+    assert any(a["details"] == "Status: Approved -> Released" for a in audit)
+
+def test_subtree_delete_checks_links_across_the_whole_tree(client):
+    project_id = client.post("/projects/", json={"name": "Prune", "prefix": "PR-"}).json()["id"]
+    client.post("/requirements/", json={"id": "", "title": "Root", "project_id": project_id})
+    client.post("/requirements/", json={"id": "", "title": "Child", "project_id": project_id, "parent_id": "PR-1"})
+    client.post("/requirements/", json={"id": "", "title": "Grandchild", "project_id": project_id, "parent_id": "PR-2"})
+    client.post("/requirements/", json={"id": "", "title": "Outside", "project_id": project_id})
+    client.post("/traces/", json={"source_id": "PR-3", "target_id": "PR-4"})
+    client.post("/traces/", json={"source_id": "PR-1", "target_id": "PR-2"})
+    client.post("/requirements/bulk-status", json={"status": "Approved", "ids": ["PR-4"]})
+    since = client.get("/sync/").json()["next_since"]
+
+    # The Approved link sits two levels below the node being deleted
+    plan = client.delete("/requirements/PR-1", params={"dry_run": True}).json()
+    assert plan["ok"] is False and plan["dry_run"] is True
+    assert plan["requirements"] == ["PR-1", "PR-2", "PR-3"]
+    assert len(plan["traces"]) == 2 and plan["blocked"] == [{"source_id": "PR-3", "target_id": "PR-4"}]
+    assert client.delete("/requirements/PR-1").status_code == 400
+    assert client.get("/requirements/PR-3").status_code == 200
+
+    client.post("/requirements/bulk-status", json={"status": "Draft", "ids": ["PR-4"]})
+    result = client.delete("/requirements/PR-1").json()
+    assert result["ok"] is True and result["requirements"] == ["PR-1", "PR-2", "PR-3"]
+    for req_id in ("PR-1", "PR-2", "PR-3"):
+        assert client.get(f"/requirements/{req_id}").status_code == 404
+    assert client.get("/requirements/PR-4").json()["incoming_traces"] == []
+
+    deleted = client.get("/sync/", params={"since": since}).json()["deleted"]
+    assert sorted(d["entity_id"] or d["source_id"] for d in deleted) == ["PR-1", "PR-1", "PR-2", "PR-3", "PR-3"]
+    audit = client.get("/audit/requirements/PR-3").json()
+    assert audit[0]["action"] == "DELETE" and audit[0]["details"] == "Deleted requirement PR-3 (subtree of PR-1); removed 1 trace link(s)"
+    metrics = client.get(f"/projects/{project_id}/metrics").json()
+    assert metrics == recomputed(project_id) and metrics["requirements"] == 1
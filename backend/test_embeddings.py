@@ -0,0 +1,61 @@
+import json
+import zlib
+import httpx
+import numpy as np
+import pytest
+from backend import ai_service, embeddings
+
+DIM = 64
+
+def fake_embed(request: httpx.Request):
+    # Deterministic bag-of-words vectors: texts sharing words are close
+    vectors = []
+    for text in json.loads(request.content)["input"]:
+        vector = [0.0] * DIM
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode()) % DIM] += 1.0
+        vectors.append(vector)
+    return httpx.Response(200, json={"embeddings": vectors})
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    monkeypatch.setattr(ai_service, "TRANSPORT", httpx.MockTransport(fake_embed))
+    monkeypatch.setattr(embeddings, "ENABLED", True)
+    monkeypatch.setattr(embeddings, "_indexes", {})
+
+def test_index_top_k_and_remove():
+    index = embeddings.EmbeddingIndex()
+    rng = np.random.default_rng(0)
+    vectors = [embeddings.normalize(v) for v in rng.normal(size=(3000, 16))]
+    for i, v in enumerate(vectors):
+        index.upsert(f"R-{i}", v)
+
+    assert index.top_k(vectors[42], 1)[0][0] == "R-42"
+    index.remove("R-42")
+    assert "R-42" not in [hit for hit, _ in index.top_k(vectors[42], 5)]
+    # The row moved into the hole is still found
+    assert index.top_k(vectors[2999], 1)[0][0] == "R-2999"
+    assert len(index) == 2999
+
+def test_similar_and_suggested_traces(client, fake_embeddings):
+    titles = {
+        "EM-1": "The system shall encrypt stored passwords",
+        "EM-2": "The system shall encrypt stored user passwords",
+        "EM-3": "The dashboard shall render charts",
+    }
+    for req_id, title in titles.items():
+        client.post("/requirements/", json={"id": req_id, "title": title})
+
+    similar = client.get("/requirements/EM-1/similar", params={"k": 2}).json()
+    assert [s["id"] for s in similar] == ["EM-2", "EM-3"]
+    assert similar[0]["score"] > similar[1]["score"]
+
+    client.post("/traces/", json={"source_id": "EM-1", "target_id": "EM-2"})
+    suggested = client.get("/requirements/EM-1/suggested-traces").json()
+    assert [s["id"] for s in suggested] == ["EM-3"]
+
+    # Updates re-embed, deletes drop the vector
+    client.put("/requirements/EM-3", json={"title": "The system shall encrypt stored passwords"})
+    assert client.get("/requirements/EM-1/similar", params={"k": 1}).json()[0]["id"] == "EM-3"
+    client.delete("/requirements/EM-3")
+    assert "EM-3" not in [s["id"] for s in client.get("/requirements/EM-1/similar").json()]
@@ -0,0 +1,37 @@
+import xml.etree.ElementTree as ET
+
+NS = {"reqif": "http://www.omg.org/spec/ReqIF/20110401/reqif.xsd"}
+
+def reqif(client, **params):
+    response = client.get("/export/reqif", params=params)
+    assert response.status_code == 200
+    root = ET.fromstring(response.content)
+    objects = sorted(o.get("LONG-NAME") for o in root.findall(".//reqif:SPEC-OBJECT", NS))
+    return objects, len(root.findall(".//reqif:SPEC-RELATION", NS))
+
+def test_exports_resolve_scope(client):
+    alpha = client.post("/projects/", json={"name": "Alpha", "prefix": "AL-"}).json()["id"]
+    beta = client.post("/projects/", json={"name": "Beta", "prefix": "BE-"}).json()["id"]
+    for title, project, parent in [("Root", alpha, None), ("Child", alpha, "AL-1"), ("Grandchild", alpha, "AL-2"),
+                                   ("Sibling", alpha, None), ("Other", beta, None), ("Far", beta, None)]:
+        client.post("/requirements/", json={"id": "", "title": title, "project_id": project, "parent_id": parent})
+    # AL-3 -> BE-1 -> BE-2, AL-4 -> AL-3
+    for source, target in [("AL-3", "BE-1"), ("BE-1", "BE-2"), ("AL-4", "AL-3")]:
+        client.post("/traces/", json={"source_id": source, "target_id": target})
+
+    assert reqif(client) == (["AL-1", "AL-2", "AL-3", "AL-4", "BE-1", "BE-2"], 3)
+    assert reqif(client, project_id=beta) == (["BE-1", "BE-2"], 1)
+    assert reqif(client, root_id="AL-2") == (["AL-2", "AL-3"], 0)
+    # Links in both directions, up to `hops` away
+    assert reqif(client, ids="AL-3") == (["AL-3"], 0)
+    assert reqif(client, ids="AL-3", hops=1) == (["AL-3", "AL-4", "BE-1"], 2)
+    assert reqif(client, ids="AL-3", hops=2) == (["AL-3", "AL-4", "BE-1", "BE-2"], 3)
+    # Parts combine as a union
+    assert reqif(client, project_id=beta, root_id="AL-2")[0] == ["AL-2", "AL-3", "BE-1", "BE-2"]
+
+    doc = client.get("/export/asciidoc", params={"project_id": alpha, "status": "Draft"}).json()["content"]
+    assert "AL-4: Sibling" in doc and "BE-1" not in doc.split("Traces to")[0]
+    assert "Other" not in doc
+
+    assert client.get("/export/reqif", params={"root_id": "NOPE"}).status_code == 404
+    assert client.get("/export/asciidoc", params={"hops": 2}).status_code == 400
@@ -0,0 +1,43 @@
+from backend import database, facets, models
+
+def test_filters_and_facet_counts(client):
+    alpha = client.post("/projects/", json={"name": "Alpha", "prefix": "AL-"}).json()["id"]
+    beta = client.post("/projects/", json={"name": "Beta", "prefix": "BE-"}).json()["id"]
+    client.post("/requirements/", json={"id": "", "title": "The system shall log in users", "project_id": alpha, "priority": "High"})
+    client.post("/requirements/", json={"id": "", "title": "When idle, the system shall lock", "project_id": alpha, "parent_id": "AL-1"})
+    client.post("/requirements/", json={"id": "", "title": "Make it fast", "project_id": alpha, "parent_id": "AL-1"})
+    client.post("/requirements/", json={"id": "", "title": "Export reports", "project_id": beta})
+    client.post("/requirements/bulk-status", json={"status": "Approved", "ids": ["AL-2", "BE-1"]})
+
+    ids = lambda r: sorted(row["id"] for row in r.json())
+    assert ids(client.get("/requirements/", params={"status": "Approved"})) == ["AL-2", "BE-1"]
+    assert ids(client.get("/requirements/", params={"project_id": alpha, "status": ["Draft", "Released"]})) == ["AL-1", "AL-3"]
+    assert ids(client.get("/requirements/", params={"priority": "High"})) == ["AL-1"]
+    assert ids(client.get("/requirements/", params={"parent_id": "AL-1", "fields": "title"})) == ["AL-2", "AL-3"]
+    assert ids(client.get("/requirements/", params={"ears": True})) == ["AL-1", "AL-2"]
+    assert ids(client.get("/requirements/", params={"ears_pattern": "event_driven"})) == ["AL-2"]
+    assert client.get("/requirements/", params={"ears_pattern": "haiku"}).status_code == 400
+
+    # Retitling reclassifies
+    client.put("/requirements/AL-3", json={"title": "While charging, the system shall dim the screen"})
+    assert ids(client.get("/requirements/", params={"ears_pattern": "state_driven"})) == ["AL-3"]
+    since = client.get("/requirements/AL-3").json()["updated_at"]
+    assert ids(client.get("/requirements/", params={"updated_since": since})) == ["AL-3"]
+
+    page = client.get("/requirements/", params={"facets": True, "project_id": alpha, "status": "Draft", "limit": 1}).json()
+    assert page["total"] == 2 and len(page["items"]) == 1
+    # Each facet ignores its own filter
+    assert page["facets"]["status"] == {"Draft": 2, "Approved": 1}
+    assert page["facets"]["project_id"] == {str(alpha): 2}
+    assert page["facets"]["ears_pattern"] == {"ubiquitous": 1, "state_driven": 1}
+    assert set(page["items"][0]) >= {"id", "title", "status", "updated_at"}
+
+    totals = client.get("/requirements/", params={"facets": True, "limit": 0}).json()
+    assert totals["items"] == [] and totals["total"] == 4
+    assert totals["facets"]["project_id"] == {str(alpha): 3, str(beta): 1}
+
+def test_backfill_classifies_core_inserts(client):
+    with database.engine.begin() as conn:
+        conn.execute(models.Requirement.__table__.insert(), [{"id": "X-1", "title": "If it fails, then the system shall retry"}])
+        assert facets.backfill(conn) == 1
+        assert conn.execute(models.Requirement.__table__.select()).first().ears_pattern == "unwanted_behavior"
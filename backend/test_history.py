@@ -0,0 +1,55 @@
+import time
+from datetime import datetime
+from backend import database, history, models
+
+def mark():
+    time.sleep(0.002)
+    moment = datetime.utcnow().isoformat()
+    time.sleep(0.002)
+    return moment
+
+def checkpoint_count(req_id):
+    db = database.SessionLocal()
+    try:
+        return db.query(models.RequirementCheckpoint).filter(models.RequirementCheckpoint.req_id == req_id).count()
+    finally:
+        db.close()
+
+def test_as_of_replays_from_nearest_checkpoint(client, monkeypatch):
+    monkeypatch.setattr(history, "CHECKPOINT_INTERVAL", 3)
+    project_id = client.post("/projects/", json={"name": "History", "prefix": "HI-"}).json()["id"]
+    before_create = mark()
+    client.post("/requirements/", json={"id": "HI-1", "title": "Title 0", "project_id": project_id})
+    client.post("/requirements/", json={"id": "HI-2", "title": "Other", "project_id": project_id})
+    marks = [mark()]
+    for i in range(1, 8):
+        client.put("/requirements/HI-1", json={"title": f"Title {i}", "rationale": f"Because {i}"})
+        marks.append(mark())
+
+    # One checkpoint on create, then one after every second update (two fields each, 4 >= 3)
+    assert checkpoint_count("HI-1") == 1 + 3
+    for i, moment in enumerate(marks):
+        state = client.get("/requirements/HI-1", params={"as_of": moment}).json()
+        assert state["title"] == f"Title {i}"
+        assert state["rationale"] == (f"Because {i}" if i else None)
+        assert "outgoing_traces" not in state
+    assert client.get("/requirements/HI-1", params={"as_of": before_create}).status_code == 404
+
+    client.delete("/requirements/HI-2")
+    after_delete = mark()
+    assert client.get("/requirements/HI-2", params={"as_of": marks[0]}).json()["title"] == "Other"
+    assert client.get("/requirements/HI-2", params={"as_of": after_delete}).status_code == 404
+
+    then = client.get("/requirements/", params={"project_id": project_id, "as_of": marks[2]}).json()
+    assert [(r["id"], r["title"]) for r in then] == [("HI-1", "Title 2"), ("HI-2", "Other")]
+    now = client.get("/requirements/", params={"project_id": project_id, "as_of": after_delete}).json()
+    assert [r["id"] for r in now] == ["HI-1"]
+    assert client.get("/requirements/", params={"as_of": after_delete}).status_code == 400
+
+    changes = client.get("/audit/requirements/HI-1/changes", params={"limit": 2}).json()
+    assert [(c["field"], c["old_value"], c["new_value"]) for c in changes] == [
+        ("rationale", "Because 6", "Because 7"), ("title", "Title 6", "Title 7")
+    ]
+
+    # Current reads keep their full shape
+    assert "outgoing_traces" in client.get("/requirements/HI-1").json()
@@ -0,0 +1,33 @@
+import argparse
+import asyncio
+import pytest
+import httpx
+from backend import ai_service
+from backend.main import app
+from backend.scripts import loadtest
+
+def test_load_step_reports_every_endpoint(client, monkeypatch):
+    monkeypatch.setattr(ai_service, "TRANSPORT", loadtest.FakeOllama(tokens=3, delay=0))
+
+    async def run():
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as http:
+            workload = loadtest.Workload(http, None, timeout=10)
+            await loadtest.seed(http, workload, projects=2, per_project=5)
+            # Creates race on the project counter and links on duplicates; neither may error
+            mix = loadtest.parse_mix("sidebar=4,detail=2,create=2,update=1,link=2,export=1,ai=1")
+            return workload, await loadtest.run_step(workload, mix, rate=200, duration=0.5)
+
+    workload, step = asyncio.run(run())
+    assert len(workload.projects) == 2 and all(len(ids) >= 5 for ids in workload.requirements.values())
+    summary = step.summary()
+    assert {"sidebar:requirements", "detail:neighborhood", "update", "ALL"} <= set(summary)
+    assert summary["ALL"]["errors"] == 0, {k: v.get("error_kinds") for k, v in summary.items()}
+    assert summary["ALL"]["p50"] <= summary["ALL"]["p95"] <= summary["ALL"]["p99"]
+    assert summary["ALL"]["count"] == sum(row["count"] for name, row in summary.items() if name != "ALL")
+
+def test_parse_mix():
+    assert loadtest.parse_mix("sidebar=3,update") == {"sidebar": 3.0, "update": 1.0}
+    for bad in ("nonsense=1", "call=1"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            loadtest.parse_mix(bad)
@@ -0,0 +1,38 @@
+import json
+from backend import database, metrics
+
+def recomputed(project_id):
+    db = database.SessionLocal()
+    try:
+        metrics.recompute(db.connection(), project_id)
+        # Not committed, so the incrementally maintained counters stay in place
+        return json.loads(json.dumps(metrics.read(db, project_id)))
+    finally:
+        db.rollback()
+        db.close()
+
+def test_metrics_follow_writes_and_match_recompute(client):
+    project_id = client.post("/projects/", json={"name": "Metrics", "prefix": "MT-"}).json()["id"]
+    for i in range(1, 5):
+        client.post("/requirements/", json={"id": f"MT-{i}", "title": f"Requirement {i}", "project_id": project_id})
+    client.post("/requirements/", json={"id": "MT-5", "title": "Child", "project_id": project_id, "parent_id": "MT-1"})
+    client.post("/requirements/", json={"id": "MT-6", "title": "Grandchild", "project_id": project_id, "parent_id": "MT-5"})
+    client.post("/traces/", json={"source_id": "MT-2", "target_id": "MT-3"})
+
+    first = client.get(f"/projects/{project_id}/metrics").json()
+    assert first == recomputed(project_id)
+    assert (first["requirements"], first["traces"], first["untraced"], first["orphans"], first["leaves"]) == (6, 1, 4, 1, 4)
+    assert first["max_depth"] == 3 and first["by_depth"] == {"1": 4, "2": 1, "3": 1}
+    assert first["by_status"] == {"Draft": 6}
+
+    # Move MT-5 (with its child) under MT-4, delete MT-3 with its trace, then approve MT-2
+    client.put("/requirements/MT-5", json={"parent_id": "MT-4"})
+    assert client.delete("/requirements/MT-3").status_code == 200
+    client.put("/requirements/MT-2", json={"status": "Approved"})
+
+    after = client.get(f"/projects/{project_id}/metrics").json()
+    assert after == recomputed(project_id)
+    assert (after["requirements"], after["traces"], after["untraced"]) == (5, 0, 5)
+    assert after["by_status"] == {"Draft": 4, "Approved": 1}
+
+    assert client.get("/projects/999/metrics").status_code == 404
@@ -0,0 +1,32 @@
+from backend import minhash
+
+def test_signature_estimates_similarity():
+    a = minhash.signature("The system shall encrypt all stored user passwords")
+    b = minhash.signature("The system shall encrypt all stored user password")
+    c = minhash.signature("When the door opens, the lamp shall turn on")
+    assert minhash.similarity(a, b) > 0.7
+    assert minhash.similarity(a, c) < 0.2
+
+def test_duplicate_check_and_clusters(client):
+    project = client.post("/projects/", json={"name": "Dupes", "prefix": "DU-"}).json()
+    titles = [
+        "The system shall encrypt all stored user passwords",
+        "The system shall encrypt all stored user password",
+        "When the door opens, the lamp shall turn on",
+        "When the door opens the lamp shall turn on",
+        "The report shall list overdue invoices",
+    ]
+    for title in titles:
+        client.post("/requirements/", json={"id": "x", "title": title, "project_id": project["id"]})
+
+    hits = client.post("/requirements/check-duplicates", json={"title": "The system shall encrypt stored user passwords"}).json()
+    assert {h["id"] for h in hits} == {"DU-1", "DU-2"}
+    assert client.post("/requirements/check-duplicates", json={"title": "Completely unrelated text"}).json() == []
+
+    clusters = client.get(f"/projects/{project['id']}/duplicates").json()
+    assert sorted([r["id"] for r in c["requirements"]] for c in clusters) == [["DU-1", "DU-2"], ["DU-3", "DU-4"]]
+
+    # Edits move a requirement out of its cluster
+    client.put("/requirements/DU-2", json={"title": "The backup shall run nightly"})
+    clusters = client.get(f"/projects/{project['id']}/duplicates").json()
+    assert [[r["id"] for r in c["requirements"]] for c in clusters] == [["DU-3", "DU-4"]]
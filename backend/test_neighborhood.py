@@ -0,0 +1,24 @@
+def test_neighborhood_hops_degrees_and_cap(client):
+    for i in range(1, 7):
+        client.post("/requirements/", json={"id": f"NB-{i}", "title": f"Requirement {i}"})
+    client.post("/requirements/", json={"id": "NB-7", "title": "Child", "parent_id": "NB-1"})
+    # NB-1 -> NB-2 -> NB-3 -> NB-4, NB-5 -> NB-1, NB-6 isolated
+    for source, target in [("NB-1", "NB-2"), ("NB-2", "NB-3"), ("NB-3", "NB-4"), ("NB-5", "NB-1")]:
+        client.post("/traces/", json={"source_id": source, "target_id": target})
+
+    one = client.get("/requirements/NB-1/neighborhood").json()
+    assert {n["id"]: n["distance"] for n in one["nodes"]} == {"NB-1": 0, "NB-2": 1, "NB-5": 1, "NB-7": 1}
+    root = one["nodes"][0]
+    assert (root["out_degree"], root["in_degree"], root["child_count"]) == (1, 1, 1)
+    # Degrees are global, not limited to the returned subgraph
+    assert next(n for n in one["nodes"] if n["id"] == "NB-2")["out_degree"] == 1
+    assert sorted((t["source_id"], t["target_id"]) for t in one["traces"]) == [("NB-1", "NB-2"), ("NB-5", "NB-1")]
+    assert not one["truncated"]
+
+    three = client.get("/requirements/NB-1/neighborhood", params={"depth": 3}).json()
+    assert {n["id"] for n in three["nodes"]} == {"NB-1", "NB-2", "NB-3", "NB-4", "NB-5", "NB-7"}
+
+    capped = client.get("/requirements/NB-1/neighborhood", params={"depth": 3, "max_nodes": 3}).json()
+    assert len(capped["nodes"]) == 3 and capped["truncated"]
+
+    assert client.get("/requirements/missing/neighborhood").status_code == 404
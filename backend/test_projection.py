@@ -0,0 +1,32 @@
+import gzip
+
+def test_fields_projection_on_list_and_matrix(client):
+    client.post("/requirements/", json={"id": "FP-1", "title": "Parent", "description": "long text " * 50})
+    client.post("/requirements/", json={"id": "FP-2", "title": "Child", "parent_id": "FP-1"})
+    client.post("/traces/", json={"source_id": "FP-2", "target_id": "FP-1"})
+
+    rows = client.get("/requirements/", params={"fields": "title,status"}).json()
+    assert rows == [
+        {"id": "FP-1", "title": "Parent", "status": "Draft"},
+        {"id": "FP-2", "title": "Child", "status": "Draft"},
+    ]
+
+    matrix = {r["id"]: r for r in client.get("/requirements/matrix", params={"fields": "title"}).json()}
+    assert "description" not in matrix["FP-1"]
+    assert matrix["FP-1"]["children"] == [{"id": "FP-2", "title": "Child"}]
+    assert matrix["FP-1"]["incoming_traces"] == [{"source_id": "FP-2", "target_id": "FP-1"}]
+    assert matrix["FP-2"]["outgoing_traces"] == [{"source_id": "FP-2", "target_id": "FP-1"}]
+
+    # Full path still serves every column and agrees with the projection
+    full = client.get("/requirements/").json()
+    assert full[0]["description"].startswith("long text")
+
+    assert client.get("/requirements/", params={"fields": "bogus"}).status_code == 400
+
+def test_large_responses_are_compressed(client):
+    for i in range(40):
+        client.post("/requirements/", json={"id": f"GZ-{i}", "title": "The system shall compress responses"})
+
+    response = client.get("/requirements/", headers={"Accept-Encoding": "gzip"}, params={"fields": "title"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) == 40
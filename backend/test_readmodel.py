@@ -0,0 +1,67 @@
+import pytest
+from sqlalchemy import update
+from backend import database, models, readmodel, sync
+
+@pytest.fixture
+def model(monkeypatch):
+    monkeypatch.setattr(readmodel, "ENABLED", True)
+    readmodel.reset()
+    loads = []
+    original = readmodel.ReadModel.load
+    def counting_load(self, conn, revision):
+        loads.append(revision)
+        original(self, conn, revision)
+    monkeypatch.setattr(readmodel.ReadModel, "load", counting_load)
+    yield loads
+    readmodel.reset()
+
+READS = [
+    ("/requirements/", {}),
+    ("/requirements/", {"fields": "title,parent_id", "limit": 2, "skip": 1}),
+    ("/requirements/", {"project_id": 1}),
+    ("/requirements/matrix", {}),
+    ("/requirements/matrix", {"fields": "title"}),
+    ("/projects/", {}),
+    ("/projects/", {"fields": "prefix"}),
+]
+
+def assert_same_as_sqlite(client, monkeypatch):
+    from_memory = [client.get(path, params=params).json() for path, params in READS]
+    monkeypatch.setattr(readmodel, "ENABLED", False)
+    from_sqlite = [client.get(path, params=params).json() for path, params in READS]
+    monkeypatch.setattr(readmodel, "ENABLED", True)
+    for memory, sqlite in zip(from_memory, from_sqlite):
+        if isinstance(memory, list) and memory and "outgoing_traces" in memory[0]:
+            for rows in (memory, sqlite):
+                for row in rows:
+                    for key in ("outgoing_traces", "incoming_traces", "children"):
+                        row[key] = sorted(row[key], key=lambda item: sorted(item.items()))
+        assert memory == sqlite
+
+def test_read_model_matches_sqlite_and_follows_writes(client, model, monkeypatch):
+    project_id = client.post("/projects/", json={"name": "Memory", "prefix": "MM-"}).json()["id"]
+    assert project_id == 1
+    client.post("/requirements/", json={"id": "", "title": "Root", "project_id": project_id})
+    client.post("/requirements/", json={"id": "", "title": "Child", "project_id": project_id, "parent_id": "MM-1"})
+    client.post("/requirements/", json={"id": "LOOSE", "title": "No project"})
+    client.post("/traces/", json={"source_id": "MM-2", "target_id": "LOOSE"})
+    assert_same_as_sqlite(client, monkeypatch)
+    assert len(model) == 1
+
+    # Commits in this process are applied without a reload
+    client.put("/requirements/MM-2", json={"title": "Renamed", "parent_id": ""})
+    client.post("/requirements/", json={"id": "", "title": "Third", "project_id": project_id, "parent_id": "MM-1"})
+    assert client.request("DELETE", "/traces/", json={"source_id": "MM-2", "target_id": "LOOSE"}).status_code == 204
+    client.post("/traces/", json={"source_id": "MM-3", "target_id": "MM-1"})
+    assert_same_as_sqlite(client, monkeypatch)
+    assert len(model) == 1
+
+    # Core bulk statements and other workers are caught by the revision check
+    client.delete("/requirements/LOOSE")
+    client.post("/requirements/bulk-status", json={"status": "Approved", "project_id": project_id})
+    with database.engine.begin() as conn:
+        seq = sync.reserve_seq(conn)
+        conn.execute(update(models.Requirement).where(models.Requirement.id == "MM-1").values(title="Elsewhere", change_seq=seq))
+    assert client.get("/requirements/").json()[0]["title"] == "Elsewhere"
+    assert_same_as_sqlite(client, monkeypatch)
+    assert len(model) == 2
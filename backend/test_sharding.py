@@ -0,0 +1,135 @@
+import sqlite3
+import pytest
+from sqlalchemy import delete, exc, select
+from backend import database, models, migrations, sharding
+from backend.scripts import recompute_metrics
+
+def _enable_sharding(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "SHARDING", True)
+    monkeypatch.setattr(database, "SHARD_DIR", str(tmp_path))
+
+@pytest.fixture
+def sharded(client, monkeypatch, tmp_path):
+    _enable_sharding(monkeypatch, tmp_path)
+    yield tmp_path
+    database.dispose_shards()
+
+def test_projects_are_stored_and_read_per_shard(client, sharded):
+    alpha = client.post("/projects/", json={"name": "Alpha", "prefix": "AL-"}).json()["id"]
+    beta = client.post("/projects/", json={"name": "Beta", "prefix": "BE-"}).json()["id"]
+    for project_id in (alpha, beta):
+        for _ in range(3):
+            assert client.post("/requirements/", json={"id": "", "title": "Requirement", "project_id": project_id}).status_code == 200
+    client.post("/requirements/", json={"id": "LOOSE-1", "title": "No project"})
+
+    assert sorted(p.name for p in sharded.iterdir() if p.suffix == ".db") == [
+        f"project_{alpha}.db", f"project_{beta}.db", "unassigned.db"
+    ]
+
+    # Routed reads and writes
+    assert client.put("/requirements/AL-2", json={"title": "Renamed"}).json()["title"] == "Renamed"
+    assert client.post("/traces/", json={"source_id": "AL-1", "target_id": "AL-2"}).status_code == 200
+    assert client.post("/traces/", json={"source_id": "AL-1", "target_id": "BE-1"}).status_code == 400
+    assert client.get("/requirements/AL-1").json()["outgoing_traces"] == [{"source_id": "AL-1", "target_id": "AL-2"}]
+    assert client.get("/requirements/missing").status_code == 404
+    assert client.get(f"/projects/{alpha}/metrics").json()["traces"] == 1
+
+    # IDs stay unique across shards
+    gamma = client.post("/projects/", json={"name": "Gamma", "prefix": "LOOSE-"}).json()["id"]
+    assert client.post("/requirements/", json={"id": "", "title": "Clash", "project_id": gamma}).status_code == 400
+
+    # Fan-out reads merge all shards
+    ids = [r["id"] for r in client.get("/requirements/", params={"limit": 100}).json()]
+    assert ids == sorted(["AL-1", "AL-2", "AL-3", "BE-1", "BE-2", "BE-3", "LOOSE-1"])
+    assert [r["id"] for r in client.get("/requirements/", params={"skip": 2, "limit": 2, "fields": "id"}).json()] == ["AL-3", "BE-1"]
+    assert [r["id"] for r in client.get("/requirements/", params={"project_id": beta}).json()] == ["BE-1", "BE-2", "BE-3"]
+    assert len(client.get("/requirements/matrix").json()) == 7
+    assert "BE-3" in client.get("/export/asciidoc").json()["content"]
+    feed = client.get("/audit/", params={"limit": 3}).json()
+    assert [a["action"] for a in feed] == ["LINK", "LINK", "UPDATE"]
+
+    assert client.delete("/requirements/BE-3").status_code == 200
+    assert client.get("/requirements/BE-3").status_code == 404
+    assert [a["action"] for a in client.get("/audit/requirements/BE-3").json()] == ["DELETE", "CREATE"]
+
+def test_shards_from_earlier_releases_are_upgraded(client, sharded):
+    project_id = client.post("/projects/", json={"name": "Legacy", "prefix": "LG-"}).json()["id"]
+    client.post("/requirements/", json={"id": "", "title": "The system shall start", "project_id": project_id})
+    client.post("/requirements/", json={"id": "", "title": "Start test", "project_id": project_id})
+    client.post("/traces/", json={"source_id": "LG-2", "target_id": "LG-1"})
+    database.dispose_shards()
+    # Take the shard back to its schema before the EARS facet and suspect link columns
+    legacy = sqlite3.connect(sharded / f"project_{project_id}.db")
+    legacy.execute("DROP INDEX ix_requirements_facets")
+    legacy.execute("ALTER TABLE requirements DROP COLUMN ears_pattern")
+    legacy.execute("DROP INDEX ix_traces_suspect")
+    for column in ("suspect", "suspect_reason", "suspect_since"):
+        legacy.execute(f"ALTER TABLE traces DROP COLUMN {column}")
+    legacy.commit()
+    legacy.close()
+
+    assert client.get("/requirements/LG-1").json()["incoming_traces"] == [{"source_id": "LG-2", "target_id": "LG-1"}]
+    assert client.post("/requirements/", json={"id": "", "title": "Blink", "project_id": project_id}).status_code == 200
+    listed = client.get("/requirements/", params={"project_id": project_id, "ears": True}).json()
+    assert [r["id"] for r in listed] == ["LG-1"]
+    assert client.get("/traces/suspect").json() == []
+    client.put("/requirements/LG-1", json={"title": "The system shall start quickly"})
+    assert [l["source_id"] for l in client.get("/traces/suspect", params={"project_id": project_id}).json()] == ["LG-2"]
+    assert client.post("/traces/", json={"source_id": "LG-3", "target_id": "LG-1"}).status_code == 200
+
+def test_metrics_recompute_covers_shards(client, sharded):
+    project_id = client.post("/projects/", json={"name": "Counted", "prefix": "CT-"}).json()["id"]
+    for title in ("One", "Two"):
+        client.post("/requirements/", json={"id": "", "title": title, "project_id": project_id})
+    client.post("/traces/", json={"source_id": "CT-2", "target_id": "CT-1"})
+    before = client.get(f"/projects/{project_id}/metrics").json()
+    assert before["requirements"] == 2
+
+    with database.shard_engine(project_id).begin() as conn:
+        conn.execute(delete(models.ProjectMetric))
+    assert recompute_metrics.recompute() > 0
+    assert client.get(f"/projects/{project_id}/metrics").json() == before
+
+def test_failed_shard_commit_keeps_the_directory_consistent(client, sharded, monkeypatch):
+    project_id = client.post("/projects/", json={"name": "Flaky", "prefix": "FL-"}).json()["id"]
+    client.post("/requirements/", json={"id": "", "title": "Kept", "project_id": project_id})
+    shard = database.shard_engine(project_id)
+    def failing_commit(dbapi_connection):
+        dbapi_connection.rollback() # As SQLite does when a commit hits an I/O error
+        raise sqlite3.OperationalError("disk I/O error")
+    with monkeypatch.context() as patched:
+        patched.setattr(shard.dialect, "do_commit", failing_commit)
+        with pytest.raises(exc.OperationalError):
+            client.post("/requirements/", json={"id": "", "title": "Lost", "project_id": project_id})
+
+    # Whichever database committed first, the directory matches the shard again
+    with database.engine.connect() as conn:
+        assert conn.execute(select(models.RequirementShard.req_id)).scalars().all() == ["FL-1"]
+    created = client.post("/requirements/", json={"id": "", "title": "Retried", "project_id": project_id}).json()["id"]
+    assert [r["id"] for r in client.get("/requirements/", params={"project_id": project_id}).json()] == ["FL-1", created]
+
+def test_unsharded_database_is_split_into_shards(client, monkeypatch, tmp_path):
+    project_id = client.post("/projects/", json={"name": "Moving", "prefix": "MV-"}).json()["id"]
+    for title in ("One", "Two", "Three"):
+        client.post("/requirements/", json={"id": "", "title": title, "project_id": project_id})
+    client.post("/requirements/", json={"id": "LOOSE-9", "title": "No project"})
+    client.post("/traces/", json={"source_id": "MV-2", "target_id": "MV-1"})
+    client.put("/requirements/MV-1", json={"title": "One, revised"})
+    client.delete("/requirements/MV-3")
+    before = {path: client.get(path).json() for path in (
+        "/requirements/MV-1", f"/projects/{project_id}/metrics", "/audit/requirements/MV-3", "/audit/requirements/MV-1/changes")}
+
+    try:
+        _enable_sharding(monkeypatch, tmp_path)
+        with pytest.raises(RuntimeError):
+            migrations.upgrade_all()
+        counts = sharding.split_database()
+        assert (counts["requirements"], counts["traces"]) == (3, 1)
+        assert {path: client.get(path).json() for path in before} == before
+        assert client.get("/requirements/LOOSE-9").status_code == 200
+        assert client.post("/requirements/", json={"id": "", "title": "Four", "project_id": project_id}).json()["id"] == "MV-4"
+        with pytest.raises(RuntimeError):
+            sharding.split_database()
+        migrations.upgrade_all()
+    finally:
+        database.dispose_shards()
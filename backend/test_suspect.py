@@ -0,0 +1,44 @@
+from backend import suspect
+
+def test_suspect_links_follow_upstream_changes(client, monkeypatch):
+    project_id = client.post("/projects/", json={"name": "Suspect", "prefix": "SP-"}).json()["id"]
+    for title in ("System", "Subsystem", "Component", "Test", "Unrelated"):
+        client.post("/requirements/", json={"id": "", "title": title, "project_id": project_id})
+    # SP-4 -> SP-3 -> SP-2 -> SP-1, and a cycle back from SP-1 to SP-4
+    for source, target in (("SP-2", "SP-1"), ("SP-3", "SP-2"), ("SP-4", "SP-3"), ("SP-1", "SP-4"), ("SP-5", "SP-4")):
+        client.post("/traces/", json={"source_id": source, "target_id": target})
+    since = client.get("/sync/").json()["next_since"]
+
+    # Priority is not something a dependent link relies on
+    client.put("/requirements/SP-1", json={"priority": "High"})
+    assert client.get("/traces/suspect").json() == []
+
+    client.put("/requirements/SP-1", json={"title": "System, revised"})
+    open_links = client.get("/traces/suspect", params={"project_id": project_id}).json()
+    assert [(l["source_id"], l["target_id"], l["suspect_reason"]) for l in open_links] == [("SP-2", "SP-1", "SP-1 changed: title")]
+    assert client.get("/audit/requirements/SP-1").json()[0]["details"].endswith("; 1 trace link(s) marked suspect")
+    # Flag changes are not sync traffic
+    assert client.get("/sync/", params={"since": since}).json()["traces"] == []
+
+    # Deeper propagation walks the cycle once per depth and keeps the first reason
+    monkeypatch.setattr(suspect, "SUSPECT_DEPTH", 3)
+    client.put("/requirements/SP-3", json={"description": "Reworded"})
+    open_links = client.get("/traces/suspect").json()
+    assert {(l["source_id"], l["target_id"]): l["suspect_reason"] for l in open_links} == {
+        ("SP-1", "SP-4"): "SP-3 changed: description",
+        ("SP-2", "SP-1"): "SP-1 changed: title",
+        ("SP-4", "SP-3"): "SP-3 changed: description",
+        ("SP-5", "SP-4"): "SP-3 changed: description",
+    }
+    assert [l["source_id"] for l in client.get("/traces/suspect", params={"target_id": "SP-4"}).json()] == ["SP-1", "SP-5"]
+    assert [l["source_id"] for l in client.get("/traces/suspect", params={"skip": 1, "limit": 2}).json()] == ["SP-2", "SP-4"]
+
+    assert client.post("/traces/suspect/clear", json={}).status_code == 400
+    assert client.post("/traces/suspect/clear", json={"project_id": 999}).status_code == 404
+    r = client.post("/traces/suspect/clear", json={"links": [{"source_id": "SP-2", "target_id": "SP-1"}, {"source_id": "SP-3", "target_id": "SP-2"}]})
+    assert r.json() == {"cleared": [{"source_id": "SP-2", "target_id": "SP-1"}]}
+    assert client.post("/traces/suspect/clear", json={"target_id": "SP-4"}).json()["cleared"] == [
+        {"source_id": "SP-1", "target_id": "SP-4"}, {"source_id": "SP-5", "target_id": "SP-4"}]
+    assert client.get("/audit/requirements/SP-5").json()[0]["action"] == "REVIEW"
+    assert len(client.post("/traces/suspect/clear", json={"project_id": project_id}).json()["cleared"]) == 1
+    assert client.get("/traces/suspect").json() == []
@@ -0,0 +1,38 @@
+def test_sync_returns_changes_and_tombstones(client):
+    project = client.post("/projects/", json={"name": "Sync", "prefix": "SY-"}).json()
+    client.post("/requirements/", json={"id": "x", "title": "The system shall sync", "project_id": project["id"]})
+    client.post("/requirements/", json={"id": "x", "title": "The system shall page", "project_id": project["id"]})
+
+    full = client.get("/sync/", params={"since": 0}).json()
+    assert [p["id"] for p in full["projects"]] == [project["id"]]
+    assert sorted(r["id"] for r in full["requirements"]) == ["SY-1", "SY-2"]
+    assert not full["has_more"]
+    cursor = full["next_since"]
+
+    # Nothing new since the cursor
+    assert client.get("/sync/", params={"since": cursor}).json()["requirements"] == []
+
+    client.post("/traces/", json={"source_id": "SY-1", "target_id": "SY-2"})
+    client.put("/requirements/SY-1", json={"title": "The system shall sync quickly"})
+    client.delete("/requirements/SY-2")
+
+    delta = client.get("/sync/", params={"since": cursor}).json()
+    assert [r["id"] for r in delta["requirements"]] == ["SY-1"]
+    deleted = {(d["entity"], d["entity_id"], d["source_id"]) for d in delta["deleted"]}
+    assert ("requirement", "SY-2", None) in deleted
+    assert ("trace", None, "SY-1") in deleted
+
+def test_sync_pages_are_bounded(client):
+    for i in range(5):
+        client.post("/requirements/", json={"id": f"PG-{i}", "title": f"Requirement {i}"})
+
+    seen = []
+    since = 0
+    while True:
+        page = client.get("/sync/", params={"since": since, "limit": 2}).json()
+        assert len(page["requirements"]) <= 2
+        seen += [r["id"] for r in page["requirements"]]
+        since = page["next_since"]
+        if not page["has_more"]:
+            break
+    assert seen == [f"PG-{i}" for i in range(5)]
@@ -36,8 +36,23 @@ export interface Project {
     next_number: number;
 }
 
-export const getRequirements = async () => {
-  const response = await api.get<Requirement[]>("/requirements/");
+export const getRequirements = async (fields?: string[]) => {
+  // Sparse fieldsets skip the long text columns the tree views never display
+  const params = fields ? { fields: fields.join(",") } : undefined;
+  const response = await api.get<Requirement[]>("/requirements/", { params });
+  return response.data;
+};
+
+export const SIDEBAR_FIELDS = ["title", "status", "parent_id", "project_id"];
+
+export interface RequirementFacets {
+  total: number;
+  facets: Record<"project_id" | "status" | "priority" | "ears_pattern", Record<string, number>>;
+}
+
+// Counts only: limit=0 skips the rows
+export const getRequirementFacets = async (filters: Record<string, string | number | boolean> = {}) => {
+  const response = await api.get<RequirementFacets>("/requirements/", { params: { ...filters, facets: true, limit: 0 } });
   return response.data;
 };
 
@@ -46,6 +61,32 @@ export const getRequirement = async (id: string) => {
   return response.data;
 };
 
+export interface NeighborhoodNode {
+  id: string;
+  title: string;
+  status: string;
+  priority?: string;
+  project_id?: number;
+  parent_id?: string;
+  distance: number;
+  in_degree: number;
+  out_degree: number;
+  child_count: number;
+}
+
+export interface Neighborhood {
+  root_id: string;
+  depth: number;
+  nodes: NeighborhoodNode[];
+  traces: TraceHelper[];
+  truncated: boolean;
+}
+
+export const getNeighborhood = async (id: string, depth: number = 1) => {
+  const response = await api.get<Neighborhood>(`/requirements/${id}/neighborhood`, { params: { depth } });
+  return response.data;
+};
+
 export const createRequirement = async (req: Partial<Requirement>) => {
   const response = await api.post<Requirement>("/requirements/", req);
   return response.data;
@@ -72,6 +113,22 @@ export const deleteTrace = async (source_id: string, target_id: string) => {
   await api.delete("/traces/", { data: { source_id, target_id } }); // Axios delete body
 };
 
+export interface SuspectTrace extends TraceHelper {
+  suspect_reason: string | null;
+  suspect_since: string | null;
+}
+
+export const getSuspectTraces = async (projectId?: number): Promise<SuspectTrace[]> => {
+  const response = await api.get<SuspectTrace[]>("/traces/suspect", { params: { project_id: projectId } });
+  return response.data;
+};
+
+// Marks links as reviewed; give exactly one of project_id, target_id or links
+export const clearSuspectTraces = async (scope: { project_id?: number; target_id?: string; links?: TraceHelper[] }) => {
+  const response = await api.post<{ cleared: TraceHelper[] }>("/traces/suspect/clear", scope);
+  return response.data.cleared;
+};
+
 // Projects
 export const getProjects = async (): Promise<Project[]> => {
     const response = await api.get<Project[]>("/projects/");
@@ -83,19 +140,21 @@ export const createProject = async (project: { name: string; prefix: string; des
     return response.data;
 };
 
-export const getExport = async (status?: string, priority?: string) => {
+export const getExport = async (status?: string, priority?: string, projectId?: number) => {
   const params = new URLSearchParams();
   if (status) params.append("status", status);
   if (priority) params.append("priority", priority);
+  if (projectId !== undefined) params.append("project_id", String(projectId));
   const response = await api.get<{ content: string }>(
     `/export/asciidoc?${params.toString()}`
   );
   return response.data;
 };
 
-export const getReqIFExport = async () => {
+export const getReqIFExport = async (projectId?: number) => {
     // Axios might try to parse XML as JSON if valid, but here we expect string XML
-    const response = await api.get("/export/reqif", { responseType: 'text' });
+    const params = projectId !== undefined ? { project_id: projectId } : undefined;
+    const response = await api.get("/export/reqif", { responseType: 'text', params });
     return response.data; 
 };
 
@@ -110,6 +169,19 @@ export const verifyEARS = async (title: string): Promise<EARSResponse> => {
     return response.data;
 };
 
+export interface DuplicateCandidate {
+    id: string;
+    title: string;
+    status: string;
+    project_id?: number;
+    similarity: number;
+}
+
+export const checkDuplicates = async (title: string, description?: string): Promise<DuplicateCandidate[]> => {
+    const response = await api.post<DuplicateCandidate[]>("/requirements/check-duplicates", { title, description });
+    return response.data;
+};
+
 export interface AuditLog {
     id: number;
     req_id?: string;
@@ -119,8 +191,16 @@ export interface AuditLog {
     details: string;
 }
 
-export const getAuditLogs = async (skip: number = 0, limit: number = 100) => {
-    const response = await api.get<AuditLog[]>(`/audit?skip=${skip}&limit=${limit}`);
+export interface AuditFilters {
+    action?: string[];
+    project_id?: number;
+    since?: string; // ISO timestamps
+    until?: string;
+}
+
+export const getAuditLogs = async (skip: number = 0, limit: number = 100, filters: AuditFilters = {}) => {
+    // Repeated keys for lists (action=LINK&action=UNLINK), as FastAPI expects
+    const response = await api.get<AuditLog[]>("/audit/", { params: { skip, limit, ...filters }, paramsSerializer: { indexes: null } });
     return response.data;
 };
 
@@ -144,6 +224,37 @@ export const getAIModels = async (): Promise<string[]> => {
     return response.data;
 };
 
+interface GenerationEvent {
+    type: "token" | "done" | "error";
+    text?: string;
+    status?: number;
+    message?: string;
+}
+
+// The generation endpoints stream NDJSON events; yields the token texts and throws on error events
+async function* readGenerationTokens(body: ReadableStream<Uint8Array>) {
+    const reader = body.getReader();
+    const decoder = new TextDecoder();
+    let pending = '';
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        pending += decoder.decode(value, { stream: true });
+        const lines = pending.split('\n');
+        pending = lines.pop() ?? '';
+
+        for (const line of lines) {
+            if (!line.trim()) continue;
+            const event: GenerationEvent = JSON.parse(line);
+            if (event.type === "token" && event.text) yield event.text;
+            else if (event.type === "error") throw new Error(event.message || "Generation failed");
+            else if (event.type === "done") return;
+        }
+    }
+}
+
 export const streamAIDescription = async (
     title: string, 
     onResponseChunk: (chunk: string) => void, 
@@ -171,8 +282,6 @@ export const streamAIDescription = async (
     }
     
     if (!response.body) return;
-    const reader = response.body.getReader();
-    const decoder = new TextDecoder();
     
     let buffer = '';
     let inThinking = false;
@@ -183,11 +292,8 @@ export const streamAIDescription = async (
     // Regex for partial tags at the end of the buffer to prevent splitting
     const PARTIAL_TAG_REGEX = /<(?:\/?(?:t(?:h(?:i(?:n(?:k(?:i(?:n(?:g)?)?)?)?)?)?)?|th(?:o(?:u(?:g(?:h(?:t)?)?)?)?)?)?)?$/i;
 
-    while (true) {
-        const { done, value } = await reader.read();
-        if (done) break;
-        
-        buffer += decoder.decode(value, { stream: true });
+    for await (const text of readGenerationTokens(response.body)) {
+        buffer += text;
         
         while (buffer.length > 0) {
             if (!inThinking) {
@@ -287,8 +393,6 @@ export const streamAIRationale = async (
     }
     
     if (!response.body) return;
-    const reader = response.body.getReader();
-    const decoder = new TextDecoder();
     
     let buffer = '';
     let inThinking = false;
@@ -297,11 +401,8 @@ export const streamAIRationale = async (
     const THINK_END_REGEX = /<\/(?:think|thinking|thought)>/i;
     const PARTIAL_TAG_REGEX = /<(?:\/?(?:t(?:h(?:i(?:n(?:k(?:i(?:n(?:g)?)?)?)?)?)?)?|th(?:o(?:u(?:g(?:h(?:t)?)?)?)?)?)?)?$/i;
 
-    while (true) {
-        const { done, value } = await reader.read();
-        if (done) break;
-        
-        buffer += decoder.decode(value, { stream: true });
+    for await (const text of readGenerationTokens(response.body)) {
+        buffer += text;
         
         while (buffer.length > 0) {
             if (!inThinking) {
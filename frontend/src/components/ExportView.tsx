@@ -1,5 +1,6 @@
-import { useState, useMemo } from 'react';
-import { getExport, getReqIFExport } from '../api';
+import { useState, useMemo, useEffect } from 'react';
+import { getExport, getReqIFExport, getProjects } from '../api';
+import type { Project } from '../api';
 import { Download, FileCode, Eye, Code } from 'lucide-react';
 import Asciidoctor from '@asciidoctor/core';
 import kroki from 'asciidoctor-kroki';
@@ -11,11 +12,19 @@ export default function ExportView() {
     const [content, setContent] = useState("");
     const [statusFilter, setStatusFilter] = useState("");
     const [priorityFilter, setPriorityFilter] = useState("");
+    const [projects, setProjects] = useState<Project[]>([]);
+    const [projectFilter, setProjectFilter] = useState("");
     const [previewMode, setPreviewMode] = useState<'rendered' | 'raw'>('rendered');
 
+    useEffect(() => {
+        getProjects().then(setProjects).catch(console.error);
+    }, []);
+
+    const projectId = projectFilter ? Number(projectFilter) : undefined;
+
     const generate = async () => {
         try {
-            const data = await getExport(statusFilter || undefined, priorityFilter || undefined);
+            const data = await getExport(statusFilter || undefined, priorityFilter || undefined, projectId);
             setContent(data.content);
         } catch (e) {
             console.error(e);
@@ -43,7 +52,7 @@ export default function ExportView() {
     
     const downloadReqIF = async () => {
         try {
-            const xml = await getReqIFExport();
+            const xml = await getReqIFExport(projectId);
             const blob = new Blob([xml], { type: 'application/xml' });
             const url = URL.createObjectURL(blob);
             const a = document.createElement('a');
@@ -62,6 +71,13 @@ export default function ExportView() {
                 <h1>Export</h1>
                 
                 <div style={{display:'flex', gap:'1rem', marginBottom:'1rem', alignItems:'end', borderBottom: '1px solid #333', paddingBottom: '1rem'}}>
+                    <div style={{flex:1}}>
+                        <label className="field-label">Project</label>
+                         <select value={projectFilter} onChange={e => setProjectFilter(e.target.value)}>
+                            <option value="">All</option>
+                            {projects.map(p => <option key={p.id} value={p.id}>{p.name}</option>)}
+                         </select>
+                    </div>
                     <div style={{flex:1}}>
                         <label className="field-label">Status Filter (AsciiDoc)</label>
                          <select value={statusFilter} onChange={e => setStatusFilter(e.target.value)}>
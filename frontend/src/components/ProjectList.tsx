@@ -1,17 +1,19 @@
 import { useState, useEffect } from 'react';
-import { getProjects, createProject } from '../api';
-import type { Project } from '../api';
+import { getProjects, createProject, getRequirementFacets } from '../api';
+import type { Project, RequirementFacets } from '../api';
 import { FolderPlus, Save } from 'lucide-react';
 
 export default function ProjectList() {
     const [projects, setProjects] = useState<Project[]>([]);
+    const [facets, setFacets] = useState<RequirementFacets['facets'] | null>(null);
     const [newProject, setNewProject] = useState({ name: '', prefix: '', description: '' });
     const [error, setError] = useState("");
 
     const loadProjects = async () => {
         try {
-            const data = await getProjects();
+            const [data, counts] = await Promise.all([getProjects(), getRequirementFacets()]);
             setProjects(data);
+            setFacets(counts.facets);
         } catch (e) {
             console.error(e);
         }
@@ -85,6 +87,7 @@ export default function ProjectList() {
                             <th style={{padding:'0.5rem'}}>Name</th>
                             <th style={{padding:'0.5rem'}}>Prefix</th>
                             <th style={{padding:'0.5rem'}}>Description</th>
+                            <th style={{padding:'0.5rem'}}>Requirements</th>
                             <th style={{padding:'0.5rem'}}>Next ID</th>
                         </tr>
                     </thead>
@@ -94,10 +97,11 @@ export default function ProjectList() {
                                 <td style={{padding:'0.5rem'}}>{p.name}</td>
                                 <td style={{padding:'0.5rem'}}><span className="badge">{p.prefix}</span></td>
                                 <td style={{padding:'0.5rem', color:'#8b949e', fontSize:'0.9em'}}>{p.description || '-'}</td>
+                                <td style={{padding:'0.5rem'}}>{facets?.project_id[String(p.id)] ?? 0}</td>
                                 <td style={{padding:'0.5rem'}}>{p.next_number}</td>
                             </tr>
                         ))}
-                        {projects.length === 0 && <tr><td colSpan={4} style={{padding:'1rem', textAlign:'center', color:'#8b949e'}}>No projects defined</td></tr>}
+                        {projects.length === 0 && <tr><td colSpan={5} style={{padding:'1rem', textAlign:'center', color:'#8b949e'}}>No projects defined</td></tr>}
                     </tbody>
                 </table>
             </div>
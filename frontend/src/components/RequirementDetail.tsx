@@ -1,7 +1,7 @@
 import { useState, useEffect, useCallback } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
-import { getRequirement, updateRequirement, deleteRequirement, createTrace, deleteTrace, verifyEARS, getAuditLogsForRequirement, getRequirements, streamAIDescription, streamAIRationale } from '../api';
-import type { RequirementDetail as ReqDetailType, EARSResponse, AuditLog, Requirement } from '../api'
+import { getRequirement, updateRequirement, deleteRequirement, createTrace, deleteTrace, verifyEARS, getAuditLogsForRequirement, getRequirements, getNeighborhood, streamAIDescription, streamAIRationale } from '../api';
+import type { RequirementDetail as ReqDetailType, EARSResponse, AuditLog, Requirement, NeighborhoodNode } from '../api'
 import TraceabilityGraph from './TraceabilityGraph';
 import { Trash2, Edit3, Save, X, Link as LinkIcon, AlertTriangle, CheckCircle, AlertCircle, Clock, User, Sparkles, Loader2 } from 'lucide-react';
 import { format } from 'date-fns';
@@ -17,6 +17,8 @@ export default function RequirementDetail() {
     const [earsResult, setEarsResult] = useState<EARSResponse | null>(null);
     const [editEarsResult, setEditEarsResult] = useState<EARSResponse | null>(null);
     const [auditLogs, setAuditLogs] = useState<AuditLog[]>([]);
+    const [neighbors, setNeighbors] = useState<Map<string, NeighborhoodNode>>(new Map());
+    // Link candidates are only fetched when the user opens the link picker
     const [allReqs, setAllReqs] = useState<Requirement[]>([]);
     const [isGeneratingDesc, setIsGeneratingDesc] = useState(false);
     const [isGeneratingRat, setIsGeneratingRat] = useState(false);
@@ -24,15 +26,15 @@ export default function RequirementDetail() {
     const load = useCallback(async () => {
         if(!id) return;
         try {
-            const [data, logs, all] = await Promise.all([
+            const [data, logs, hood] = await Promise.all([
                 getRequirement(id),
                 getAuditLogsForRequirement(id),
-                getRequirements()
+                getNeighborhood(id)
             ]);
             setReq(data);
             setEditForm(data);
             setAuditLogs(logs);
-            setAllReqs(all);
+            setNeighbors(new Map(hood.nodes.map(n => [n.id, n])));
             setIsEditing(false);
             setError("");
             
@@ -106,6 +108,15 @@ export default function RequirementDetail() {
         }
     };
 
+    const loadLinkCandidates = async () => {
+        if (allReqs.length > 0) return;
+        try {
+            setAllReqs(await getRequirements(["title"]));
+        } catch (err) {
+            console.error("Failed to load link candidates", err);
+        }
+    };
+
     const handleSave = async () => {
         if(!id || !editForm) return;
         try {
@@ -325,11 +336,13 @@ export default function RequirementDetail() {
                         currentStatus={req.status}
                         outgoingTraces={req.outgoing_traces.map(t => ({ 
                             target_id: t.target_id,
-                            target_title: allReqs.find(r => r.id === t.target_id)?.title || "Loading..."
+                            target_title: neighbors.get(t.target_id)?.title || t.target_id,
+                            target_status: neighbors.get(t.target_id)?.status
                         }))}
                         incomingTraces={req.incoming_traces.map(t => ({ 
                             source_id: t.source_id,
-                            source_title: allReqs.find(r => r.id === t.source_id)?.title || "Loading..."
+                            source_title: neighbors.get(t.source_id)?.title || t.source_id,
+                            source_status: neighbors.get(t.source_id)?.status
                         }))}
                         onNodeClick={(targetId) => navigate(`/requirements/${targetId}`)}
                     />
@@ -342,6 +355,7 @@ export default function RequirementDetail() {
                             placeholder="Link to Requirement ID..." 
                             value={linkTarget} 
                             onChange={e => setLinkTarget(e.target.value)}
+                            onFocus={loadLinkCandidates}
                             style={{maxWidth:'200px'}}
                         />
                         <datalist id="requirement-ids">
@@ -1,8 +1,8 @@
 import { useState, useEffect } from 'react';
 import axios from 'axios';
-import { useNavigate, useLocation } from 'react-router-dom';
-import { createRequirement, getProjects, verifyEARS, streamAIDescription, streamAIRationale } from '../api';
-import type { Requirement, Project, EARSResponse } from '../api';
+import { useNavigate, useLocation, Link } from 'react-router-dom';
+import { createRequirement, getProjects, verifyEARS, checkDuplicates, streamAIDescription, streamAIRationale } from '../api';
+import type { Requirement, Project, EARSResponse, DuplicateCandidate } from '../api';
 import { Save, CheckCircle, AlertCircle, Sparkles, Loader2 } from 'lucide-react';
 import ClippyPanel from './ClippyPanel';
 
@@ -23,6 +23,7 @@ export default function RequirementForm() {
     const [selectedProject, setSelectedProject] = useState<string>(""); 
     const [error, setError] = useState("");
     const [earsResult, setEarsResult] = useState<EARSResponse | null>(null);
+    const [duplicates, setDuplicates] = useState<DuplicateCandidate[]>([]);
     const [isGeneratingDesc, setIsGeneratingDesc] = useState(false);
     const [isGeneratingRat, setIsGeneratingRat] = useState(false);
     const [thinkingContent, setThinkingContent] = useState("");
@@ -58,6 +59,23 @@ export default function RequirementForm() {
         return () => clearTimeout(timer);
     }, [form.title]);
 
+    useEffect(() => {
+        const { title, description } = form;
+        const timer = setTimeout(async () => {
+            if (!title) {
+                setDuplicates([]);
+                return;
+            }
+            try {
+                setDuplicates(await checkDuplicates(title, description));
+            } catch (err) {
+                console.error("Duplicate check failed", err);
+            }
+        }, 800);
+
+        return () => clearTimeout(timer);
+    }, [form.title, form.description]);
+
     const handleSave = async () => {
         if(!form.title) {
              setError("Title is required");
@@ -229,6 +247,21 @@ export default function RequirementForm() {
                             )}
                         </div>
                     )}
+                    {duplicates.length > 0 && (
+                        <div style={{marginTop:'0.5rem', fontSize:'0.85rem', padding:'0.5rem', background:'rgba(219,109,40,0.1)', borderRadius:'4px'}}>
+                            <div style={{display:'flex', alignItems:'center', gap:'0.4rem', color:'#db6d28'}}>
+                                <AlertCircle size={14} />
+                                <span>Possible duplicates:</span>
+                            </div>
+                            <ul style={{margin: '4px 0 0 1rem', padding: 0}}>
+                                {duplicates.map(d => (
+                                    <li key={d.id}>
+                                        <Link to={`/requirements/${d.id}`}>{d.id}</Link>: {d.title} ({Math.round(d.similarity * 100)}%)
+                                    </li>
+                                ))}
+                            </ul>
+                        </div>
+                    )}
                </div>
 
                <div className="field-group">
@@ -1,7 +1,7 @@
 import { useState, useEffect, useMemo } from 'react';
 import { NavLink, useNavigate } from 'react-router-dom';
 import { Plus, Boxes, FileText, RefreshCw, ChevronRight, ChevronDown, History, Settings } from 'lucide-react';
-import { getRequirements, getProjects } from '../api';
+import { getRequirements, getProjects, SIDEBAR_FIELDS } from '../api';
 import type { Requirement, Project } from '../api';
 
 interface TreeItemProps {
@@ -60,7 +60,7 @@ export default function Sidebar() {
 
     const loadData = async () => {
         try {
-            const [rData, pData] = await Promise.all([getRequirements(), getProjects()]);
+            const [rData, pData] = await Promise.all([getRequirements(SIDEBAR_FIELDS), getProjects()]);
             setReqs(rData);
             setProjects(pData);
         } catch (e) {
@@ -71,7 +71,7 @@ export default function Sidebar() {
     useEffect(() => {
         const loadData = async () => {
             try {
-                const [rData, pData] = await Promise.all([getRequirements(), getProjects()]);
+                const [rData, pData] = await Promise.all([getRequirements(SIDEBAR_FIELDS), getProjects()]);
                 setReqs(rData);
                 setProjects(pData);
             } catch (e) {
@@ -60,8 +60,8 @@ interface TraceabilityGraphProps {
   currentId: string;
   currentTitle: string;
   currentStatus: string;
-  outgoingTraces: { target_id: string; target_title: string }[];
-  incomingTraces: { source_id: string; source_title: string }[];
+  outgoingTraces: { target_id: string; target_title: string; target_status?: string }[];
+  incomingTraces: { source_id: string; source_title: string; source_status?: string }[];
   onNodeClick: (id: string) => void;
 }
 
@@ -92,7 +92,7 @@ export default function TraceabilityGraph({
       nodes.push({
         id,
         type: 'requirement',
-        data: { id, title: trace.source_title, isCurrent: false, status: 'Linked' }, 
+        data: { id, title: trace.source_title, isCurrent: false, status: trace.source_status || 'Linked' },
         position: { x: 0, y: (index - (incomingTraces.length - 1) / 2) * 120 + 150 },
       });
       edges.push({
@@ -110,7 +110,7 @@ export default function TraceabilityGraph({
       nodes.push({
         id,
         type: 'requirement',
-        data: { id, title: trace.target_title, isCurrent: false, status: 'Linked' },
+        data: { id, title: trace.target_title, isCurrent: false, status: trace.target_status || 'Linked' },
         position: { x: 600, y: (index - (outgoingTraces.length - 1) / 2) * 120 + 150 },
       });
       edges.push({